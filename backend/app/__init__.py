@@ -38,7 +38,7 @@ def create_app(config_class=Config):
     
     # Import models so Flask-Migrate can detect them
     with app.app_context():
-        from app.models import user, product, order
+        from app.models import user, product, order, search, catalog
     
     # Register blueprints
     from app.routes.auth import auth_bp
@@ -59,6 +59,14 @@ def create_app(config_class=Config):
     app.register_blueprint(payments_bp, url_prefix='/api/payments')
     # app.register_blueprint(ar_bp, url_prefix='/api/ar')  # Temporarily disabled
     
+    # Response cache for anonymous catalog reads
+    from app.services.cache_service import init_cache
+    init_cache(app)
+    
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
     # Health check endpoint
     @app.route('/health')
     def health_check():
@@ -0,0 +1,116 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+search_cli = AppGroup('search', help='Full-text search index maintenance')
+
+@search_cli.command('rebuild')
+@click.option('--batch-size', default=500, show_default=True, help='Products indexed per commit')
+def rebuild_search(batch_size):
+    """Rebuild the search document of every product"""
+    from app.services.search_service import rebuild_search_index
+
+    count = rebuild_search_index(batch_size=batch_size)
+    click.echo(f'Indexed {count} products')
+
+reviews_cli = AppGroup('reviews', help='Review aggregate maintenance')
+
+@reviews_cli.command('backfill')
+def backfill_reviews():
+    """Recompute product rating summaries from approved reviews"""
+    from app.services.review_stats import backfill_rating_summaries
+
+    count = backfill_rating_summaries()
+    click.echo(f'Summarized reviews of {count} products')
+
+categories_cli = AppGroup('categories', help='Category hierarchy maintenance')
+
+@categories_cli.command('rebuild')
+def rebuild_categories():
+    """Rebuild the category closure table from parent links"""
+    from app.services.category_service import rebuild_category_closure
+
+    count = rebuild_category_closure()
+    click.echo(f'Rebuilt hierarchy of {count} categories')
+
+popularity_cli = AppGroup('popularity', help='Popularity ranking maintenance')
+
+@popularity_cli.command('refresh')
+@click.option('--batch-size', default=1000, show_default=True, help='Order items processed per commit')
+@click.option('--full', is_flag=True, help='Discard all scores and recompute from every order')
+def refresh_popularity_scores(batch_size, full):
+    """Add sales since the last run to product popularity (run periodically, e.g. from cron)"""
+    from app.services.popularity_service import refresh_popularity
+
+    count = refresh_popularity(batch_size=batch_size, full=full)
+    click.echo(f'Processed {count} order items')
+
+recommendations_cli = AppGroup('recommendations', help='Product recommendation maintenance')
+
+@recommendations_cli.command('refresh')
+@click.option('--batch-size', default=500, show_default=True, help='Orders processed per commit')
+@click.option('--full', is_flag=True, help='Discard the co-purchase matrix and recompute from every order')
+def refresh_recommendations(batch_size, full):
+    """Add orders since the last run to bought-together lists (run periodically, e.g. from cron)"""
+    from app.services.recommendation_service import refresh_bought_together
+
+    count = refresh_bought_together(batch_size=batch_size, full=full)
+    click.echo(f'Processed {count} orders')
+
+@recommendations_cli.command('train')
+@click.option('--factors', type=int, help='Latent factors (default RECOMMENDATION_FACTORS)')
+@click.option('--iterations', default=15, show_default=True, help='ALS sweeps over users and products')
+def train_user_recommendations(factors, iterations):
+    """Retrain personalized recommendations for every user (run off-peak, e.g. nightly)"""
+    from app.services.recommendation_service import train_recommendations
+
+    count = train_recommendations(factors=factors, iterations=iterations)
+    click.echo(f'Stored recommendations for {count} users')
+
+inventory_cli = AppGroup('inventory', help='Inventory holds and consistency checks')
+
+@inventory_cli.command('sweep')
+@click.option('--batch-size', type=int, help='Holds released per commit (default STOCK_RESERVATION_SWEEP_BATCH)')
+def sweep_reservations(batch_size):
+    """Release expired checkout stock holds (run periodically, e.g. every minute from cron)"""
+    from app.services.reservation_service import release_expired_reservations
+
+    batch_size = batch_size or current_app.config.get('STOCK_RESERVATION_SWEEP_BATCH', 500)
+    count = release_expired_reservations(batch_size=batch_size)
+    click.echo(f'Released {count} expired holds')
+
+@inventory_cli.command('shard')
+@click.argument('product_id', type=int)
+@click.option('--shards', default=8, show_default=True, help='Stock rows to split over, 0 to stop sharding')
+def shard_product_stock(product_id, shards):
+    """Split a hot product's stock over several rows for flash sales"""
+    from app.models import db
+    from app.services.stock_shards import rebalance_stock_shards, MAX_SHARDS
+    from app.services.catalog_events import stock_changed
+
+    if not 0 <= shards <= MAX_SHARDS:
+        raise click.BadParameter(f'must be between 0 and {MAX_SHARDS}', param_hint='--shards')
+
+    count = rebalance_stock_shards(product_id, shards=shards)
+    db.session.commit()
+    stock_changed(product_id)
+    click.echo(f'Product {product_id} stock kept in {count} shards' if count else f'Product {product_id} stock kept in one row')
+
+@inventory_cli.command('sync-shards')
+def sync_shard_stock():
+    """Copy sharded stock totals into products.stock_quantity (run periodically, e.g. every minute from cron)"""
+    from app.services.stock_shards import sync_sharded_stock
+    from app.services.catalog_events import stock_changed
+
+    product_ids = sync_sharded_stock()
+    stock_changed(*product_ids)
+    click.echo(f'Synced stock of {len(product_ids)} sharded products')
+
+def register_commands(app):
+    """Register custom Flask CLI commands"""
+    app.cli.add_command(search_cli)
+    app.cli.add_command(reviews_cli)
+    app.cli.add_command(categories_cli)
+    app.cli.add_command(popularity_cli)
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(inventory_cli)
@@ -0,0 +1,238 @@
+from app import db
+from datetime import datetime
+import json
+
+class CatalogVersion(db.Model):
+    """Monotonic version counter of the public catalog.
+
+    Bumped after every committed product or brand write, so conditional
+    GETs can be answered from this single row without loading products.
+    """
+    __tablename__ = 'catalog_versions'
+
+    scope = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CatalogVersion {self.scope}={self.version}>'
+
+class ProductRatingSummary(db.Model):
+    """Approved review aggregates of a product, maintained incrementally.
+
+    Rows are adjusted in the same flush as the review insert, approval
+    change or delete that affects them (see services/review_stats.py),
+    so reads never have to aggregate the reviews table.
+    """
+    __tablename__ = 'product_rating_summaries'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_avg = db.Column(db.Float, nullable=False, default=0)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0)
+    rating_2 = db.Column(db.Integer, nullable=False, default=0)
+    rating_3 = db.Column(db.Integer, nullable=False, default=0)
+    rating_4 = db.Column(db.Integer, nullable=False, default=0)
+    rating_5 = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_distribution(self):
+        return {str(i): getattr(self, f'rating_{i}') or 0 for i in range(1, 6)}
+
+    def to_dict(self):
+        return {
+            'average_rating': round(self.rating_avg or 0, 2),
+            'total_reviews': self.rating_count or 0,
+            'rating_distribution': self.get_distribution()
+        }
+
+    def __repr__(self):
+        return f'<ProductRatingSummary {self.product_id}>'
+
+class CategoryClosure(db.Model):
+    """Transitive closure of the category hierarchy.
+
+    One row per (ancestor, descendant) pair including each category paired
+    with itself at depth 0, so "a category and all of its subcategories"
+    is a single indexed lookup on ancestor_id.
+    """
+    __tablename__ = 'category_closure'
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('categories.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('categories.id'), primary_key=True, index=True)
+    depth = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CategoryClosure {self.ancestor_id}->{self.descendant_id}>'
+
+class ProductPopularity(db.Model):
+    """Time-decayed sales popularity of a product.
+
+    ``score`` uses forward decay: each unit sold adds
+    exp(lambda * (sold_at - epoch)), so the relative order of scores is
+    the same as with decay applied at read time and old rows never need
+    rewriting. The sum grows without bound, so the column stores
+    log(1 + sum), which keeps the order and stays finite (0 for no sales);
+    see popularity_service.current_score for the current value. Every
+    product has a row.
+    """
+    __tablename__ = 'product_popularity'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0, index=True)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ProductPopularity {self.product_id}={self.score}>'
+
+class JobWatermark(db.Model):
+    """Last source row processed by an incremental background job"""
+    __tablename__ = 'job_watermarks'
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<JobWatermark {self.name}={self.last_id}>'
+
+class CatalogImportJob(db.Model):
+    """Progress and per-row errors of a bulk product import"""
+    __tablename__ = 'catalog_import_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_format = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_imported = db.Column(db.Integer, nullable=False, default=0)
+    rows_failed = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text)  # JSON list of {'row': n, 'sku': ..., 'errors': [...]}
+    error_message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def get_errors(self):
+        return json.loads(self.errors) if self.errors else []
+
+    def to_dict(self, include_errors=False):
+        data = {
+            'id': self.id,
+            'filename': self.filename,
+            'format': self.file_format,
+            'status': self.status,
+            'rows_processed': self.rows_processed,
+            'rows_imported': self.rows_imported,
+            'rows_failed': self.rows_failed,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_errors:
+            data['errors'] = self.get_errors()
+        return data
+
+    def __repr__(self):
+        return f'<CatalogImportJob {self.id} {self.status}>'
+
+class ProductCoPurchase(db.Model):
+    """Sparse product x product co-occurrence matrix.
+
+    ``order_count`` is the number of orders containing both products; each
+    pair is stored in both directions so a product's row is one index range.
+    """
+    __tablename__ = 'product_co_purchases'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    related_product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ProductCoPurchase {self.product_id}+{self.related_product_id}={self.order_count}>'
+
+class ProductBoughtTogether(db.Model):
+    """Precomputed top co-purchased products of a product, best first"""
+    __tablename__ = 'product_bought_together'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    related_ids = db.Column(db.Text, nullable=False, default='[]')  # JSON list of product ids
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_related_ids(self):
+        return json.loads(self.related_ids) if self.related_ids else []
+
+    def __repr__(self):
+        return f'<ProductBoughtTogether {self.product_id}>'
+
+class UserRecommendation(db.Model):
+    """Top recommended products of a user from the last offline training run"""
+    __tablename__ = 'user_recommendations'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    product_ids = db.Column(db.Text, nullable=False, default='[]')  # JSON list, best first
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def get_product_ids(self):
+        return json.loads(self.product_ids) if self.product_ids else []
+
+    def __repr__(self):
+        return f'<UserRecommendation {self.user_id}>'
+
+class StockReservation(db.Model):
+    """Stock held for a user's checkout until ``expires_at``.
+
+    Created when a payment intent is created, deleted when the order is
+    confirmed (the hold becomes a stock decrement) or released once expired.
+    """
+    __tablename__ = 'stock_reservations'
+    # Ids are never reused, so a hold released by id cannot hit a newer one
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_variant_id = db.Column(db.Integer, db.ForeignKey('product_variants.id'), nullable=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StockReservation {self.id} {self.product_id}x{self.quantity}>'
+
+class ReservedStock(db.Model):
+    """Units of a product or variant currently held by stock reservations.
+
+    Kept in step with stock_reservations so availability is
+    ``stock_quantity - quantity`` without summing the holds. Variant lines
+    also hold their product's stock, so a product's own row
+    (``product_variant_id`` 0) counts every hold on the product.
+    """
+    __tablename__ = 'reserved_stock'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    product_variant_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = the product itself
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ReservedStock {self.product_id}/{self.product_variant_id}={self.quantity}>'
+
+class ProductStockShard(db.Model):
+    """One slice of a hot product's stock.
+
+    A product with shard rows has its stock split over them, so concurrent
+    checkouts decrement different rows instead of queueing on one lock.
+    The shards are then authoritative and products.stock_quantity is a
+    display copy (see stock_shards).
+    """
+    __tablename__ = 'product_stock_shards'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ProductStockShard {self.product_id}#{self.shard}={self.quantity}>'
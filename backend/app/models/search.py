@@ -0,0 +1,38 @@
+from app import db
+from datetime import datetime
+
+class ProductSearchDocument(db.Model):
+    """Denormalized full-text search document for a product.
+
+    ``title`` holds the high-weight text (product and brand name) and ``body``
+    everything else that is searchable. On PostgreSQL the migration adds a
+    generated ``search_vector`` tsvector column with a GIN index over both;
+    on SQLite the same text is mirrored into the ``product_search_fts`` FTS5
+    table by the search service.
+    """
+    __tablename__ = 'product_search_documents'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    title = db.Column(db.Text, nullable=False, default='')
+    body = db.Column(db.Text, nullable=False, default='')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ProductSearchDocument {self.product_id}>'
+
+class SearchTerm(db.Model):
+    """Vocabulary of searchable catalog words for typo-tolerant search.
+
+    ``term`` is the lookup key matched by trigram similarity and ``phrase``
+    the words it stands for - usually the same word, but adjacent words of
+    a name are also stored joined ("rayban" -> "ray ban"). On PostgreSQL the
+    migration adds a pg_trgm GIN index on ``term``.
+    """
+    __tablename__ = 'search_terms'
+
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(100), unique=True, nullable=False)
+    phrase = db.Column(db.String(200), nullable=False)
+
+    def __repr__(self):
+        return f'<SearchTerm {self.term}>'
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import func, and_, or_
 from datetime import datetime, timedelta
@@ -9,9 +9,20 @@ from app.models import (
 from app.utils.auth import admin_required, super_admin_required
 from app.utils.validators import (
     validate_json, validate_required_fields, validate_product_data,
-    validate_pagination_params
+    validate_pagination_params, validate_fields_param
 )
 from app.services.email_service import send_order_shipped_email
+from app.services.search_service import index_product
+from app.services.catalog_events import product_changed
+from app.services.product_serializer import serialize_products, product_query_options, PRODUCT_FIELDS, DETAIL_FIELDS
+from app.services.order_serializer import serialize_orders, order_query_options, ORDER_FIELDS
+from app.services.category_service import category_filter
+from app.utils.identifiers import slugify, next_free_identifier, flush_with_unique_retry
+from app.services.catalog_import import import_format, start_import
+from app.models.catalog import CatalogImportJob
+from app.services.export_service import stream_export, EXPORT_FORMATS
+from app.services.popularity_service import ensure_popularity_rows, reweigh_order
+from app.services.stock_shards import sharded_product_ids, rebalance_stock_shards, current_stock, MAX_SHARDS
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -47,7 +58,7 @@ def get_dashboard():
             and_(
                 Product.is_active == True,
                 Product.track_inventory == True,
-                Product.stock_quantity <= Product.low_stock_threshold
+                current_stock() <= Product.low_stock_threshold
             )
         ).count()
         
@@ -123,6 +134,33 @@ def get_dashboard():
 
 # Order Management
 
+def _filter_orders(query):
+    """Apply the admin order listing filters (status, search) from the request args.
+
+    Returns (query, error message or None).
+    """
+    status = request.args.get('status', '').strip()
+    search = request.args.get('search', '').strip()
+    
+    # Apply status filter
+    if status:
+        try:
+            query = query.filter_by(status=OrderStatus(status))
+        except ValueError:
+            return query, 'Invalid order status'
+    
+    # Apply search filter
+    if search:
+        query = query.filter(
+            or_(
+                Order.order_number.ilike(f'%{search}%'),
+                Order.customer_email.ilike(f'%{search}%'),
+                Order.customer_phone.ilike(f'%{search}%')
+            )
+        )
+    
+    return query, None
+
 @admin_bp.route('/orders', methods=['GET'])
 @admin_required
 def get_all_orders():
@@ -130,34 +168,20 @@ def get_all_orders():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        status = request.args.get('status', '').strip()
-        search = request.args.get('search', '').strip()
         
         # Validate pagination
         page, per_page, pagination_errors = validate_pagination_params(page, per_page, 100)
         if pagination_errors:
             return jsonify({'errors': pagination_errors}), 400
         
-        # Build query
-        query = Order.query
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), ORDER_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
         
-        # Apply status filter
-        if status:
-            try:
-                status_enum = OrderStatus(status)
-                query = query.filter_by(status=status_enum)
-            except ValueError:
-                return jsonify({'error': 'Invalid order status'}), 400
-        
-        # Apply search filter
-        if search:
-            query = query.filter(
-                or_(
-                    Order.order_number.ilike(f'%{search}%'),
-                    Order.customer_email.ilike(f'%{search}%'),
-                    Order.customer_phone.ilike(f'%{search}%')
-                )
-            )
+        # Build query
+        query, filter_error = _filter_orders(Order.query.options(*order_query_options(fields)))
+        if filter_error:
+            return jsonify({'error': filter_error}), 400
         
         # Execute query with pagination
         orders_pagination = query.order_by(Order.created_at.desc()).paginate(
@@ -169,7 +193,7 @@ def get_all_orders():
         orders = orders_pagination.items
         
         return jsonify({
-            'orders': [order.to_dict(include_items=True) for order in orders],
+            'orders': serialize_orders(orders, fields) if fields else [order.to_dict(include_items=True) for order in orders],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -206,6 +230,7 @@ def update_order_status(order_id):
             return jsonify({'error': 'Invalid order status'}), 400
         
         old_status = order.status
+        reweighed_product_ids = reweigh_order(order, new_status)
         order.status = new_status
         
         # Handle shipping information
@@ -228,6 +253,7 @@ def update_order_status(order_id):
             order.admin_notes = f"{order.admin_notes}\n{new_note}" if order.admin_notes else new_note
         
         db.session.commit()
+        product_changed(*reweighed_product_ids)
         
         # Send notification email if order shipped
         if new_status == OrderStatus.SHIPPED and old_status != OrderStatus.SHIPPED:
@@ -248,6 +274,33 @@ def update_order_status(order_id):
 
 # Product Management
 
+def _filter_products(query):
+    """Apply the admin product listing filters from the request args"""
+    search = request.args.get('search', '').strip()
+    category_id = request.args.get('category_id', type=int)
+    brand_id = request.args.get('brand_id', type=int)
+    is_active = request.args.get('is_active', type=bool)
+    
+    if search:
+        query = query.filter(
+            or_(
+                Product.name.ilike(f'%{search}%'),
+                Product.sku.ilike(f'%{search}%'),
+                Product.description.ilike(f'%{search}%')
+            )
+        )
+    
+    if category_id:
+        query = query.filter(category_filter(category_id))
+    
+    if brand_id:
+        query = query.filter(Product.brand_id == brand_id)
+    
+    if is_active is not None:
+        query = query.filter(Product.is_active == is_active)
+    
+    return query
+
 @admin_bp.route('/products', methods=['GET'])
 @admin_required
 def get_all_products():
@@ -255,37 +308,18 @@ def get_all_products():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        search = request.args.get('search', '').strip()
-        category_id = request.args.get('category_id', type=int)
-        brand_id = request.args.get('brand_id', type=int)
-        is_active = request.args.get('is_active', type=bool)
         
         # Validate pagination
         page, per_page, pagination_errors = validate_pagination_params(page, per_page, 100)
         if pagination_errors:
             return jsonify({'errors': pagination_errors}), 400
         
-        # Build query (include inactive products for admin)
-        query = Product.query
-        
-        # Apply filters
-        if search:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search}%'),
-                    Product.sku.ilike(f'%{search}%'),
-                    Product.description.ilike(f'%{search}%')
-                )
-            )
-        
-        if category_id:
-            query = query.join(Product.categories).filter(Category.id == category_id)
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PRODUCT_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
         
-        if brand_id:
-            query = query.filter(Product.brand_id == brand_id)
-        
-        if is_active is not None:
-            query = query.filter(Product.is_active == is_active)
+        # Build query (include inactive products for admin)
+        query = _filter_products(Product.query.options(*product_query_options(fields)))
         
         # Execute query with pagination
         products_pagination = query.order_by(Product.created_at.desc()).paginate(
@@ -297,7 +331,7 @@ def get_all_products():
         products = products_pagination.items
         
         return jsonify({
-            'products': [product.to_dict(include_details=True) for product in products],
+            'products': serialize_products(products, include_details=True, fields=fields),
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -330,13 +364,16 @@ def create_product():
         if existing_product:
             return jsonify({'error': 'SKU already exists'}), 409
         
+        # A slug given by the admin is kept as is, otherwise one is derived from the name
+        if data.get('slug') and Product.query.filter_by(slug=data['slug']).first():
+            return jsonify({'error': 'Slug already exists'}), 409
+        
         # Create product
         product = Product(
             name=data['name'],
             description=data['description'],
             short_description=data.get('short_description'),
             sku=data['sku'],
-            slug=data.get('slug') or data['name'].lower().replace(' ', '-'),
             price=data['price'],
             compare_price=data.get('compare_price'),
             cost_price=data.get('cost_price'),
@@ -362,8 +399,15 @@ def create_product():
         if 'tags' in data:
             product.set_tags(data['tags'])
         
-        db.session.add(product)
+        def assign_slug(product):
+            product.slug = data.get('slug') or next_free_identifier(Product.slug, slugify(data['name'], 'product'))
+        
+        # The unique index settles concurrent creates picking the same slug
+        flush_with_unique_retry(product, assign_slug)
+        ensure_popularity_rows([product.id])
+        index_product(product)
         db.session.commit()
+        product_changed(product.id)
         
         return jsonify({
             'message': 'Product created successfully',
@@ -398,6 +442,18 @@ def update_product(product_id):
             if existing_product and existing_product.id != product_id:
                 return jsonify({'error': 'SKU already exists'}), 409
         
+        # Shard count of the product's stock, 0 keeps it in a single row
+        stock_shards = data.get('stock_shards')
+        if stock_shards is not None and (not isinstance(stock_shards, int) or not 0 <= stock_shards <= MAX_SHARDS):
+            return jsonify({'error': f'stock_shards must be an integer between 0 and {MAX_SHARDS}'}), 400
+        
+        # A sharded product's stock_quantity is a display copy; only a value
+        # changed from it replaces the stock, spread over the shards below
+        sharded = stock_shards is not None or bool(sharded_product_ids([product.id]))
+        new_stock = data.get('stock_quantity')
+        if new_stock == product.stock_quantity:
+            new_stock = None
+        
         # Update product fields
         updatable_fields = [
             'name', 'description', 'short_description', 'sku', 'slug',
@@ -409,14 +465,23 @@ def update_product(product_id):
         ]
         
         for field in updatable_fields:
-            if field in data:
+            if field in data and not (sharded and field == 'stock_quantity'):
                 setattr(product, field, data[field])
         
         # Handle tags
         if 'tags' in data:
             product.set_tags(data['tags'])
         
+        # Spread the (new) stock over the shards of a sharded product
+        if sharded:
+            rebalance_stock_shards(product.id, total=new_stock, shards=stock_shards)
+        
+        # product.brand may still hold the old brand - reload it for the search document
+        db.session.flush()
+        db.session.expire(product, ['brand'])
+        index_product(product)
         db.session.commit()
+        product_changed(product.id)
         
         return jsonify({
             'message': 'Product updated successfully',
@@ -428,6 +493,117 @@ def update_product(product_id):
         current_app.logger.error(f"Error updating product: {str(e)}")
         return jsonify({'error': 'Failed to update product'}), 500
 
+@admin_bp.route('/products/import', methods=['POST'])
+@admin_required
+def import_products():
+    """Start a bulk product import from an uploaded CSV or JSON Lines file"""
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file_format = import_format(upload.filename)
+        if not file_format:
+            return jsonify({'error': 'File must be .csv or .jsonl'}), 400
+        
+        batch_size = request.form.get('batch_size', type=int)
+        if batch_size is not None and not 1 <= batch_size <= 5000:
+            return jsonify({'error': 'batch_size must be between 1 and 5000'}), 400
+        
+        job = start_import(upload, file_format, user_id=get_jwt_identity(), batch_size=batch_size)
+        
+        return jsonify({
+            'message': 'Import started',
+            'job': job.to_dict()
+        }), 202
+    
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error starting product import: {str(e)}")
+        return jsonify({'error': 'Failed to start import'}), 500
+
+@admin_bp.route('/products/import/<int:job_id>', methods=['GET'])
+@admin_required
+def get_import_job(job_id):
+    """Get progress and row errors of a product import"""
+    try:
+        job = db.session.get(CatalogImportJob, job_id)
+        if not job:
+            return jsonify({'error': 'Import job not found'}), 404
+        
+        return jsonify({'job': job.to_dict(include_errors=True)}), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Error fetching import job: {str(e)}")
+        return jsonify({'error': 'Failed to fetch import job'}), 500
+
+# Exports
+
+def _export_response(name, query, serialize, names, file_format):
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    return Response(
+        stream_with_context(stream_export(query, serialize, names, file_format)),
+        mimetype=EXPORT_FORMATS[file_format],
+        headers={'Content-Disposition': f'attachment; filename={name}-{stamp}.{file_format}'}
+    )
+
+@admin_bp.route('/export/products', methods=['GET'])
+@admin_required
+def export_products():
+    """Stream all products matching the admin listing filters as CSV or JSON Lines"""
+    try:
+        file_format = request.args.get('format', 'csv').strip().lower()
+        if file_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'format must be csv or jsonl'}), 400
+        
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PRODUCT_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        names = fields or DETAIL_FIELDS
+        
+        query = _filter_products(Product.query.options(*product_query_options(names)))
+        query = query.order_by(Product.created_at.desc(), Product.id.desc())
+        
+        return _export_response(
+            'products', query,
+            lambda products: serialize_products(products, fields=names),
+            names, file_format
+        )
+    
+    except Exception as e:
+        current_app.logger.error(f"Error exporting products: {str(e)}")
+        return jsonify({'error': 'Failed to export products'}), 500
+
+@admin_bp.route('/export/orders', methods=['GET'])
+@admin_required
+def export_orders():
+    """Stream all orders matching the admin listing filters as CSV or JSON Lines"""
+    try:
+        file_format = request.args.get('format', 'csv').strip().lower()
+        if file_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'format must be csv or jsonl'}), 400
+        
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), ORDER_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        # Line items only when asked for - they don't fit a CSV row
+        names = fields or tuple(name for name in ORDER_FIELDS if name != 'items')
+        
+        query, filter_error = _filter_orders(Order.query.options(*order_query_options(names)))
+        if filter_error:
+            return jsonify({'error': filter_error}), 400
+        query = query.order_by(Order.created_at.desc(), Order.id.desc())
+        
+        return _export_response(
+            'orders', query,
+            lambda orders: serialize_orders(orders, names),
+            names, file_format
+        )
+    
+    except Exception as e:
+        current_app.logger.error(f"Error exporting orders: {str(e)}")
+        return jsonify({'error': 'Failed to export orders'}), 500
+
 # User Management
 
 @admin_bp.route('/users', methods=['GET'])
@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, CartItem, Product, ProductVariant, Prescription
 from app.utils.auth import token_required, get_current_user
 from app.utils.validators import validate_json, validate_required_fields
+from app.services.cart_service import get_cart_view
+from app.services.inventory_service import check_availability
 import json
 
 cart_bp = Blueprint('cart', __name__)
@@ -14,15 +16,8 @@ def get_cart():
     try:
         current_user_id = get_jwt_identity()
         
-        cart_items = CartItem.query.filter_by(user_id=current_user_id).all()
-        
-        total_amount = sum(item.get_total_price() for item in cart_items)
-        
-        return jsonify({
-            'cart_items': [item.to_dict() for item in cart_items],
-            'total_items': len(cart_items),
-            'total_amount': total_amount
-        }), 200
+        # Lines with pricing, images and the subtotal from a single query
+        return jsonify(get_cart_view(current_user_id)), 200
     
     except Exception as e:
         current_app.logger.error(f"Error fetching cart: {str(e)}")
@@ -79,19 +74,6 @@ def add_to_cart():
             if not prescription:
                 return jsonify({'error': 'Prescription not found'}), 404
         
-        # Check stock availability
-        if product.track_inventory:
-            available_stock = product.stock_quantity
-            if product_variant_id:
-                variant = ProductVariant.query.get(product_variant_id)
-                available_stock = variant.stock_quantity
-            
-            if available_stock < quantity:
-                return jsonify({
-                    'error': 'Insufficient stock',
-                    'available_stock': available_stock
-                }), 400
-        
         # Check if item already exists in cart
         existing_item = CartItem.query.filter_by(
             user_id=current_user_id,
@@ -100,24 +82,23 @@ def add_to_cart():
             prescription_id=prescription_id
         ).first()
         
+        # Check stock for the quantity the line will hold
+        new_quantity = quantity + (existing_item.quantity if existing_item else 0)
+        shortfalls = check_availability([(product_id, product_variant_id, new_quantity)], current_user_id)
+        if shortfalls:
+            if existing_item:
+                return jsonify({
+                    'error': 'Cannot add more items. Insufficient stock',
+                    'available_stock': shortfalls[0]['available_stock'],
+                    'current_in_cart': existing_item.quantity
+                }), 400
+            return jsonify({
+                'error': 'Insufficient stock',
+                'available_stock': shortfalls[0]['available_stock']
+            }), 400
+        
         if existing_item:
             # Update existing item
-            new_quantity = existing_item.quantity + quantity
-            
-            # Check stock for new quantity
-            if product.track_inventory:
-                available_stock = product.stock_quantity
-                if product_variant_id:
-                    variant = ProductVariant.query.get(product_variant_id)
-                    available_stock = variant.stock_quantity
-                
-                if available_stock < new_quantity:
-                    return jsonify({
-                        'error': 'Cannot add more items. Insufficient stock',
-                        'available_stock': available_stock,
-                        'current_in_cart': existing_item.quantity
-                    }), 400
-            
             existing_item.quantity = new_quantity
             existing_item.set_lens_options(lens_options)
             existing_item.set_frame_adjustments(frame_adjustments)
@@ -170,16 +151,14 @@ def update_cart_item(cart_item_id):
                 return jsonify({'error': 'Quantity must be a positive integer'}), 400
             
             # Check stock availability
-            if cart_item.product.track_inventory:
-                available_stock = cart_item.product.stock_quantity
-                if cart_item.product_variant_id:
-                    available_stock = cart_item.product_variant.stock_quantity
-                
-                if available_stock < quantity:
-                    return jsonify({
-                        'error': 'Insufficient stock',
-                        'available_stock': available_stock
-                    }), 400
+            shortfalls = check_availability(
+                [(cart_item.product_id, cart_item.product_variant_id, quantity)], current_user_id
+            )
+            if shortfalls:
+                return jsonify({
+                    'error': 'Insufficient stock',
+                    'available_stock': shortfalls[0]['available_stock']
+                }), 400
             
             cart_item.quantity = quantity
         
@@ -278,29 +257,38 @@ def validate_cart():
         if not cart_items:
             return jsonify({'error': 'Cart is empty'}), 400
         
+        # Lines of the same product/variant are checked against stock together
+        shortfalls = {
+            (shortfall['product_id'], shortfall['product_variant_id']): shortfall
+            for shortfall in check_availability(
+                [(item.product_id, item.product_variant_id, item.quantity) for item in cart_items],
+                current_user_id
+            )
+        }
+        
         validation_errors = []
         
         for item in cart_items:
+            shortfall = shortfalls.get((item.product_id, item.product_variant_id or None))
+            if not shortfall:
+                continue
+            
+            product_name = shortfall['product_name']
+            available_stock = shortfall['available_stock']
+            
             # Check if product is still active
-            if not item.product.is_active:
+            if shortfall['reason'] == 'unavailable':
                 validation_errors.append({
                     'item_id': item.id,
-                    'error': f'Product "{item.product.name}" is no longer available'
+                    'error': f'Product "{product_name}" is no longer available'
                 })
                 continue
             
-            # Check stock availability
-            if item.product.track_inventory:
-                available_stock = item.product.stock_quantity
-                if item.product_variant_id:
-                    available_stock = item.product_variant.stock_quantity
-                
-                if available_stock < item.quantity:
-                    validation_errors.append({
-                        'item_id': item.id,
-                        'error': f'Only {available_stock} items available for "{item.product.name}"',
-                        'available_stock': available_stock
-                    })
+            validation_errors.append({
+                'item_id': item.id,
+                'error': f'Only {available_stock} items available for "{product_name}"',
+                'available_stock': available_stock
+            })
         
         if validation_errors:
             return jsonify({
@@ -2,8 +2,13 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, Order, User, OrderStatus
 from app.utils.auth import get_current_user
-from app.utils.validators import validate_pagination_params
+from app.utils.validators import validate_pagination_params, validate_fields_param
 from app.services.email_service import send_order_shipped_email
+from app.services.catalog_events import product_changed, stock_changed
+from app.services.inventory_service import restock
+from app.services.popularity_service import reweigh_order
+from app.services.order_serializer import serialize_orders, order_query_options, USER_ORDER_FIELDS
+from datetime import datetime
 
 orders_bp = Blueprint('orders', __name__)
 
@@ -22,8 +27,12 @@ def get_user_orders():
         if pagination_errors:
             return jsonify({'errors': pagination_errors}), 400
         
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), USER_ORDER_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        
         # Build query
-        query = Order.query.filter_by(user_id=current_user_id)
+        query = Order.query.options(*order_query_options(fields)).filter_by(user_id=current_user_id)
         
         # Apply status filter if provided
         if status:
@@ -43,7 +52,7 @@ def get_user_orders():
         orders = orders_pagination.items
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders],
+            'orders': serialize_orders(orders, fields) if fields else [order.to_dict() for order in orders],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -121,22 +130,18 @@ def cancel_order(order_id):
             }), 400
         
         # Update order status
+        reweighed_product_ids = reweigh_order(order, OrderStatus.CANCELLED)
         order.status = OrderStatus.CANCELLED
         order.admin_notes = f"Cancelled by customer on {datetime.utcnow().isoformat()}"
         
         # Restore product stock
-        for item in order.items:
-            product = item.product
-            if product and product.track_inventory:
-                product.stock_quantity += item.quantity
-                
-                # Restore variant stock if applicable
-                if item.product_variant_id:
-                    variant = item.product_variant
-                    if variant:
-                        variant.stock_quantity += item.quantity
+        stocked_product_ids = restock(
+            [(item.product_id, item.product_variant_id, item.quantity) for item in order.items if item.product_id]
+        )
         
         db.session.commit()
+        stock_changed(*stocked_product_ids)
+        product_changed(*reweighed_product_ids)
         
         return jsonify({
             'message': 'Order cancelled successfully',
@@ -5,6 +5,10 @@ from app.models import db, Order, OrderItem, CartItem, OrderStatus, PaymentStatu
 from app.utils.auth import token_required, get_current_user
 from app.utils.validators import validate_json, validate_required_fields, validate_order_data
 from app.services.email_service import send_order_confirmation_email
+from app.services.catalog_events import product_changed, stock_changed
+from app.services.inventory_service import InsufficientStockError
+from app.services.reservation_service import reserve_cart, release_reservations, convert_reservations
+from app.services.popularity_service import reweigh_order
 import json
 
 payments_bp = Blueprint('payments', __name__)
@@ -42,10 +46,23 @@ def create_payment_intent():
         # Convert to cents if needed
         amount_cents = int(amount * 100) if amount < 1000 else int(amount)
         
-        # Create payment intent
+        # Hold the cart's stock until the payment is confirmed or the hold expires
+        try:
+            reserved_until = reserve_cart(current_user_id)
+        except InsufficientStockError as e:
+            db.session.rollback()
+            return jsonify({
+                'error': 'Some items are no longer available in the requested quantity',
+                'shortfalls': e.shortfalls
+            }), 409
+        db.session.commit()
+        
+        # Create payment intent. The card is only authorized here and the
+        # charge captured once confirm-payment has taken the stock
         intent = stripe.PaymentIntent.create(
             amount=amount_cents,
             currency=currency,
+            capture_method='manual',
             metadata={
                 'user_id': current_user_id,
                 'integration_check': 'accept_a_payment'
@@ -54,16 +71,40 @@ def create_payment_intent():
         
         return jsonify({
             'client_secret': intent.client_secret,
-            'payment_intent_id': intent.id
+            'payment_intent_id': intent.id,
+            'reserved_until': reserved_until.isoformat() if reserved_until else None
         }), 200
     
     except stripe.error.StripeError as e:
         current_app.logger.error(f"Stripe error: {str(e)}")
+        _release_checkout_holds(current_user_id)
         return jsonify({'error': 'Payment processing error'}), 400
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error creating payment intent: {str(e)}")
         return jsonify({'error': 'Failed to create payment intent'}), 500
 
+def _release_checkout_holds(user_id):
+    """Give back stock held for a checkout whose payment intent was not created"""
+    try:
+        release_reservations(user_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to release stock holds of user {user_id}: {str(e)}")
+
+def _void_payment(payment_intent_id, captured):
+    """Give the money back for a payment whose order could not be created"""
+    try:
+        if captured:
+            refund = stripe.Refund.create(payment_intent=payment_intent_id)
+            current_app.logger.info(f"Refunded payment {payment_intent_id}: {refund.id}")
+        else:
+            stripe.PaymentIntent.cancel(payment_intent_id)
+            current_app.logger.info(f"Cancelled uncaptured payment {payment_intent_id}")
+    except stripe.error.StripeError as e:
+        current_app.logger.error(f"Failed to void payment {payment_intent_id}: {str(e)}")
+
 @payments_bp.route('/confirm-payment', methods=['POST'])
 @jwt_required()
 @validate_json
@@ -87,7 +128,9 @@ def confirm_payment():
         except stripe.error.StripeError as e:
             return jsonify({'error': 'Invalid payment intent'}), 400
         
-        if intent.status != 'succeeded':
+        # Intents are authorized only ('requires_capture'); ones created
+        # before manual capture arrive already charged ('succeeded')
+        if intent.status not in ('requires_capture', 'succeeded'):
             return jsonify({'error': 'Payment not completed'}), 400
         
         # Get user's cart items
@@ -96,6 +139,21 @@ def confirm_payment():
         if not cart_items:
             return jsonify({'error': 'Cart is empty'}), 400
         
+        # Turn the checkout's holds into stock decrements first, so a sold
+        # out line stops the checkout before anything else is written
+        try:
+            stocked_product_ids = convert_reservations(
+                current_user_id,
+                [(item.product_id, item.product_variant_id, item.quantity) for item in cart_items]
+            )
+        except InsufficientStockError as e:
+            db.session.rollback()
+            _void_payment(payment_intent_id, captured=intent.status == 'succeeded')
+            return jsonify({
+                'error': 'Some items are no longer available in the requested quantity',
+                'shortfalls': e.shortfalls
+            }), 409
+        
         # Create order
         user = get_current_user()
         
@@ -137,20 +195,30 @@ def confirm_payment():
         # Save order
         db.session.add(order)
         
-        # Update product stock
-        for cart_item in cart_items:
-            if cart_item.product.track_inventory:
-                cart_item.product.stock_quantity -= cart_item.quantity
-                
-                # Update variant stock if applicable
-                if cart_item.product_variant_id:
-                    cart_item.product_variant.stock_quantity -= cart_item.quantity
-        
         # Clear cart
         for cart_item in cart_items:
             db.session.delete(cart_item)
         
-        db.session.commit()
+        # Charge only once the stock is taken and the order written, so a
+        # failure before this point leaves nothing to refund
+        db.session.flush()
+        captured = intent.status == 'succeeded'
+        if not captured:
+            try:
+                stripe.PaymentIntent.capture(payment_intent_id)
+            except stripe.error.StripeError as e:
+                db.session.rollback()
+                current_app.logger.error(f"Failed to capture payment {payment_intent_id}: {str(e)}")
+                return jsonify({'error': 'Payment could not be captured'}), 402
+            captured = True
+        
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            _void_payment(payment_intent_id, captured)
+            raise
+        stock_changed(*stocked_product_ids)
         
         # Send order confirmation email
         try:
@@ -206,9 +274,11 @@ def stripe_webhook():
             # Update order payment status
             order = Order.query.filter_by(payment_intent_id=payment_intent['id']).first()
             if order:
+                reweighed_product_ids = reweigh_order(order, OrderStatus.CANCELLED)
                 order.payment_status = PaymentStatus.FAILED
                 order.status = OrderStatus.CANCELLED
                 db.session.commit()
+                product_changed(*reweighed_product_ids)
         
         elif event['type'] == 'charge.dispute.created':
             dispute = event['data']['object']
@@ -269,15 +339,18 @@ def create_refund():
         refund = stripe.Refund.create(**refund_data)
         
         # Update order status
+        reweighed_product_ids = []
         if amount and amount < order.total_amount:
             # Partial refund - keep order as completed but note the refund
             order.admin_notes = f"Partial refund of ${amount} processed. Refund ID: {refund.id}"
         else:
             # Full refund
+            reweighed_product_ids = reweigh_order(order, OrderStatus.RETURNED)
             order.payment_status = PaymentStatus.REFUNDED
             order.status = OrderStatus.RETURNED
         
         db.session.commit()
+        product_changed(*reweighed_product_ids)
         
         return jsonify({
             'message': 'Refund processed successfully',
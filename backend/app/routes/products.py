@@ -1,8 +1,25 @@
 from flask import Blueprint, request, jsonify, current_app
-from sqlalchemy import or_, and_, func
+from sqlalchemy import or_, and_, func, false
+from sqlalchemy.exc import IntegrityError
 from app.models import db, Product, Category, Brand, ProductImage, Review
-from app.utils.validators import validate_pagination_params, sanitize_search_query
+from app.utils.validators import validate_pagination_params, sanitize_search_query, validate_fields_param, validate_batch_param
 from app.utils.auth import admin_required, get_current_user
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_order, keyset_filter, InvalidCursorError
+from app.utils.identifiers import slugify, sku_code, next_free_identifier, flush_with_unique_retry
+from app.services.search_service import index_product, search_ranking_subquery, corrected_query
+from app.services.suggestion_service import get_suggestions
+from app.services.catalog_events import product_changed, brand_changed
+from app.services.cache_service import cached_response, tag_response
+from app.services.catalog_version import conditional_get
+from app.services.catalog_index import catalog_index, bitmap_from_ids
+from app.services.similarity_index import similarity_index
+from app.services.recommendation_service import get_bought_together_ids
+from app.services.review_stats import get_rating_stats
+from app.services.product_serializer import serialize_products, product_query_options, PUBLIC_FIELDS
+from app.services.category_service import get_category_tree, category_filter
+from app.services.stock_shards import current_stock, sharded_product_ids, rebalance_stock_shards
+from app.services.popularity_service import ensure_popularity_rows
+from app.models.catalog import ProductPopularity
 from datetime import datetime
 import json
 
@@ -15,6 +32,24 @@ def products():
         return create_product()
     return get_products()
 
+def get_or_create_brand(name):
+    """Brand called ``name`` and whether this call created it"""
+    brand = Brand.query.filter_by(name=name).first()
+    if brand:
+        return brand, False
+    
+    def assign_slug(brand):
+        brand.slug = next_free_identifier(Brand.slug, slugify(name, 'brand'))
+    
+    try:
+        return flush_with_unique_retry(Brand(name=name), assign_slug), True
+    except IntegrityError:
+        # Another request created the same brand first
+        brand = Brand.query.filter_by(name=name).first()
+        if not brand:
+            raise
+        return brand, False
+
 def create_product():
     """Create a new product (Admin only)"""
     try:
@@ -26,39 +61,22 @@ def create_product():
             if field not in data or not data[field]:
                 return jsonify({'error': f'{field} is required'}), 400
         
-        # Generate SKU and slug
-        import re
-        slug_base = re.sub(r'[^a-z0-9]+', '-', data['name'].lower()).strip('-')
-        sku_base = re.sub(r'[^A-Z0-9]+', '', data['name'].upper())[:10]
-        
-        # Ensure unique slug and SKU
-        slug = slug_base
-        sku = f"{sku_base}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        counter = 1
-        while Product.query.filter_by(slug=slug).first():
-            slug = f"{slug_base}-{counter}"
-            counter += 1
+        # SKU and slug bases - a numeric suffix is added if they are taken
+        slug_base = slugify(data['name'], 'product')
+        sku_base = f"{sku_code(data['name'])}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
         
         # Get or create brand
         brand = None
+        new_brand_id = None
         if data.get('brand'):
-            brand = Brand.query.filter_by(name=data['brand']).first()
-            if not brand:
-                brand_slug = re.sub(r'[^a-z0-9]+', '-', data['brand'].lower()).strip('-')
-                brand = Brand(
-                    name=data['brand'],
-                    slug=brand_slug
-                )
-                db.session.add(brand)
-                db.session.flush()
+            brand, created = get_or_create_brand(data['brand'])
+            if created:
+                new_brand_id = brand.id
         
         # Create product
         product = Product(
             name=data['name'],
             description=data.get('description', ''),
-            sku=sku,
-            slug=slug,
             price=float(data['price']),
             stock_quantity=int(data.get('stock', 0)),
             brand_id=brand.id if brand else None,
@@ -69,8 +87,17 @@ def create_product():
             published_at=datetime.utcnow()
         )
         
-        db.session.add(product)
+        def assign_identifiers(product):
+            product.slug = next_free_identifier(Product.slug, slug_base)
+            product.sku = next_free_identifier(Product.sku, sku_base)
+        
+        # One prefix query per identifier; the unique indexes settle concurrent creates
+        flush_with_unique_retry(product, assign_identifiers)
+        ensure_popularity_rows([product.id])
+        index_product(product)
         db.session.commit()
+        product_changed(product.id)
+        brand_changed(new_brand_id)
         
         return jsonify({
             'message': 'Product created successfully',
@@ -82,47 +109,70 @@ def create_product():
         current_app.logger.error(f"Error creating product: {str(e)}")
         return jsonify({'error': 'Failed to create product'}), 500
 
+def parse_product_filters():
+    """Read the catalog filter parameters shared by product listing and facets"""
+    return {
+        'search': sanitize_search_query(request.args.get('search', '').strip()),
+        'category_id': request.args.get('category_id', type=int),
+        'brand_id': request.args.get('brand_id', type=int),
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'frame_type': request.args.get('frame_type', '').strip(),
+        'frame_shape': request.args.get('frame_shape', '').strip(),
+        'color': request.args.get('color', '').strip(),
+        'is_featured': request.args.get('featured', type=bool),
+        'in_stock': request.args.get('in_stock', type=bool)
+    }
+
+@conditional_get
+@cached_response(tags=['products'])
 def get_products():
     """Get products with filtering, searching, and pagination"""
     try:
         # Get query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        search = request.args.get('search', '').strip()
-        category_id = request.args.get('category_id', type=int)
-        brand_id = request.args.get('brand_id', type=int)
-        min_price = request.args.get('min_price', type=float)
-        max_price = request.args.get('max_price', type=float)
-        frame_type = request.args.get('frame_type', '').strip()
-        frame_shape = request.args.get('frame_shape', '').strip()
-        color = request.args.get('color', '').strip()
+        filters = parse_product_filters()
+        search = filters['search']
+        category_id = filters['category_id']
+        brand_id = filters['brand_id']
+        min_price = filters['min_price']
+        max_price = filters['max_price']
+        frame_type = filters['frame_type']
+        frame_shape = filters['frame_shape']
+        color = filters['color']
+        is_featured = filters['is_featured']
+        in_stock = filters['in_stock']
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
-        is_featured = request.args.get('featured', type=bool)
-        in_stock = request.args.get('in_stock', type=bool)
+        cursor = request.args.get('cursor', '').strip()
+        include_total = request.args.get('include_total', 'true').lower() not in ['false', '0', 'no']
         
         # Validate pagination
         page, per_page, pagination_errors = validate_pagination_params(page, per_page)
         if pagination_errors:
             return jsonify({'errors': pagination_errors}), 400
         
-        # Base query - only active products
-        query = Product.query.filter(Product.is_active == True)
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PUBLIC_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
         
-        # Apply search filter
+        # Base query - only active products, selecting only the columns the response needs
+        query = Product.query.options(*product_query_options(fields)).filter(Product.is_active == True)
+        
+        # Apply full-text search filter
+        search_ranking = None
         if search:
-            search = sanitize_search_query(search)
-            search_filter = or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.description.ilike(f'%{search}%'),
-                Product.short_description.ilike(f'%{search}%'),
-                Product.tags.ilike(f'%{search}%')
-            )
-            query = query.filter(search_filter)
+            search_ranking = search_ranking_subquery(search)
+            if search_ranking is not None:
+                query = query.join(search_ranking, search_ranking.c.product_id == Product.id)
+            else:
+                # Query had no searchable words - nothing can match
+                query = query.filter(false())
         
-        # Apply category filter
+        # Apply category filter - includes products of its subcategories
         if category_id:
-            query = query.join(Product.categories).filter(Category.id == category_id)
+            query = query.filter(category_filter(category_id))
         
         # Apply brand filter
         if brand_id:
@@ -152,14 +202,14 @@ def get_products():
                 query = query.filter(
                     or_(
                         Product.track_inventory == False,
-                        Product.stock_quantity > 0
+                        current_stock() > 0
                     )
                 )
             else:
                 query = query.filter(
                     and_(
                         Product.track_inventory == True,
-                        Product.stock_quantity <= 0
+                        current_stock() <= 0
                     )
                 )
         
@@ -169,56 +219,137 @@ def get_products():
             'price': Product.price,
             'created_at': Product.created_at,
             'updated_at': Product.updated_at,
-            'popularity': Product.id  # Placeholder for popularity sorting
+            'popularity': ProductPopularity.score
         }
         
-        if sort_by in sort_options:
+        descending = sort_order.lower() == 'desc'
+        if sort_by == 'relevance' and search_ranking is not None:
+            sort_column = search_ranking.c.rank
+            descending = True
+        elif sort_by in sort_options:
             sort_column = sort_options[sort_by]
-            if sort_order.lower() == 'desc':
-                query = query.order_by(sort_column.desc())
-            else:
-                query = query.order_by(sort_column.asc())
+            if sort_by == 'popularity':
+                query = query.join(ProductPopularity, ProductPopularity.product_id == Product.id)
         else:
             # Default sorting
-            query = query.order_by(Product.created_at.desc())
+            sort_by = 'created_at'
+            sort_column = Product.created_at
+            descending = True
+        
+        # Product.id breaks ties so the order is stable and seekable
+        query = query.order_by(*keyset_order(sort_column, Product.id, descending))
+        
+        # Select the sort key alongside each product so next_cursor can be built
+        query = query.add_columns(sort_column)
+        sort_key = f"{sort_by}:{'desc' if descending else 'asc'}"
+        use_catalog_index = current_app.config.get('CATALOG_FILTER_ENGINE') == 'bitmap' and sort_by != 'relevance'
+        if use_catalog_index:
+            # The index compares names by code point rather than the database
+            # collation, so its cursors are refused by the SQL path and vice versa
+            sort_key += ':index'
+        
+        # Keyset pagination - seek past the last row of the previous page
+        cursor_position = None
+        if cursor:
+            try:
+                cursor_position = decode_cursor(cursor, sort_key, salt='products')
+            except InvalidCursorError as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.filter(keyset_filter(sort_column, Product.id, *cursor_position, descending))
+        
+        total = None
+        pages = None
+        if use_catalog_index:
+            # Resolve filters in the in-memory bitmap index, then load only the page by id
+            rows, total, has_next = _page_from_catalog_index(
+                filters, search_ranking, sort_by, descending, page, per_page, cursor_position, fields
+            )
+            pages = (total + per_page - 1) // per_page
+            has_prev = bool(cursor) or page > 1
+        elif cursor or not include_total:
+            # Fetch one extra row to detect a next page without counting
+            offset = 0 if cursor else (page - 1) * per_page
+            rows = query.offset(offset).limit(per_page + 1).all()
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            has_prev = bool(cursor) or page > 1
+        else:
+            # Execute pagination
+            products_pagination = query.paginate(
+                page=page,
+                per_page=per_page,
+                error_out=False
+            )
+            rows = products_pagination.items
+            total = products_pagination.total
+            pages = products_pagination.pages
+            has_next = products_pagination.has_next
+            has_prev = products_pagination.has_prev
         
-        # Execute pagination
-        products_pagination = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        products = [row[0] for row in rows]
         
-        products = products_pagination.items
+        next_cursor = None
+        if has_next and rows:
+            last_product, last_sort_value = rows[-1]
+            next_cursor = encode_cursor(sort_key, last_sort_value, last_product.id, salt='products')
         
         return jsonify({
-            'products': [product.to_dict() for product in products],
+            'products': serialize_products(products, fields=fields),
             'pagination': {
-                'page': page,
+                'page': None if cursor else page,
                 'per_page': per_page,
-                'total': products_pagination.total,
-                'pages': products_pagination.pages,
-                'has_next': products_pagination.has_next,
-                'has_prev': products_pagination.has_prev
+                'total': total,
+                'pages': pages,
+                'has_next': has_next,
+                'has_prev': has_prev,
+                'next_cursor': next_cursor
             },
-            'filters_applied': {
-                'search': search,
-                'category_id': category_id,
-                'brand_id': brand_id,
-                'min_price': min_price,
-                'max_price': max_price,
-                'frame_type': frame_type,
-                'frame_shape': frame_shape,
-                'color': color,
-                'is_featured': is_featured,
-                'in_stock': in_stock
-            }
+            'filters_applied': filters
         }), 200
     
     except Exception as e:
         current_app.logger.error(f"Error fetching products: {str(e)}")
         return jsonify({'error': 'Failed to fetch products'}), 500
 
+def _search_bitmap(search_ranking):
+    """Bitmap of the products matched by a full-text search subquery"""
+    if search_ranking is None:
+        return 0
+    return bitmap_from_ids(row[0] for row in db.session.query(search_ranking.c.product_id).all())
+
+def _page_from_catalog_index(filters, search_ranking, sort_by, descending, page, per_page, cursor_position, fields=None):
+    """Product listing page resolved by the bitmap filter engine.
+
+    Returns ((product, sort_value) rows, total matches, has_next) in the same
+    shape as the SQL path.
+    """
+    catalog_index.ensure_fresh()
+    
+    restrict = _search_bitmap(search_ranking) if filters['search'] else None
+    matches = catalog_index.match(filters, restrict=restrict)
+    
+    offset = 0 if cursor_position else (page - 1) * per_page
+    entries, has_next = catalog_index.page(
+        matches,
+        sort_by,
+        descending=descending,
+        offset=offset,
+        limit=per_page,
+        after=cursor_position
+    )
+    
+    page_ids = [product_id for product_id, _ in entries]
+    products_by_id = {
+        product.id: product
+        for product in Product.query.options(*product_query_options(fields)).filter(
+            Product.id.in_(page_ids),
+            Product.is_active == True
+        ).all()
+    } if page_ids else {}
+    
+    rows = [(products_by_id[product_id], value) for product_id, value in entries if product_id in products_by_id]
+    return rows, matches.bit_count(), has_next
+
 @products_bp.route('/<int:product_id>', methods=['GET', 'PUT', 'DELETE'])
 def product_detail(product_id):
     """Get, update, or delete a single product"""
@@ -228,6 +359,8 @@ def product_detail(product_id):
         return delete_product(product_id)
     return get_product(product_id)
 
+@conditional_get(stock='product_id')
+@cached_response(tags=['product-details'])
 def get_product(product_id):
     """Get single product by ID"""
     try:
@@ -236,6 +369,7 @@ def get_product(product_id):
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
+        tag_response(f'product:{product.id}')
         return jsonify({'product': product.to_dict(include_relations=True)}), 200
     
     except Exception as e:
@@ -260,7 +394,12 @@ def update_product(product_id):
         if 'price' in data:
             product.price = float(data['price'])
         if 'stock' in data:
-            product.stock_quantity = int(data['stock'])
+            stock = int(data['stock'])
+            # Sharded stock is replaced by spreading it over the shards
+            if stock != product.stock_quantity and sharded_product_ids([product.id]):
+                rebalance_stock_shards(product.id, total=stock)
+            else:
+                product.stock_quantity = stock
         if 'material' in data:
             product.material = data['material']
         if 'frameType' in data:
@@ -269,18 +408,21 @@ def update_product(product_id):
             product.frame_shape = data['frameShape']
         
         # Update brand if provided
+        new_brand_id = None
         if 'brand' in data and data['brand']:
-            brand = Brand.query.filter_by(name=data['brand']).first()
-            if not brand:
-                import re
-                brand_slug = re.sub(r'[^a-z0-9]+', '-', data['brand'].lower()).strip('-')
-                brand = Brand(name=data['brand'], slug=brand_slug)
-                db.session.add(brand)
-                db.session.flush()
+            brand, created = get_or_create_brand(data['brand'])
+            if created:
+                new_brand_id = brand.id
             product.brand_id = brand.id
         
         product.updated_at = datetime.utcnow()
+        # product.brand may still hold the old brand - reload it for the search document
+        db.session.flush()
+        db.session.expire(product, ['brand'])
+        index_product(product)
         db.session.commit()
+        product_changed(product.id)
+        brand_changed(new_brand_id)
         
         return jsonify({
             'message': 'Product updated successfully',
@@ -304,6 +446,7 @@ def delete_product(product_id):
         product.is_active = False
         product.updated_at = datetime.utcnow()
         db.session.commit()
+        product_changed(product.id)
         
         return jsonify({'message': 'Product deleted successfully'}), 200
     
@@ -313,6 +456,8 @@ def delete_product(product_id):
         return jsonify({'error': 'Failed to delete product'}), 500
 
 @products_bp.route('/slug/<slug>', methods=['GET'])
+@conditional_get
+@cached_response(tags=['product-details'])
 def get_product_by_slug(slug):
     """Get single product by slug"""
     try:
@@ -321,12 +466,139 @@ def get_product_by_slug(slug):
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
+        tag_response(f'product:{product.id}')
         return jsonify({'product': product.to_dict(include_details=True)}), 200
     
     except Exception as e:
         current_app.logger.error(f"Error fetching product with slug {slug}: {str(e)}")
         return jsonify({'error': 'Failed to fetch product'}), 500
 
+@products_bp.route('/batch', methods=['GET'])
+@conditional_get
+@cached_response(tags=['products'])
+def get_products_batch():
+    """Get several active products by ?ids= or ?slugs=, in request order.
+
+    Entries for unknown or inactive products are null and listed in not_found.
+    """
+    try:
+        if ('ids' in request.args) == ('slugs' in request.args):
+            return jsonify({'error': 'Provide either ids or slugs'}), 400
+        
+        key = 'id' if 'ids' in request.args else 'slug'
+        requested, batch_errors = validate_batch_param(
+            request.args.get(f'{key}s'),
+            max_items=current_app.config.get('PRODUCT_BATCH_MAX', 100),
+            as_int=key == 'id'
+        )
+        if batch_errors:
+            return jsonify({'errors': batch_errors}), 400
+        
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PUBLIC_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        
+        # The lookup key is always needed to put results back in request order
+        if fields and key not in fields:
+            fields = fields + [key]
+        
+        column = getattr(Product, key)
+        products = Product.query.options(*product_query_options(fields)).filter(
+            column.in_(set(requested)),
+            Product.is_active == True
+        ).all()
+        
+        serialized = {data[key]: data for data in serialize_products(products, fields=fields)}
+        
+        return jsonify({
+            'products': [serialized.get(value) for value in requested],
+            'not_found': [value for value in dict.fromkeys(requested) if value not in serialized]
+        }), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Error fetching product batch: {str(e)}")
+        return jsonify({'error': 'Failed to fetch products'}), 500
+
+@products_bp.route('/<int:product_id>/similar', methods=['GET'])
+@conditional_get
+@cached_response(tags=['products'])
+def get_similar_products(product_id):
+    """Get active products with the closest frame measurements and style"""
+    try:
+        limit = request.args.get('limit', 8, type=int)
+        
+        # Limit the number of similar products
+        limit = min(max(limit, 1), 20)
+        
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PUBLIC_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        
+        if not db.session.query(Product.id).filter_by(id=product_id, is_active=True).first():
+            return jsonify({'error': 'Product not found'}), 404
+        
+        similarity_index.ensure_fresh()
+        similar_ids = similarity_index.similar(product_id, limit)
+        
+        products = []
+        if similar_ids:
+            products_by_id = {
+                product.id: product
+                for product in Product.query.options(*product_query_options(fields)).filter(
+                    Product.id.in_(similar_ids),
+                    Product.is_active == True
+                ).all()
+            }
+            products = [products_by_id[similar_id] for similar_id in similar_ids if similar_id in products_by_id]
+        
+        return jsonify({
+            'products': serialize_products(products, fields=fields)
+        }), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Error fetching similar products: {str(e)}")
+        return jsonify({'error': 'Failed to fetch similar products'}), 500
+
+@products_bp.route('/<int:product_id>/bought-together', methods=['GET'])
+@cached_response(tags=['products'])
+def get_bought_together_products(product_id):
+    """Get active products most often ordered together with a product"""
+    try:
+        limit = request.args.get('limit', 8, type=int)
+        
+        # Limit the number of products
+        limit = min(max(limit, 1), 20)
+        
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PUBLIC_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        
+        if not db.session.query(Product.id).filter_by(id=product_id, is_active=True).first():
+            return jsonify({'error': 'Product not found'}), 404
+        
+        # Lists are refreshed by `flask recommendations refresh`; stale cached
+        # copies expire with RESPONSE_CACHE_TTL
+        related_ids = get_bought_together_ids(product_id)
+        
+        products = []
+        if related_ids:
+            products_by_id = {
+                product.id: product
+                for product in Product.query.options(*product_query_options(fields)).filter(
+                    Product.id.in_(related_ids),
+                    Product.is_active == True
+                ).all()
+            }
+            products = [products_by_id[related_id] for related_id in related_ids if related_id in products_by_id][:limit]
+        
+        return jsonify({
+            'products': serialize_products(products, fields=fields)
+        }), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Error fetching bought together products: {str(e)}")
+        return jsonify({'error': 'Failed to fetch bought together products'}), 500
+
 @products_bp.route('/<int:product_id>/reviews', methods=['GET'])
 def get_product_reviews(product_id):
     """Get reviews for a specific product"""
@@ -356,19 +628,6 @@ def get_product_reviews(product_id):
         
         reviews = reviews_pagination.items
         
-        # Calculate rating statistics
-        rating_stats = db.session.query(
-            Review.rating,
-            func.count(Review.rating).label('count')
-        ).filter_by(
-            product_id=product_id,
-            is_approved=True
-        ).group_by(Review.rating).all()
-        
-        rating_distribution = {str(i): 0 for i in range(1, 6)}
-        for rating, count in rating_stats:
-            rating_distribution[str(rating)] = count
-        
         return jsonify({
             'reviews': [review.to_dict() for review in reviews],
             'pagination': {
@@ -379,11 +638,7 @@ def get_product_reviews(product_id):
                 'has_next': reviews_pagination.has_next,
                 'has_prev': reviews_pagination.has_prev
             },
-            'rating_stats': {
-                'average_rating': product.get_average_rating(),
-                'total_reviews': product.get_review_count(),
-                'rating_distribution': rating_distribution
-            }
+            'rating_stats': get_rating_stats(product_id)
         }), 200
     
     except Exception as e:
@@ -391,36 +646,20 @@ def get_product_reviews(product_id):
         return jsonify({'error': 'Failed to fetch reviews'}), 500
 
 @products_bp.route('/categories', methods=['GET'])
+@conditional_get(stock=False)
+@cached_response(tags=['categories'])
 def get_categories():
     """Get all active categories"""
     try:
-        categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order, Category.name).all()
-        
-        # Organize categories hierarchically
-        category_tree = []
-        category_dict = {cat.id: cat.to_dict() for cat in categories}
-        
-        for category in categories:
-            cat_data = category_dict[category.id]
-            if category.parent_id is None:
-                # Root category
-                cat_data['subcategories'] = []
-                category_tree.append(cat_data)
-            else:
-                # Subcategory - add to parent
-                parent = category_dict.get(category.parent_id)
-                if parent and 'subcategories' not in parent:
-                    parent['subcategories'] = []
-                if parent:
-                    parent['subcategories'].append(cat_data)
-        
-        return jsonify({'categories': category_tree}), 200
+        return jsonify({'categories': get_category_tree()}), 200
     
     except Exception as e:
         current_app.logger.error(f"Error fetching categories: {str(e)}")
         return jsonify({'error': 'Failed to fetch categories'}), 500
 
 @products_bp.route('/brands', methods=['GET'])
+@conditional_get(stock=False)
+@cached_response(tags=['brands'])
 def get_brands():
     """Get all active brands"""
     try:
@@ -435,6 +674,8 @@ def get_brands():
         return jsonify({'error': 'Failed to fetch brands'}), 500
 
 @products_bp.route('/featured', methods=['GET'])
+@conditional_get
+@cached_response(tags=['products'])
 def get_featured_products():
     """Get featured products"""
     try:
@@ -444,13 +685,17 @@ def get_featured_products():
         if limit > 20:
             limit = 20
         
-        products = Product.query.filter_by(
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PUBLIC_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        
+        products = Product.query.options(*product_query_options(fields)).filter_by(
             is_active=True,
             is_featured=True
         ).order_by(Product.created_at.desc()).limit(limit).all()
         
         return jsonify({
-            'products': [product.to_dict() for product in products]
+            'products': serialize_products(products, fields=fields)
         }), 200
     
     except Exception as e:
@@ -473,79 +718,50 @@ def get_search_suggestions():
         
         query = sanitize_search_query(query)
         
-        # Get product name suggestions
-        product_suggestions = db.session.query(Product.name).filter(
-            and_(
-                Product.is_active == True,
-                Product.name.ilike(f'%{query}%')
-            )
-        ).limit(limit).all()
-        
-        # Get brand name suggestions
-        brand_suggestions = db.session.query(Brand.name).filter(
-            and_(
-                Brand.is_active == True,
-                Brand.name.ilike(f'%{query}%')
-            )
-        ).limit(limit).all()
-        
-        suggestions = []
-        suggestions.extend([product[0] for product in product_suggestions])
-        suggestions.extend([f"{brand[0]} (Brand)" for brand in brand_suggestions])
+        # Product names, brands and tags ranked by popularity from the in-memory index
+        suggestions = get_suggestions(query, limit)
         
-        # Remove duplicates and limit
-        unique_suggestions = list(set(suggestions))[:limit]
+        # Nothing starts with what was typed - retry with misspellings corrected
+        if not suggestions:
+            corrected = corrected_query(query)
+            if corrected:
+                suggestions = get_suggestions(corrected, limit)
         
-        return jsonify({'suggestions': unique_suggestions}), 200
+        return jsonify({'suggestions': suggestions}), 200
     
     except Exception as e:
         current_app.logger.error(f"Error getting search suggestions: {str(e)}")
         return jsonify({'error': 'Failed to get suggestions'}), 500
 
 @products_bp.route('/filters', methods=['GET'])
+@conditional_get
 def get_product_filters():
-    """Get available filter options for products"""
+    """Get available filter options with counts for the currently applied filters"""
     try:
-        # Get unique frame types
-        frame_types = db.session.query(Product.frame_type).filter(
-            and_(
-                Product.is_active == True,
-                Product.frame_type.isnot(None)
-            )
-        ).distinct().all()
+        filters = parse_product_filters()
         
-        # Get unique frame shapes
-        frame_shapes = db.session.query(Product.frame_shape).filter(
-            and_(
-                Product.is_active == True,
-                Product.frame_shape.isnot(None)
-            )
-        ).distinct().all()
+        catalog_index.ensure_fresh()
         
-        # Get unique colors
-        colors = db.session.query(Product.color).filter(
-            and_(
-                Product.is_active == True,
-                Product.color.isnot(None)
-            )
-        ).distinct().all()
+        # Full-text search is not part of the index - restrict to its matches
+        restrict = None
+        if filters['search']:
+            restrict = _search_bitmap(search_ranking_subquery(filters['search']))
         
-        # Get price range
-        price_range = db.session.query(
-            func.min(Product.price).label('min_price'),
-            func.max(Product.price).label('max_price')
-        ).filter(Product.is_active == True).first()
+        facets = catalog_index.facet_counts(filters, restrict=restrict)
+        min_price, max_price = catalog_index.price_bounds()
         
         return jsonify({
-            'frame_types': [ft[0] for ft in frame_types if ft[0]],
-            'frame_shapes': [fs[0] for fs in frame_shapes if fs[0]],
-            'colors': [color[0] for color in colors if color[0]],
+            'frame_types': catalog_index.values('frame_type'),
+            'frame_shapes': catalog_index.values('frame_shape'),
+            'colors': catalog_index.values('color'),
             'price_range': {
-                'min': float(price_range.min_price) if price_range.min_price else 0,
-                'max': float(price_range.max_price) if price_range.max_price else 1000
-            }
+                'min': min_price if min_price else 0,
+                'max': max_price if max_price else 1000
+            },
+            'facets': facets,
+            'filters_applied': filters
         }), 200
     
     except Exception as e:
         current_app.logger.error(f"Error fetching product filters: {str(e)}")
-        return jsonify({'error': 'Failed to fetch filters'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to fetch filters'}), 500
@@ -1,12 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, User, Address, Prescription
+from app.models import db, User, Address, Prescription, Product
+from app.models.catalog import ProductPopularity
 from app.utils.auth import get_current_user
 from app.utils.validators import (
     validate_json, validate_required_fields, 
     validate_address_data, validate_prescription_data,
-    validate_email, validate_phone
+    validate_email, validate_phone, validate_fields_param
 )
+from app.services.recommendation_service import get_recommended_ids
+from app.services.product_serializer import serialize_products, product_query_options, PUBLIC_FIELDS
 
 users_bp = Blueprint('users', __name__)
 
@@ -349,4 +352,53 @@ def delete_prescription(prescription_id):
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error deleting prescription: {str(e)}")
-        return jsonify({'error': 'Failed to delete prescription'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to delete prescription'}), 500
+
+@users_bp.route('/recommendations', methods=['GET'])
+@jwt_required()
+def get_recommendations():
+    """Get personalized product recommendations"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        limit = request.args.get('limit', 12, type=int)
+        
+        # Limit the number of recommendations
+        limit = min(max(limit, 1), 20)
+        
+        fields, field_errors = validate_fields_param(request.args.get('fields', ''), PUBLIC_FIELDS)
+        if field_errors:
+            return jsonify({'errors': field_errors}), 400
+        
+        # Precomputed by `flask recommendations train`
+        source = 'personalized'
+        product_ids = get_recommended_ids(current_user_id)
+        
+        products = []
+        if product_ids:
+            products_by_id = {
+                product.id: product
+                for product in Product.query.options(*product_query_options(fields)).filter(
+                    Product.id.in_(product_ids),
+                    Product.is_active == True
+                ).all()
+            }
+            products = [products_by_id[product_id] for product_id in product_ids if product_id in products_by_id][:limit]
+        
+        if not products:
+            # New users and users without history get the most popular products
+            source = 'popular'
+            products = Product.query.options(*product_query_options(fields)).join(
+                ProductPopularity, ProductPopularity.product_id == Product.id
+            ).filter(Product.is_active == True).order_by(
+                ProductPopularity.score.desc(),
+                Product.created_at.desc()
+            ).limit(limit).all()
+        
+        return jsonify({
+            'products': serialize_products(products, fields=fields),
+            'source': source
+        }), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Error fetching recommendations: {str(e)}")
+        return jsonify({'error': 'Failed to fetch recommendations'}), 500
@@ -0,0 +1,211 @@
+from flask import current_app, request, g
+from functools import wraps
+from app.services.catalog_events import on_product_changed, on_brand_changed, on_stock_changed
+from collections import OrderedDict
+import json
+import threading
+import time
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL and tag based invalidation"""
+
+    def __init__(self, max_entries=1024):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}                # tag -> set of keys
+        self.max_entries = max_entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._delete(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            self._delete(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+
+    def invalidate_tags(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.pop(tag, ())):
+                    self._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class RedisCache:
+    """Cache shared by all workers, stored in Redis.
+
+    Each tag is a Redis set of the keys stored under it, so invalidation
+    from any worker removes the entries for every worker.
+    """
+
+    def __init__(self, url, prefix='almahra:cache:'):
+        import redis  # Optional dependency, only needed for this backend
+
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl, tags=()):
+        pipe = self._client.pipeline()
+        pipe.setex(self.prefix + key, int(ttl), json.dumps(value))
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, int(ttl) * 2)
+        pipe.execute()
+
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            keys = self._client.smembers(tag_key)
+            pipe = self._client.pipeline()
+            for key in keys:
+                pipe.delete(self.prefix + key.decode())
+            pipe.delete(tag_key)
+            pipe.execute()
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=f'{self.prefix}*'))
+        if keys:
+            self._client.delete(*keys)
+
+class NullCache:
+    """Backend that stores nothing, used when caching is disabled"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl, tags=()):
+        pass
+
+    def invalidate_tags(self, *tags):
+        pass
+
+    def clear(self):
+        pass
+
+def init_cache(app):
+    """Create the response cache backend selected by RESPONSE_CACHE_BACKEND"""
+    backend = app.config.get('RESPONSE_CACHE_BACKEND', 'local')
+
+    if backend == 'redis' and app.config.get('REDIS_URL'):
+        try:
+            cache = RedisCache(app.config['REDIS_URL'])
+        except ImportError:
+            app.logger.warning("redis package not installed, falling back to local response cache")
+            cache = LocalCache(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    elif backend in ('local', 'redis'):
+        cache = LocalCache(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    else:
+        cache = NullCache()
+
+    app.extensions['response_cache'] = cache
+    return cache
+
+def get_cache():
+    """The response cache of the current app"""
+    cache = current_app.extensions.get('response_cache')
+    if cache is None:
+        cache = init_cache(current_app._get_current_object())
+    return cache
+
+def invalidate_tags(*tags):
+    """Drop every cached response stored under any of ``tags``"""
+    try:
+        get_cache().invalidate_tags(*tags)
+    except Exception as e:
+        current_app.logger.error(f"Failed to invalidate cache tags {tags}: {str(e)}")
+
+def normalized_request_key():
+    """Endpoint path plus normalized (sorted) query arguments"""
+    args = sorted((key, value) for key, values in request.args.lists() for value in values)
+    query = '&'.join(f'{key}={value}' for key, value in args)
+    return f'{request.path}?{query}'
+
+def tag_response(*tags):
+    """Store the response the current view builds under ``tags`` too (see cached_response)"""
+    g.setdefault('response_cache_tags', []).extend(tags)
+
+def cached_response(tags, timeout=None):
+    """Cache successful JSON responses of anonymous GET requests under ``tags``"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method != 'GET' or request.headers.get('Authorization'):
+                return f(*args, **kwargs)
+
+            cache = get_cache()
+            key = normalized_request_key()
+            if g.get('catalog_version') is not None:
+                # Set by conditional_get - never serve a body older than the ETag sent with it
+                key = f"{key}#v{g.catalog_version}"
+
+            try:
+                cached = cache.get(key)
+            except Exception as e:
+                current_app.logger.error(f"Response cache read failed: {str(e)}")
+                cached = None
+
+            if cached is not None:
+                response = current_app.response_class(cached['body'], status=200, mimetype='application/json')
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                ttl = timeout or current_app.config.get('RESPONSE_CACHE_TTL', 60)
+                try:
+                    cache.set(key, {'body': response.get_data(as_text=True)}, ttl, list(tags) + g.pop('response_cache_tags', []))
+                except Exception as e:
+                    current_app.logger.error(f"Response cache write failed: {str(e)}")
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated
+    return decorator
+
+# Catalog invalidation - product dicts embed brand and category data, so
+# brand writes also drop cached product responses
+
+@on_product_changed
+def _invalidate_product_responses(product_ids):
+    invalidate_tags('products', 'product-details')
+
+@on_brand_changed
+def _invalidate_brand_responses(brand_ids):
+    invalidate_tags('brands', 'products', 'product-details')
+
+# Stock moves only drop the pages of the products concerned; other entries
+# are keyed by the stock version (see conditional_get) and age out
+
+@on_stock_changed
+def _invalidate_stock_responses(product_ids):
+    invalidate_tags(*(f'product:{product_id}' for product_id in product_ids))
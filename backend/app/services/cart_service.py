@@ -0,0 +1,125 @@
+from sqlalchemy import func, select
+from app.models import db, CartItem, Product, ProductVariant, ProductImage, Prescription
+from app.services.inventory_service import available_stock_columns
+import json
+
+# Read model of a user's cart. Lines, product and variant pricing, the
+# stock available to the user, the primary image and the cart subtotal come
+# back from a single query, so opening the cart costs one round trip however
+# many lines it has.
+
+def _json_or_none(value):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (ValueError, TypeError):
+        return value
+
+def _money(value):
+    return float(value) if value is not None else None
+
+def _cart_query(user_id):
+    primary_image = select(ProductImage.image_url).where(
+        ProductImage.product_id == CartItem.product_id
+    ).order_by(
+        ProductImage.is_primary.desc(),
+        ProductImage.sort_order,
+        ProductImage.id
+    ).limit(1).correlate(CartItem).scalar_subquery()
+
+    product_available, variant_available = available_stock_columns(user_id)
+    unit_price = Product.price + func.coalesce(ProductVariant.price_adjustment, 0)
+    line_total = unit_price * CartItem.quantity
+
+    return db.session.query(
+        CartItem.id,
+        CartItem.product_id,
+        CartItem.product_variant_id,
+        CartItem.prescription_id,
+        CartItem.quantity,
+        CartItem.lens_options,
+        CartItem.frame_adjustments,
+        CartItem.special_instructions,
+        CartItem.created_at,
+        CartItem.updated_at,
+        Product.name.label('product_name'),
+        Product.sku.label('product_sku'),
+        Product.slug.label('product_slug'),
+        Product.price.label('product_price'),
+        Product.compare_price.label('product_compare_price'),
+        product_available.label('product_stock'),
+        Product.track_inventory,
+        Product.is_active.label('product_is_active'),
+        ProductVariant.name.label('variant_name'),
+        ProductVariant.sku.label('variant_sku'),
+        ProductVariant.price_adjustment.label('variant_price_adjustment'),
+        variant_available.label('variant_stock'),
+        Prescription.prescription_name,
+        primary_image.label('primary_image'),
+        unit_price.label('unit_price'),
+        line_total.label('total_price'),
+        func.sum(line_total).over().label('subtotal'),
+        func.sum(CartItem.quantity).over().label('total_quantity')
+    ).join(
+        Product, Product.id == CartItem.product_id
+    ).outerjoin(
+        ProductVariant, ProductVariant.id == CartItem.product_variant_id
+    ).outerjoin(
+        Prescription, Prescription.id == CartItem.prescription_id
+    ).filter(
+        CartItem.user_id == user_id
+    ).order_by(CartItem.created_at, CartItem.id)
+
+def _line(row):
+    # As in check_availability: a variant never has more than its product
+    available = row.product_stock or 0
+    if row.product_variant_id:
+        available = min(row.variant_stock or 0, available)
+    available = max(available, 0)
+    return {
+        'id': row.id,
+        'product_id': row.product_id,
+        'product_variant_id': row.product_variant_id,
+        'prescription_id': row.prescription_id,
+        'quantity': row.quantity,
+        'unit_price': _money(row.unit_price),
+        'total_price': _money(row.total_price),
+        'lens_options': _json_or_none(row.lens_options),
+        'frame_adjustments': _json_or_none(row.frame_adjustments),
+        'special_instructions': row.special_instructions,
+        'product': {
+            'id': row.product_id,
+            'name': row.product_name,
+            'sku': row.product_sku,
+            'slug': row.product_slug,
+            'price': _money(row.product_price),
+            'compare_price': _money(row.product_compare_price),
+            'primary_image': row.primary_image,
+            'is_active': row.product_is_active,
+            'in_stock': not row.track_inventory or available >= row.quantity,
+            'stock_quantity': available
+        },
+        'variant': {
+            'id': row.product_variant_id,
+            'name': row.variant_name,
+            'sku': row.variant_sku,
+            'price_adjustment': _money(row.variant_price_adjustment) or 0.0
+        } if row.product_variant_id else None,
+        'prescription': {
+            'id': row.prescription_id,
+            'prescription_name': row.prescription_name
+        } if row.prescription_id else None,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None
+    }
+
+def get_cart_view(user_id):
+    """A user's cart lines and totals, read with one query"""
+    rows = _cart_query(user_id).all()
+    return {
+        'cart_items': [_line(row) for row in rows],
+        'total_items': len(rows),
+        'total_quantity': int(rows[0].total_quantity) if rows else 0,
+        'total_amount': _money(rows[0].subtotal) if rows else 0.0
+    }
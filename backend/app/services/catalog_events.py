@@ -0,0 +1,51 @@
+from flask import current_app
+
+# In-process listeners notified after catalog writes have been committed.
+# Each listener receives a list of the ids that were created or changed.
+# Stock moves (checkouts, cancellations) are a separate, far more frequent
+# event, so listeners that only care about catalog data skip them.
+_product_listeners = []
+_brand_listeners = []
+_stock_listeners = []
+
+def on_product_changed(listener):
+    """Register a listener for committed product changes (usable as decorator)"""
+    if listener not in _product_listeners:
+        _product_listeners.append(listener)
+    return listener
+
+def on_brand_changed(listener):
+    """Register a listener for committed brand changes (usable as decorator)"""
+    if listener not in _brand_listeners:
+        _brand_listeners.append(listener)
+    return listener
+
+def on_stock_changed(listener):
+    """Register a listener for committed stock-only product changes (usable as decorator)"""
+    if listener not in _stock_listeners:
+        _stock_listeners.append(listener)
+    return listener
+
+def _notify(listeners, ids):
+    ids = [id for id in ids if id is not None]
+    if not ids:
+        return
+
+    for listener in listeners:
+        try:
+            listener(ids)
+        except Exception as e:
+            # A stale in-memory index or cache must never fail the write that triggered it
+            current_app.logger.error(f"Catalog listener {listener.__name__} failed: {str(e)}")
+
+def product_changed(*product_ids):
+    """Notify listeners that products were written. Call after db.session.commit()"""
+    _notify(_product_listeners, product_ids)
+
+def brand_changed(*brand_ids):
+    """Notify listeners that brands were written. Call after db.session.commit()"""
+    _notify(_brand_listeners, brand_ids)
+
+def stock_changed(*product_ids):
+    """Notify listeners that only the stock of products changed. Call after db.session.commit()"""
+    _notify(_stock_listeners, product_ids)
@@ -0,0 +1,438 @@
+from flask import current_app
+from sqlalchemy import func, select, insert, update, delete, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Product, Brand, Category
+from app.models.catalog import CatalogImportJob
+from app.models.search import ProductSearchDocument
+from app.services.search_service import index_product
+from app.services.catalog_events import product_changed, brand_changed
+from app.services.stock_shards import sharded_product_ids, rebalance_stock_shards
+from app.services.popularity_service import ensure_popularity_rows
+from app.utils.validators import validate_product_data, validate_required_fields, PRODUCT_REQUIRED_FIELDS
+from app.utils.identifiers import slugify, next_free_identifier, flush_with_unique_retry
+from datetime import datetime
+import csv
+import json
+import os
+import threading
+import uuid
+
+IMPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+TEXT_COLUMNS = (
+    'name', 'description', 'short_description', 'sku', 'slug', 'color', 'material',
+    'frame_type', 'frame_shape', 'lens_type', 'dimensions', 'meta_title', 'meta_description'
+)
+NUMBER_COLUMNS = ('price', 'compare_price', 'cost_price', 'weight')
+INTEGER_COLUMNS = (
+    'stock_quantity', 'low_stock_threshold', 'frame_width', 'lens_width', 'bridge_width', 'temple_length'
+)
+BOOLEAN_COLUMNS = ('is_active', 'is_featured', 'track_inventory', 'allow_backorder')
+
+# Values for columns a new product's row leaves out or blank. On existing
+# products blank cells keep the current value
+COLUMN_DEFAULTS = {'is_active': True, 'is_featured': False, 'track_inventory': True, 'stock_quantity': 0}
+
+# Set when a product is first inserted, never overwritten by a re-import
+INSERT_ONLY_COLUMNS = ('sku', 'slug', 'created_at', 'published_at')
+
+# Slugs picked for a new row before it is rejected as a conflict
+SLUG_ATTEMPTS = 3
+
+def import_format(filename):
+    """'csv' or 'jsonl' for a supported upload name, otherwise None"""
+    return IMPORT_FORMATS.get(os.path.splitext((filename or '').lower())[1])
+
+def iter_rows(path, file_format):
+    """Yield (row_number, row) pairs, reading the file one row at a time"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if file_format == 'csv':
+            for number, row in enumerate(csv.DictReader(f), start=1):
+                yield number, row
+            return
+
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+def _split_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).replace(';', '|').split('|') if item.strip()]
+
+class _Lookups:
+    """Brand and category ids by name, loaded once per import"""
+
+    def __init__(self):
+        self.brands = {brand.name.lower(): brand for brand in Brand.query.all()}
+        self.categories = {}
+        for category in Category.query.all():
+            self.categories[category.name.lower()] = category.id
+            self.categories[category.slug.lower()] = category.id
+
+def _prepare_row(raw, lookups):
+    """Validate and convert one input row. Returns (prepared, errors)"""
+    if not isinstance(raw, dict):
+        return None, ['Row is not a valid JSON object']
+
+    raw = {key.strip(): _clean(value) for key, value in raw.items() if key}
+    if raw.get('sku') is not None:
+        raw['sku'] = str(raw['sku'])
+
+    # Rows of existing skus may leave any other column out; whether a row
+    # creates a product is only known once its batch is written
+    present = {key: value for key, value in raw.items() if value is not None}
+    errors = validate_required_fields(present, ['sku']) + validate_product_data(present, partial=True)
+    if errors:
+        return None, errors
+
+    values = {}
+    for column in TEXT_COLUMNS:
+        if column in raw:
+            values[column] = str(raw[column]) if raw[column] is not None else None
+    values['sku'] = values['sku'].strip()
+
+    for columns, convert, label in (
+        (NUMBER_COLUMNS, float, 'a number'),
+        (INTEGER_COLUMNS, int, 'an integer')
+    ):
+        for column in columns:
+            if column not in raw:
+                continue
+            try:
+                values[column] = convert(raw[column]) if raw[column] is not None else None
+            except (ValueError, TypeError):
+                errors.append(f"{column} must be {label}")
+
+    for column in BOOLEAN_COLUMNS:
+        if raw.get(column) is not None:
+            values[column] = _parse_bool(raw[column])
+
+    if 'tags' in raw:
+        tags = _split_list(raw['tags'])
+        values['tags'] = json.dumps(tags) if tags else None
+
+    category_ids = None
+    if 'categories' in raw:
+        category_ids = []
+        for name in _split_list(raw['categories']):
+            category_id = lookups.categories.get(name.lower())
+            if category_id is None:
+                errors.append(f"Unknown category: {name}")
+            else:
+                category_ids.append(category_id)
+
+    if errors:
+        return None, errors
+
+    return {
+        'values': values,
+        'brand': raw.get('brand'),
+        'category_ids': category_ids,
+        'create_errors': validate_required_fields(present, PRODUCT_REQUIRED_FIELDS)
+    }, []
+
+def _resolve_brand(name, lookups, new_brand_ids):
+    brand = lookups.brands.get(name.lower())
+    if brand is not None:
+        return brand.id
+
+    def assign_slug(brand):
+        brand.slug = next_free_identifier(Brand.slug, slugify(name, 'brand'))
+
+    try:
+        brand = flush_with_unique_retry(Brand(name=name), assign_slug)
+        new_brand_ids.append(brand.id)
+    except IntegrityError:
+        # Created concurrently under the same name
+        brand = Brand.query.filter_by(name=name).first()
+        if brand is None:
+            raise
+    lookups.brands[name.lower()] = brand
+    return brand.id
+
+def _upsert_statement(columns):
+    """INSERT ... ON CONFLICT (sku) DO UPDATE returning (id, sku), or None if unsupported"""
+    table = Product.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        return None
+
+    dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    statement = dialect_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.sku],
+        set_={
+            column: func.coalesce(statement.excluded[column], table.c[column])
+            for column in columns if column not in INSERT_ONLY_COLUMNS
+        }
+    ).returning(table.c.id, table.c.sku)
+
+def _upsert(params, columns):
+    """Write rows keyed by sku, returning {sku: product_id}"""
+    statement = _upsert_statement(columns)
+    if statement is not None:
+        return {sku: product_id for product_id, sku in db.session.execute(statement, params)}
+
+    # Dialects without ON CONFLICT - look up existing skus once, then update or insert
+    table = Product.__table__
+    existing = dict(db.session.execute(
+        select(table.c.sku, table.c.id).where(table.c.sku.in_([row['sku'] for row in params]))
+    ).all())
+    ids = {}
+    for row in params:
+        if row['sku'] in existing:
+            changes = {
+                column: row[column] for column in columns
+                if column not in INSERT_ONLY_COLUMNS and row[column] is not None
+            }
+            db.session.execute(update(table).where(table.c.id == existing[row['sku']]).values(**changes))
+            ids[row['sku']] = existing[row['sku']]
+        else:
+            result = db.session.execute(insert(table).values(**row))
+            ids[row['sku']] = result.inserted_primary_key[0]
+    return ids
+
+def _new_slug(values, reserved=()):
+    base = values.get('slug') or slugify(f"{values['name']} {values['sku']}", 'product')
+    return next_free_identifier(Product.slug, base, reserved)
+
+def _update_existing(params, columns):
+    """Write rows of skus that already exist; blank cells keep the current value"""
+    table = Product.__table__
+    statement = update(table).where(table.c.sku == bindparam('row_sku')).values({
+        column: func.coalesce(bindparam(f'row_{column}'), table.c[column])
+        for column in columns if column not in INSERT_ONLY_COLUMNS
+    })
+    db.session.execute(statement, [
+        {'row_sku': row['sku'], **{f'row_{column}': row[column] for column in columns if column not in INSERT_ONLY_COLUMNS}}
+        for row in params
+    ])
+
+def _write_batch(batch, lookups, new_brand_ids, record_error):
+    """Upsert one batch of prepared rows. Returns the ids of written products"""
+    now = datetime.utcnow()
+
+    # The last occurrence of a sku within a batch wins, earlier ones are reported
+    latest = {}
+    for number, prepared in batch:
+        sku = prepared['values']['sku']
+        if sku in latest:
+            record_error(latest[sku][0], sku, [f"Superseded by row {number} with the same SKU"])
+        latest[sku] = (number, prepared)
+
+    table = Product.__table__
+    existing = dict(db.session.execute(
+        select(table.c.sku, table.c.id).where(table.c.sku.in_(list(latest)))
+    ).all())
+
+    rows = {}
+    for sku, (number, prepared) in latest.items():
+        if sku not in existing and prepared['create_errors']:
+            record_error(number, sku, prepared['create_errors'])
+            continue
+        values = dict(prepared['values'])
+        if prepared['brand']:
+            values['brand_id'] = _resolve_brand(prepared['brand'], lookups, new_brand_ids)
+        rows[sku] = (number, values, prepared['category_ids'])
+
+    if not rows:
+        return []
+
+    columns = set(COLUMN_DEFAULTS) | {'slug', 'created_at', 'updated_at', 'published_at'}
+    for _, values, _ in rows.values():
+        columns.update(values)
+    columns = sorted(columns)
+
+    updates, creates = [], []
+    slugs = []
+    for number, values, _ in rows.values():
+        row = {column: values.get(column) for column in columns}
+        row['created_at'] = row['updated_at'] = row['published_at'] = now
+        if values['sku'] in existing:
+            updates.append(row)
+            continue
+        for column, default in COLUMN_DEFAULTS.items():
+            if row[column] is None:
+                row[column] = default
+        row['slug'] = _new_slug(values, slugs)
+        slugs.append(row['slug'])
+        creates.append((number, values, row))
+
+    ids = {sku: existing[sku] for sku in rows if sku in existing}
+    if updates:
+        _update_existing(updates, columns)
+
+    # New skus are still upserted - another import may create them meanwhile
+    if creates:
+        try:
+            with db.session.begin_nested():
+                ids.update(_upsert([row for _, _, row in creates], columns))
+        except IntegrityError:
+            # A concurrent writer took one of the slugs (or another unique value) -
+            # write row by row, picking new slugs, so only rows that still
+            # conflict are rejected
+            for number, values, row in creates:
+                for attempt in range(SLUG_ATTEMPTS):
+                    try:
+                        with db.session.begin_nested():
+                            ids.update(_upsert([row], columns))
+                        break
+                    except IntegrityError as e:
+                        if attempt == SLUG_ATTEMPTS - 1:
+                            record_error(number, values['sku'], [f"Conflicts with an existing product: {e.orig}"])
+                            break
+                        row['slug'] = _new_slug(values)
+
+    product_ids = list(ids.values())
+    if not product_ids:
+        return []
+
+    # Replace category links for rows that list categories
+    product_categories = Product.categories.property.secondary
+    links = {ids[sku]: category_ids for sku, (_, _, category_ids) in rows.items() if sku in ids and category_ids is not None}
+    if links:
+        db.session.execute(delete(product_categories).where(product_categories.c.product_id.in_(list(links))))
+        pairs = [
+            {'product_id': product_id, 'category_id': category_id}
+            for product_id, category_ids in links.items()
+            for category_id in dict.fromkeys(category_ids)
+        ]
+        if pairs:
+            db.session.execute(insert(product_categories), pairs)
+
+    ensure_popularity_rows(product_ids)
+
+    # Imported stock of sharded products is spread over their shards
+    stock = {
+        ids[sku]: values['stock_quantity'] for sku, (_, values, _) in rows.items()
+        if sku in ids and values.get('stock_quantity') is not None
+    }
+    for product_id in sorted(sharded_product_ids(stock)):
+        rebalance_stock_shards(product_id, total=stock[product_id])
+
+    # Search documents - preload so index_product finds them in the identity map
+    ProductSearchDocument.query.filter(ProductSearchDocument.product_id.in_(product_ids)).all()
+    for product in Product.query.filter(Product.id.in_(product_ids)).all():
+        index_product(product)
+
+    return product_ids
+
+def run_import(job_id, path, batch_size=None):
+    """Process an import job's file in batches, recording progress on the job"""
+    batch_size = batch_size or current_app.config.get('CATALOG_IMPORT_BATCH_SIZE', 500)
+    max_errors = current_app.config.get('CATALOG_IMPORT_MAX_ERRORS', 1000)
+
+    job = db.session.get(CatalogImportJob, job_id)
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    errors = []
+
+    def record_error(number, sku, messages):
+        job.rows_failed += 1
+        if len(errors) < max_errors:
+            errors.append({'row': number, 'sku': sku, 'errors': messages})
+
+    def flush(batch):
+        new_brand_ids = []
+        failed_before = job.rows_failed
+        product_ids = _write_batch(batch, lookups, new_brand_ids, record_error)
+        job.rows_imported += len(batch) - (job.rows_failed - failed_before)
+        job.errors = json.dumps(errors)
+        db.session.commit()
+        product_changed(*product_ids)
+        brand_changed(*new_brand_ids)
+
+    try:
+        lookups = _Lookups()
+        batch = []
+        for number, raw in iter_rows(path, job.file_format):
+            job.rows_processed += 1
+            prepared, row_errors = _prepare_row(raw, lookups)
+            if row_errors:
+                record_error(number, raw.get('sku') if isinstance(raw, dict) else None, row_errors)
+                continue
+
+            batch.append((number, prepared))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+
+        if batch:
+            flush(batch)
+
+        job.status = 'completed'
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Catalog import {job_id} failed: {str(e)}")
+        job = db.session.get(CatalogImportJob, job_id)
+        job.status = 'failed'
+        job.error_message = str(e)
+    finally:
+        job.errors = json.dumps(errors)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        if os.path.exists(path):
+            os.remove(path)
+
+    return job
+
+def _run_in_background(app, job_id, path, batch_size):
+    with app.app_context():
+        try:
+            run_import(job_id, path, batch_size)
+        finally:
+            db.session.remove()
+
+def start_import(upload, file_format, user_id=None, batch_size=None):
+    """Store the upload and start an import job for it.
+
+    The file is copied to UPLOAD_FOLDER/imports and processed by a
+    background thread (or inline when CATALOG_IMPORT_ASYNC is off).
+    """
+    directory = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), 'imports')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{uuid.uuid4().hex}.{file_format}')
+    upload.save(path)
+
+    job = CatalogImportJob(
+        user_id=user_id,
+        filename=(upload.filename or 'upload')[:255],
+        file_format=file_format,
+        status='pending'
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    if current_app.config.get('CATALOG_IMPORT_ASYNC', True):
+        app = current_app._get_current_object()
+        threading.Thread(
+            target=_run_in_background,
+            args=(app, job.id, path, batch_size),
+            daemon=True
+        ).start()
+    else:
+        run_import(job.id, path, batch_size)
+
+    return job
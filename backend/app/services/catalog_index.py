@@ -0,0 +1,427 @@
+from flask import current_app
+from app.models import db, Product, Category, Brand
+from app.models.catalog import ProductPopularity, CategoryClosure
+from app.services.catalog_events import on_product_changed, on_stock_changed
+from app.services.catalog_version import get_catalog_version
+from app.services.stock_shards import current_stock
+import bisect
+import math
+import threading
+import time
+
+# Facets exposed to clients, in response order
+FACETS = ('frame_type', 'frame_shape', 'color', 'brand', 'category')
+
+# Columns the index keeps presorted id lists for (see CatalogIndex.page)
+SORT_KEYS = ('name', 'price', 'created_at', 'updated_at', 'popularity', 'id')
+
+def _sort_entry(value, product_id):
+    """Sortable (key, id) entry; NULL keys rank above every value, as in keyset_order.
+
+    Strings compare by code point, which is SQLite's default collation but
+    not necessarily the database's, so name order can differ from SQL.
+    """
+    return ((value is None, value), product_id)
+
+# Set bit positions of every byte value, for iter_ids
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+def iter_ids(bitmap):
+    """Yield the set bit positions (product ids) of a bitmap in ascending order.
+
+    Walks the bitmap as bytes - shifting or masking the int per id would
+    copy the whole bitmap each time.
+    """
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for index, byte in enumerate(data):
+        if byte:
+            base = index * 8
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+def bitmap_from_ids(ids):
+    """Build a bitmap with a bit set for every id, in one pass over a byte buffer"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for product_id in ids:
+        data[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(data, 'little')
+
+class CatalogIndex:
+    """Per-worker posting-list index over the attributes of active products.
+
+    Each attribute value maps to a bitmap (a Python int with bit ``id`` set
+    for every matching product), so combining filters is a handful of
+    bitwise ANDs and a facet count is ``(posting & matches).bit_count()``.
+    Prices are bucketed into PRICE_BUCKET_SIZE wide bitmaps for the
+    histogram and for range filtering, and a presorted (key, id) list per
+    sortable column lets a page of a filtered listing be read without SQL.
+
+    The index is loaded lazily and patched in place when products change.
+    It is rebuilt when the catalog version moves (writes from other
+    processes, category moves), when the app talks to another database and
+    when older than CATALOG_INDEX_TTL, which bounds stock moved elsewhere.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.active = 0
+        self.postings = {facet: {} for facet in FACETS + ('featured', 'in_stock')}
+        self.price_buckets = {}
+        self.prices = {}
+        self.documents = {}
+        self.sorted_ids = {key: [] for key in SORT_KEYS}
+        self.sort_entries = {}
+        self.brand_names = {}
+        self.category_names = {}
+        self.source = None
+        self.built_at = None
+
+    @property
+    def bucket_size(self):
+        return current_app.config.get('FACET_PRICE_BUCKET_SIZE', 50)
+
+    def _load(self, product_ids=None):
+        """Read indexed attributes for active products as plain rows.
+
+        A product is listed under its categories and all of their ancestors
+        (from the closure table), so a category's posting covers its whole
+        subtree, as the SQL category filter does.
+        """
+        query = db.session.query(
+            Product.id, Product.frame_type, Product.frame_shape, Product.color,
+            Product.brand_id, Product.is_featured, Product.track_inventory,
+            current_stock().label('stock_quantity'), Product.price, Product.name,
+            Product.created_at, Product.updated_at,
+            ProductPopularity.score.label('popularity')
+        ).join(
+            ProductPopularity, ProductPopularity.product_id == Product.id
+        ).filter(Product.is_active == True)
+
+        category_query = db.session.query(Product.id, CategoryClosure.ancestor_id).join(
+            Product.categories
+        ).join(
+            CategoryClosure, CategoryClosure.descendant_id == Category.id
+        ).distinct()
+
+        if product_ids is not None:
+            query = query.filter(Product.id.in_(product_ids))
+            category_query = category_query.filter(Product.id.in_(product_ids))
+
+        categories = {}
+        for product_id, category_id in category_query.all():
+            categories.setdefault(product_id, []).append(category_id)
+
+        return query.all(), categories
+
+    def _load_labels(self):
+        self.brand_names = dict(db.session.query(Brand.id, Brand.name).all())
+        self.category_names = dict(
+            db.session.query(Category.id, Category.name).filter(Category.is_active == True).all()
+        )
+
+    def _document(self, row, category_ids):
+        """Record a product's facet values, price and sort entries; returns its facet values"""
+        in_stock = not row.track_inventory or (row.stock_quantity or 0) > 0
+        document = {
+            'frame_type': [row.frame_type] if row.frame_type else [],
+            'frame_shape': [row.frame_shape] if row.frame_shape else [],
+            'color': [row.color] if row.color else [],
+            'brand': [row.brand_id] if row.brand_id else [],
+            'category': list(category_ids),
+            'featured': [bool(row.is_featured)],
+            'in_stock': [in_stock]
+        }
+        self.documents[row.id] = document
+        self.prices[row.id] = float(row.price or 0)
+        self.sort_entries[row.id] = {key: _sort_entry(getattr(row, key), row.id) for key in SORT_KEYS}
+        return document
+
+    def _add(self, row, category_ids):
+        """Patch a single product into the postings"""
+        bit = 1 << row.id
+        for facet, values in self._document(row, category_ids).items():
+            postings = self.postings[facet]
+            for value in values:
+                postings[value] = postings.get(value, 0) | bit
+
+        bucket = int(self.prices[row.id] // self.bucket_size)
+        self.price_buckets[bucket] = self.price_buckets.get(bucket, 0) | bit
+        self.active |= bit
+
+        for key, entry in self.sort_entries[row.id].items():
+            bisect.insort(self.sorted_ids[key], entry)
+
+    def _remove(self, product_id):
+        document = self.documents.pop(product_id, None)
+        if document is None:
+            return
+
+        for key, entry in self.sort_entries.pop(product_id).items():
+            entries = self.sorted_ids[key]
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+
+        mask = ~(1 << product_id)
+        for facet, values in document.items():
+            postings = self.postings[facet]
+            for value in values:
+                remaining = postings.get(value, 0) & mask
+                if remaining:
+                    postings[value] = remaining
+                else:
+                    postings.pop(value, None)
+
+        bucket = int(self.prices.pop(product_id) // self.bucket_size)
+        remaining = self.price_buckets.get(bucket, 0) & mask
+        if remaining:
+            self.price_buckets[bucket] = remaining
+        else:
+            self.price_buckets.pop(bucket, None)
+        self.active &= mask
+
+    def rebuild(self):
+        """Rebuild the whole index from the database.
+
+        Ids are gathered per value first and each bitmap is built once, so
+        a rebuild is linear in the catalog size.
+        """
+        source = self._source()
+        rows, categories = self._load()
+        with self._lock:
+            self._reset()
+            self._load_labels()
+
+            posting_ids = {facet: {} for facet in self.postings}
+            bucket_ids = {}
+            for row in rows:
+                document = self._document(row, categories.get(row.id, []))
+                for facet, values in document.items():
+                    for value in values:
+                        posting_ids[facet].setdefault(value, []).append(row.id)
+                bucket = int(self.prices[row.id] // self.bucket_size)
+                bucket_ids.setdefault(bucket, []).append(row.id)
+
+            for facet, values in posting_ids.items():
+                self.postings[facet] = {value: bitmap_from_ids(ids) for value, ids in values.items()}
+            self.price_buckets = {bucket: bitmap_from_ids(ids) for bucket, ids in bucket_ids.items()}
+            self.active = bitmap_from_ids(self.documents)
+            for key in SORT_KEYS:
+                self.sorted_ids[key] = sorted(entries[key] for entries in self.sort_entries.values())
+
+            self.source = source
+            self.built_at = time.monotonic()
+
+    def refresh_products(self, product_ids):
+        """Re-read the given products and patch their postings"""
+        if self.built_at is None:
+            return
+
+        rows, categories = self._load(product_ids)
+        with self._lock:
+            self._load_labels()
+            for product_id in product_ids:
+                self._remove(product_id)
+            for row in rows:
+                self._add(row, categories.get(row.id, []))
+
+    def _source(self):
+        """The database and catalog version the index would be built from"""
+        return db.engine, get_catalog_version()[0]
+
+    def ensure_fresh(self):
+        """Build the index on first use and rebuild it once stale or built from another catalog"""
+        ttl = current_app.config.get('CATALOG_INDEX_TTL', 300)
+        if (
+            self.built_at is None
+            or (ttl and time.monotonic() - self.built_at > ttl)
+            or self._source() != self.source
+        ):
+            self.rebuild()
+
+    def reset(self):
+        """Drop the loaded index; the next use rebuilds it"""
+        with self._lock:
+            self._reset()
+
+    def _price_range(self, min_price=None, max_price=None):
+        """Bitmap of products priced within [min_price, max_price]"""
+        low = min_price if min_price is not None else -math.inf
+        high = max_price if max_price is not None else math.inf
+
+        bitmap = 0
+        edge_ids = []
+        for bucket, posting in self.price_buckets.items():
+            bucket_low = bucket * self.bucket_size
+            bucket_high = bucket_low + self.bucket_size
+            if bucket_high <= low or bucket_low > high:
+                continue
+            if low <= bucket_low and bucket_high <= high:
+                bitmap |= posting
+            else:
+                # Edge bucket - check each product price
+                edge_ids.extend(
+                    product_id for product_id in iter_ids(posting)
+                    if low <= self.prices[product_id] <= high
+                )
+        return bitmap | bitmap_from_ids(edge_ids)
+
+    def _filter_bitmaps(self, filters):
+        """One bitmap per applied filter, keyed by the facet it constrains"""
+        applied = {}
+
+        for facet in ('frame_type', 'frame_shape'):
+            if filters.get(facet):
+                applied[facet] = self.postings[facet].get(filters[facet], 0)
+
+        if filters.get('color'):
+            # Mirrors Product.color.ilike('%color%')
+            needle = filters['color'].lower()
+            bitmap = 0
+            for value, posting in self.postings['color'].items():
+                if needle in value.lower():
+                    bitmap |= posting
+            applied['color'] = bitmap
+
+        if filters.get('brand_id'):
+            applied['brand'] = self.postings['brand'].get(filters['brand_id'], 0)
+
+        if filters.get('category_id'):
+            # Category postings already include every subcategory's products
+            applied['category'] = self.postings['category'].get(filters['category_id'], 0)
+
+        if filters.get('is_featured') is not None:
+            applied['featured'] = self.postings['featured'].get(bool(filters['is_featured']), 0)
+
+        if filters.get('in_stock') is not None:
+            applied['in_stock'] = self.postings['in_stock'].get(bool(filters['in_stock']), 0)
+
+        if filters.get('min_price') is not None or filters.get('max_price') is not None:
+            applied['price'] = self._price_range(filters.get('min_price'), filters.get('max_price'))
+
+        return applied
+
+    def match(self, filters, restrict=None):
+        """Bitmap of active products matching every filter (and ``restrict``)"""
+        with self._lock:
+            bitmap = self.active if restrict is None else self.active & restrict
+            for posting in self._filter_bitmaps(filters).values():
+                bitmap &= posting
+            return bitmap
+
+    def facet_counts(self, filters, restrict=None):
+        """Per-value counts for every facet plus a price histogram.
+
+        Counts for a facet apply every filter except that facet's own, so
+        clients can show how many results each alternative value would give.
+        """
+        with self._lock:
+            applied = self._filter_bitmaps(filters)
+            base = self.active if restrict is None else self.active & restrict
+
+            def matches_without(excluded):
+                bitmap = base
+                for facet, posting in applied.items():
+                    if facet != excluded:
+                        bitmap &= posting
+                return bitmap
+
+            facets = {}
+            for facet in FACETS:
+                candidates = matches_without(facet)
+                values = []
+                for value, posting in self.postings[facet].items():
+                    count = (posting & candidates).bit_count()
+                    if not count:
+                        continue
+                    item = {'value': value, 'count': count}
+                    if facet == 'brand':
+                        item['label'] = self.brand_names.get(value)
+                    elif facet == 'category':
+                        if value not in self.category_names:
+                            continue
+                        item['label'] = self.category_names[value]
+                    values.append(item)
+                values.sort(key=lambda item: (-item['count'], str(item.get('label') or item['value'])))
+                facets[facet] = values
+
+            candidates = matches_without('price')
+            histogram = []
+            for bucket in sorted(self.price_buckets):
+                count = (self.price_buckets[bucket] & candidates).bit_count()
+                if count:
+                    histogram.append({
+                        'min': bucket * self.bucket_size,
+                        'max': (bucket + 1) * self.bucket_size,
+                        'count': count
+                    })
+            facets['price_histogram'] = histogram
+            facets['total'] = matches_without(None).bit_count()
+
+            return facets
+
+    def page(self, bitmap, sort_key, descending=True, offset=0, limit=20, after=None):
+        """Read one page of ``bitmap`` in (sort_key, id) order.
+
+        ``after`` is a (sort_value, product_id) pair from a keyset cursor;
+        when given, the page starts right after that row. Returns a list of
+        (product_id, sort_value) pairs and whether more rows follow.
+        """
+        with self._lock:
+            entries = self.sorted_ids[sort_key]
+
+            if after is not None:
+                position = bisect.bisect_left(entries, _sort_entry(*after))
+                if descending:
+                    positions = range(position - 1, -1, -1)
+                else:
+                    if position < len(entries) and entries[position] == _sort_entry(*after):
+                        position += 1
+                    positions = range(position, len(entries))
+            elif descending:
+                positions = range(len(entries) - 1, -1, -1)
+            else:
+                positions = range(len(entries))
+
+            # Test membership bit by bit; only rows up to the end of the page are visited
+            filtered = bitmap != self.active
+
+            page = []
+            skipped = 0
+            for position in positions:
+                (_, value), product_id = entries[position]
+                if filtered and not (bitmap >> product_id) & 1:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if len(page) == limit:
+                    return page, True
+                page.append((product_id, value))
+
+            return page, False
+
+    def values(self, facet):
+        """All values of a facet present on active products"""
+        with self._lock:
+            return sorted(self.postings[facet])
+
+    def price_bounds(self):
+        """(min, max) price over active products, or (None, None) if empty"""
+        with self._lock:
+            if not self.prices:
+                return None, None
+            return min(self.prices.values()), max(self.prices.values())
+
+catalog_index = CatalogIndex()
+
+@on_product_changed
+@on_stock_changed
+def _refresh_catalog_index(product_ids):
+    catalog_index.refresh_products(product_ids)
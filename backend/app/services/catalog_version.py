@@ -0,0 +1,154 @@
+from flask import current_app, request, g
+from functools import wraps
+from sqlalchemy import select, update, insert, event, inspect
+from app.models import db, Product, Brand
+from app.models.catalog import CatalogVersion
+from app.services.catalog_events import on_product_changed, on_brand_changed, on_stock_changed
+from app.services.cache_service import normalized_request_key
+from datetime import datetime
+import hashlib
+
+CATALOG_SCOPE = 'catalog'
+STOCK_SCOPE = 'stock'
+
+def stock_scope(product_id):
+    """Scope bumped whenever the stock of one product moves"""
+    return f'{STOCK_SCOPE}:{product_id}'
+
+def get_catalog_version(scope=CATALOG_SCOPE):
+    """Current (version, updated_at) of a scope - a single primary key lookup"""
+    row = db.session.execute(
+        select(CatalogVersion.version, CatalogVersion.updated_at).where(CatalogVersion.scope == scope)
+    ).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+def get_catalog_versions(*scopes):
+    """{scope: (version, updated_at)} of several scopes in one query"""
+    versions = dict.fromkeys(scopes, (0, None))
+    rows = db.session.execute(
+        select(CatalogVersion.scope, CatalogVersion.version, CatalogVersion.updated_at)
+        .where(CatalogVersion.scope.in_(scopes))
+    )
+    versions.update((row.scope, (row.version, row.updated_at)) for row in rows)
+    return versions
+
+def _increment(connection, scope):
+    table = CatalogVersion.__table__
+    now = datetime.utcnow()
+    result = connection.execute(
+        update(table)
+        .where(table.c.scope == scope)
+        .values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(scope=scope, version=1, updated_at=now))
+
+def bump_catalog_version(scope=CATALOG_SCOPE, connection=None):
+    """Increment a scope's version.
+
+    With ``connection`` the bump joins that transaction (e.g. from a flush
+    event); otherwise it commits on its own, so objects loaded by the
+    calling request are not expired.
+    """
+    if connection is not None:
+        _increment(connection, scope)
+        return
+
+    with db.engine.begin() as connection:
+        _increment(connection, scope)
+
+@on_product_changed
+@on_brand_changed
+def _bump_on_catalog_change(ids):
+    bump_catalog_version()
+
+# ORM writes bump the version inside their own flush as well, so products
+# and brands written without product_changed (shell, seed scripts, CLI
+# commands) still reach ETags and the in-memory indexes
+
+# Columns a stock move writes; changing only these is not a catalog change
+STOCK_COLUMNS = frozenset(('stock_quantity', 'updated_at'))
+
+def _catalog_row_written(mapper, connection, target):
+    bump_catalog_version(connection=connection)
+
+def _product_updated(mapper, connection, target):
+    state = inspect(target)
+    changed = {key for key in mapper.column_attrs.keys() if state.attrs[key].history.has_changes()}
+    if changed - STOCK_COLUMNS:
+        bump_catalog_version(connection=connection)
+
+for _model in (Product, Brand):
+    event.listen(_model, 'after_insert', _catalog_row_written)
+    event.listen(_model, 'after_delete', _catalog_row_written)
+event.listen(Product, 'after_update', _product_updated)
+event.listen(Brand, 'after_update', _catalog_row_written)
+
+# Stock moves leave the catalog version alone (every checkout would empty
+# the response cache); they bump the global stock scope, which listings
+# depend on, and one scope per product for the product pages
+@on_stock_changed
+def _bump_on_stock_change(product_ids):
+    with db.engine.begin() as connection:
+        _increment(connection, STOCK_SCOPE)
+        for product_id in sorted(set(product_ids)):
+            _increment(connection, stock_scope(product_id))
+
+def catalog_etag(version, updated_at, stock_version=None):
+    """Strong ETag for the current request at the given catalog and stock versions"""
+    stamp = updated_at.isoformat() if updated_at else ''
+    raw = f'{normalized_request_key()}|{version}|{stamp}|{stock_version}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _stock_scope_for(stock):
+    if stock is True:
+        return STOCK_SCOPE
+    if stock:
+        return stock_scope(request.view_args[stock])
+    return None
+
+def conditional_get(f=None, *, stock=True):
+    """Answer GETs carrying a matching If-None-Match with 304 before running the view.
+
+    The ETag only depends on the request, the catalog version and the
+    version of the stock the response shows, so revalidation costs one
+    version lookup and no product rows are loaded. ``stock`` is True for
+    responses showing the stock of any product, the name of the URL
+    argument holding the product id for single product responses, or
+    False for responses without stock.
+    """
+    if f is None:
+        return lambda f: conditional_get(f, stock=stock)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method != 'GET':
+            return f(*args, **kwargs)
+
+        scope = _stock_scope_for(stock)
+        try:
+            versions = get_catalog_versions(*((CATALOG_SCOPE, scope) if scope else (CATALOG_SCOPE,)))
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Catalog version lookup failed: {str(e)}")
+            return f(*args, **kwargs)
+
+        version, updated_at = versions[CATALOG_SCOPE]
+        stock_version = versions[scope][0] if scope else None
+        etag = catalog_etag(version, updated_at, stock_version)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        # Lets the response cache key entries by the versions they were built at
+        g.catalog_version = version if scope is None else f'{version}.{stock_version}'
+
+        response = current_app.make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+            response.headers.setdefault('Cache-Control', 'no-cache')
+        return response
+    return decorated
@@ -0,0 +1,166 @@
+from flask import current_app
+from sqlalchemy import event, inspect, select, insert, delete
+from app.models import db, Product, Category
+from app.models.catalog import CategoryClosure
+from app.services.catalog_version import get_catalog_version, bump_catalog_version, CATALOG_SCOPE
+import threading
+
+# catalog_versions scope bumped on every category write
+CATEGORY_SCOPE = 'categories'
+
+def _closure_rows(parents):
+    """(ancestor, descendant, depth) rows for a {category_id: parent_id} map"""
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            rows.append({'ancestor_id': ancestor_id, 'descendant_id': category_id, 'depth': depth})
+            seen.add(ancestor_id)
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+    return rows
+
+def rebuild_category_closure():
+    """Recompute the closure table from categories.parent_id"""
+    parents = dict(db.session.query(Category.id, Category.parent_id).all())
+    rows = _closure_rows(parents)
+
+    CategoryClosure.query.delete()
+    if rows:
+        db.session.execute(insert(CategoryClosure.__table__), rows)
+    bump_catalog_version(CATEGORY_SCOPE, connection=db.session.connection())
+    bump_catalog_version(CATALOG_SCOPE, connection=db.session.connection())
+    db.session.commit()
+
+    current_app.logger.info(f"Rebuilt category closure for {len(parents)} categories")
+    return len(parents)
+
+# Closure maintenance - runs inside the flush that writes the category, so the
+# hierarchy and its version can never disagree with the categories table
+
+def _categories_changed(connection):
+    bump_catalog_version(CATEGORY_SCOPE, connection=connection)
+    bump_catalog_version(CATALOG_SCOPE, connection=connection)
+
+def _ancestors(connection, category_id):
+    table = CategoryClosure.__table__
+    return connection.execute(
+        select(table.c.ancestor_id, table.c.depth).where(table.c.descendant_id == category_id)
+    ).all()
+
+def _move_subtree(connection, category_id, parent_id):
+    """Re-link a category and its subcategories under ``parent_id``"""
+    table = CategoryClosure.__table__
+    subtree = connection.execute(
+        select(table.c.descendant_id, table.c.depth).where(table.c.ancestor_id == category_id)
+    ).all()
+    if not subtree:
+        connection.execute(insert(table), [{'ancestor_id': category_id, 'descendant_id': category_id, 'depth': 0}])
+        subtree = [(category_id, 0)]
+
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    if parent_id in subtree_ids:
+        raise ValueError('A category cannot be moved under itself or one of its subcategories')
+
+    connection.execute(
+        delete(table).where(
+            table.c.descendant_id.in_(subtree_ids),
+            table.c.ancestor_id.notin_(subtree_ids)
+        )
+    )
+
+    if parent_id is None:
+        return
+
+    rows = [
+        {'ancestor_id': ancestor_id, 'descendant_id': descendant_id, 'depth': ancestor_depth + depth + 1}
+        for ancestor_id, ancestor_depth in _ancestors(connection, parent_id)
+        for descendant_id, depth in subtree
+    ]
+    if rows:
+        connection.execute(insert(table), rows)
+
+@event.listens_for(Category, 'after_insert')
+def _category_inserted(mapper, connection, target):
+    rows = [{'ancestor_id': target.id, 'descendant_id': target.id, 'depth': 0}]
+    if target.parent_id is not None:
+        rows.extend(
+            {'ancestor_id': ancestor_id, 'descendant_id': target.id, 'depth': depth + 1}
+            for ancestor_id, depth in _ancestors(connection, target.parent_id)
+        )
+    connection.execute(insert(CategoryClosure.__table__), rows)
+    _categories_changed(connection)
+
+@event.listens_for(Category, 'after_update')
+def _category_updated(mapper, connection, target):
+    if inspect(target).attrs.parent_id.history.added:
+        _move_subtree(connection, target.id, target.parent_id)
+    _categories_changed(connection)
+
+@event.listens_for(Category, 'before_delete')
+def _category_deleted(mapper, connection, target):
+    table = CategoryClosure.__table__
+    connection.execute(
+        delete(table).where((table.c.ancestor_id == target.id) | (table.c.descendant_id == target.id))
+    )
+    _categories_changed(connection)
+
+class CategoryTree:
+    """Per-worker copy of the active category tree.
+
+    Rebuilt only when the ``categories`` version changes, so serving the
+    tree costs one primary key lookup instead of a table scan.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.roots = []
+
+    def _build(self, version):
+        categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order, Category.name).all()
+
+        roots = []
+        category_dict = {category.id: category.to_dict() for category in categories}
+        for category in categories:
+            cat_data = category_dict[category.id]
+            if category.parent_id is None:
+                # setdefault - subcategories sorted before their parent are already attached
+                cat_data.setdefault('subcategories', [])
+                roots.append(cat_data)
+            else:
+                parent = category_dict.get(category.parent_id)
+                if parent is not None:
+                    parent.setdefault('subcategories', []).append(cat_data)
+
+        self.roots = roots
+        self.version = version
+
+    def reset(self):
+        """Forget the loaded tree; the next use rebuilds it"""
+        with self._lock:
+            self.version = None
+
+    def ensure_fresh(self):
+        version, _ = get_catalog_version(CATEGORY_SCOPE)
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self._build(version)
+
+category_tree = CategoryTree()
+
+def get_category_tree():
+    """Active categories as nested dicts (shared - do not modify)"""
+    category_tree.ensure_fresh()
+    return category_tree.roots
+
+def category_filter(category_id):
+    """WHERE clause matching products in a category or any of its subcategories"""
+    product_categories = Product.categories.property.secondary
+    closure = CategoryClosure.__table__
+    return Product.id.in_(
+        select(product_categories.c.product_id)
+        .join(closure, closure.c.descendant_id == product_categories.c.category_id)
+        .where(closure.c.ancestor_id == category_id)
+    )
@@ -0,0 +1,72 @@
+from flask import current_app
+from itertools import islice
+import csv
+import io
+import json
+
+# Response mimetype per export format
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson'
+}
+
+def _csv_value(value):
+    """Flatten a serialized value into one CSV cell.
+
+    Named objects (brand, categories) become their names and plain lists
+    (tags) their items, '|' separated like the bulk import expects; other
+    nested values are written as JSON.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, dict):
+        return value['name'] if 'name' in value else json.dumps(value)
+    if isinstance(value, list):
+        if all(isinstance(item, dict) and 'name' in item for item in value):
+            return '|'.join(item['name'] for item in value)
+        if all(not isinstance(item, (dict, list)) for item in value):
+            return '|'.join(str(item) for item in value)
+        return json.dumps(value)
+    return value
+
+def stream_export(query, serialize, names, file_format, chunk_size=None):
+    """Yield an export of ``query`` as CSV or JSON Lines text chunks.
+
+    Rows are read through a server-side cursor (yield_per) and serialized
+    ``chunk_size`` at a time, so memory use does not depend on the number
+    of rows. ``serialize(rows)`` must return dicts with the keys ``names``.
+    """
+    chunk_size = chunk_size or current_app.config.get('EXPORT_CHUNK_SIZE', 500)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    if file_format == 'csv':
+        writer.writerow(names)
+        yield take()
+
+    rows = iter(query.yield_per(chunk_size))
+    exported = 0
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            for data in serialize(chunk):
+                if file_format == 'csv':
+                    writer.writerow([_csv_value(data.get(name)) for name in names])
+                else:
+                    buffer.write(json.dumps(data, default=str))
+                    buffer.write('\n')
+            exported += len(chunk)
+            yield take()
+    except Exception as e:
+        # Headers are already sent - all we can do is log and cut the response short
+        current_app.logger.error(f"Export failed after {exported} rows: {str(e)}")
+        raise
@@ -0,0 +1,211 @@
+from flask import current_app
+from sqlalchemy import func, select, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db
+from app.models.search import SearchTerm
+from app.services.catalog_events import on_product_changed
+import bisect
+import threading
+import time
+
+# Tokens shorter than this are never corrected
+MIN_FUZZY_LENGTH = 3
+
+# Trigram similarity a candidate needs, same as pg_trgm.similarity_threshold
+SIMILARITY_THRESHOLD = 0.3
+
+# Trigram candidates considered per token before checking edit distance
+CANDIDATE_LIMIT = 20
+
+def max_edits(token):
+    """Edit distance allowed for a token - one typo in short words, two otherwise"""
+    return 1 if len(token) <= 5 else 2
+
+def trigrams(word):
+    """Trigram set of a word, padded like pg_trgm ('  w', ' wo', ..., 'rd ')"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def bounded_levenshtein(left, right, bound):
+    """Edit distance between two strings, or bound + 1 once it must exceed ``bound``"""
+    if abs(len(left) - len(right)) > bound:
+        return bound + 1
+
+    previous = list(range(len(right) + 1))
+    for i, left_char in enumerate(left, start=1):
+        current = [i] + [0] * len(right)
+        for j, right_char in enumerate(right, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (left_char != right_char)
+            )
+        if min(current) > bound:
+            return bound + 1
+        previous = current
+    return min(previous[-1], bound + 1)
+
+class TermIndex:
+    """Per-worker trigram posting lists over the search_terms vocabulary.
+
+    Used where the database has no trigram index (SQLite, tests). New terms
+    are picked up by id after product writes and the whole index is rebuilt
+    once it is older than CATALOG_INDEX_TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.phrases = {}
+        self.sorted_terms = []
+        self.postings = {}
+        self.trigram_counts = {}
+        self.last_id = 0
+        self.built_at = None
+
+    def _add(self, term_id, term, phrase):
+        if term not in self.phrases:
+            bisect.insort(self.sorted_terms, term)
+            term_trigrams = trigrams(term)
+            for trigram in term_trigrams:
+                self.postings.setdefault(trigram, set()).add(term)
+            self.trigram_counts[term] = len(term_trigrams)
+        self.phrases[term] = phrase
+        self.last_id = max(self.last_id, term_id)
+
+    def _load(self, after_id=0):
+        return db.session.query(SearchTerm.id, SearchTerm.term, SearchTerm.phrase).filter(
+            SearchTerm.id > after_id
+        ).order_by(SearchTerm.id).all()
+
+    def rebuild(self):
+        rows = self._load()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(*row)
+            self.built_at = time.monotonic()
+
+    def refresh(self):
+        """Add terms stored since the last load"""
+        if self.built_at is None:
+            return
+        rows = self._load(self.last_id)
+        with self._lock:
+            for row in rows:
+                self._add(*row)
+
+    def ensure_fresh(self):
+        ttl = current_app.config.get('CATALOG_INDEX_TTL', 300)
+        if self.built_at is None or (ttl and time.monotonic() - self.built_at > ttl):
+            self.rebuild()
+
+    def reset(self):
+        """Drop the loaded index; the next use rebuilds it"""
+        with self._lock:
+            self._reset()
+
+    def phrase(self, term):
+        with self._lock:
+            return self.phrases.get(term)
+
+    def is_prefix(self, token):
+        """Whether ``token`` starts some term"""
+        with self._lock:
+            position = bisect.bisect_left(self.sorted_terms, token)
+            return position < len(self.sorted_terms) and self.sorted_terms[position].startswith(token)
+
+    def candidates(self, token):
+        """(term, phrase, similarity) of the most trigram-similar terms"""
+        token_trigrams = trigrams(token)
+        with self._lock:
+            shared = {}
+            for trigram in token_trigrams:
+                for term in self.postings.get(trigram, ()):
+                    shared[term] = shared.get(term, 0) + 1
+
+            scored = []
+            for term, count in shared.items():
+                similarity = count / (len(token_trigrams) + self.trigram_counts[term] - count)
+                if similarity >= SIMILARITY_THRESHOLD:
+                    scored.append((term, self.phrases[term], similarity))
+
+        scored.sort(key=lambda candidate: (-candidate[2], candidate[0]))
+        return scored[:CANDIDATE_LIMIT]
+
+term_index = TermIndex()
+
+@on_product_changed
+def _refresh_term_index(product_ids):
+    term_index.refresh()
+
+def _phrase(token, dialect):
+    if dialect == 'postgresql':
+        return db.session.query(SearchTerm.phrase).filter(SearchTerm.term == token).scalar()
+    term_index.ensure_fresh()
+    return term_index.phrase(token)
+
+def _is_prefix(token, dialect):
+    if dialect == 'postgresql':
+        return db.session.query(
+            select(SearchTerm.id).where(SearchTerm.term.like(token.replace('_', '\\_') + '%', escape='\\')).exists()
+        ).scalar()
+    term_index.ensure_fresh()
+    return term_index.is_prefix(token)
+
+def _candidates(token, dialect):
+    if dialect == 'postgresql':
+        # `%` is answered by the pg_trgm GIN index
+        similarity = func.similarity(SearchTerm.term, token)
+        return db.session.query(SearchTerm.term, SearchTerm.phrase, similarity).filter(
+            SearchTerm.term.op('%')(token)
+        ).order_by(similarity.desc(), SearchTerm.term).limit(CANDIDATE_LIMIT).all()
+    term_index.ensure_fresh()
+    return term_index.candidates(token)
+
+def correct_token(token, dialect, limit=3):
+    """Likely intended phrases for a token as (phrase, similarity).
+
+    A joined term maps to its words ("rayban" -> "ray ban"). Empty when the
+    token is a known word or word prefix, too short, or nothing is within
+    trigram similarity and max_edits(token) edits.
+    """
+    if len(token) < MIN_FUZZY_LENGTH or token.isdigit():
+        return []
+
+    phrase = _phrase(token, dialect)
+    if phrase is not None:
+        return [(phrase, 1.0)] if phrase != token else []
+    if _is_prefix(token, dialect):
+        return []
+
+    bound = max_edits(token)
+    corrections = []
+    for term, phrase, similarity in _candidates(token, dialect):
+        if bounded_levenshtein(token, term, bound) <= bound:
+            corrections.append((phrase, float(similarity)))
+        if len(corrections) == limit:
+            break
+    return corrections
+
+def store_search_terms(terms):
+    """Add {term: phrase} pairs missing from the vocabulary, in the current transaction"""
+    if not terms:
+        return
+
+    rows = [{'term': term, 'phrase': phrase} for term, phrase in terms.items()]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        db.session.execute(
+            dialect_insert(SearchTerm.__table__).on_conflict_do_nothing(index_elements=['term']),
+            rows
+        )
+        return
+
+    existing = {term for term, in db.session.query(SearchTerm.term).filter(SearchTerm.term.in_(list(terms))).all()}
+    rows = [row for row in rows if row['term'] not in existing]
+    if rows:
+        db.session.execute(insert(SearchTerm.__table__), rows)
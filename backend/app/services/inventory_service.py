@@ -0,0 +1,314 @@
+from sqlalchemy import and_, or_, false, bindparam, func, select
+from sqlalchemy.orm import aliased
+from app.models import db, Product, ProductVariant
+from app.models.catalog import StockReservation, ReservedStock
+from app.services.stock_shards import sharded_stock, sharded_product_ids, take_sharded_stock, add_to_shards
+from datetime import datetime
+
+# Stock checks for the cart and checkout. Requested quantities are summed
+# per product/variant and compared against stock read in one query, so a
+# cart costs the same single round trip however many lines it has.
+# Available stock is stock_quantity less the units held by other users'
+# unexpired checkouts (see reservation_service). Hot products may keep their stock in
+# shards (see stock_shards), which then replace products.stock_quantity and
+# hold only unreserved units.
+
+class InsufficientStockError(Exception):
+    """Raised when stock could not be taken for every line of an order"""
+
+    def __init__(self, shortfalls):
+        super().__init__('Insufficient stock')
+        self.shortfalls = shortfalls
+
+def _requested_totals(lines):
+    """{(product_id, variant_id): quantity} of (product_id, variant_id, quantity) lines"""
+    totals = {}
+    for product_id, variant_id, quantity in lines:
+        key = (product_id, variant_id or None)
+        totals[key] = totals.get(key, 0) + quantity
+    return totals
+
+def _load_stock(keys):
+    """Stock and reserved units of the requested products, joined to the requested variants"""
+    product_ids = {product_id for product_id, _ in keys}
+    variant_ids = {variant_id for _, variant_id in keys if variant_id}
+    product_reserved = aliased(ReservedStock)
+    variant_reserved = aliased(ReservedStock)
+
+    # A variant only joins to its own product, so a mismatched pair reads as missing
+    variant_join = and_(
+        ProductVariant.product_id == Product.id,
+        ProductVariant.id.in_(variant_ids) if variant_ids else false()
+    )
+    return db.session.query(
+        Product.id,
+        Product.name,
+        Product.is_active,
+        Product.track_inventory,
+        Product.stock_quantity,
+        sharded_stock(Product.id).label('sharded_stock'),
+        func.coalesce(product_reserved.quantity, 0).label('reserved'),
+        ProductVariant.id.label('variant_id'),
+        ProductVariant.is_active.label('variant_is_active'),
+        ProductVariant.stock_quantity.label('variant_stock'),
+        func.coalesce(variant_reserved.quantity, 0).label('variant_reserved')
+    ).select_from(Product).outerjoin(ProductVariant, variant_join).outerjoin(
+        product_reserved,
+        and_(product_reserved.product_id == Product.id, product_reserved.product_variant_id == 0)
+    ).outerjoin(
+        variant_reserved,
+        and_(variant_reserved.product_id == Product.id, variant_reserved.product_variant_id == ProductVariant.id)
+    ).filter(Product.id.in_(product_ids)).all()
+
+def _releasable_holds(user_id, product_ids):
+    """({product_id: units}, {variant_id: units}) of holds that do not block ``user_id``.
+
+    Those are the user's own holds and every expired hold - still counted
+    in reserved_stock until released, but free to be taken.
+    """
+    product_held = {}
+    variant_held = {}
+    releasable = StockReservation.expires_at <= datetime.utcnow()
+    if user_id:
+        releasable = or_(StockReservation.user_id == user_id, releasable)
+    for product_id, variant_id, quantity in db.session.query(
+        StockReservation.product_id, StockReservation.product_variant_id, func.sum(StockReservation.quantity)
+    ).filter(
+        releasable,
+        StockReservation.product_id.in_(product_ids)
+    ).group_by(StockReservation.product_id, StockReservation.product_variant_id).all():
+        product_held[product_id] = product_held.get(product_id, 0) + quantity
+        if variant_id:
+            variant_held[variant_id] = variant_held.get(variant_id, 0) + quantity
+    return product_held, variant_held
+
+def _releasable_units(user_id, *conditions):
+    releasable = StockReservation.expires_at <= datetime.utcnow()
+    if user_id:
+        releasable = or_(StockReservation.user_id == user_id, releasable)
+    return func.coalesce(
+        select(func.sum(StockReservation.quantity)).where(releasable, *conditions).scalar_subquery(), 0
+    )
+
+def available_stock_columns(user_id=None):
+    """(product, variant) available stock of Product/ProductVariant rows as SQL expressions.
+
+    The same arithmetic as check_availability, for queries that list
+    products with their stock: unreserved stock (the shard total when
+    sharded) plus the units of holds that do not block ``user_id``. The
+    caller clamps at zero and caps a variant at its product's stock.
+    """
+    product_reserved = select(ReservedStock.quantity).where(
+        ReservedStock.product_id == Product.id,
+        ReservedStock.product_variant_id == 0
+    ).scalar_subquery()
+    variant_reserved = select(ReservedStock.quantity).where(
+        ReservedStock.product_id == Product.id,
+        ReservedStock.product_variant_id == ProductVariant.id
+    ).scalar_subquery()
+
+    unreserved = func.coalesce(sharded_stock(Product.id), Product.stock_quantity - func.coalesce(product_reserved, 0))
+    product_available = unreserved + _releasable_units(user_id, StockReservation.product_id == Product.id)
+    variant_available = (
+        ProductVariant.stock_quantity - func.coalesce(variant_reserved, 0)
+        + _releasable_units(user_id, StockReservation.product_variant_id == ProductVariant.id)
+    )
+    return product_available, variant_available
+
+def check_availability(lines, user_id=None):
+    """Shortfalls of (product_id, variant_id, quantity) lines, empty when all can be filled.
+
+    Lines for the same product and variant are checked against stock
+    together, and as variant lines also take stock from their product, all
+    lines of a product must fit in the product's stock. Units reserved by
+    checkouts are not available, except those held by ``user_id`` and
+    those whose hold has expired. Each
+    shortfall is a dict with the product and variant id,
+    product name, requested and available quantity and a reason of
+    'unavailable' (missing or inactive) or 'insufficient_stock'.
+    """
+    requested = _requested_totals(lines)
+    if not requested:
+        return []
+
+    product_requested = {}
+    for (product_id, _), quantity in requested.items():
+        product_requested[product_id] = product_requested.get(product_id, 0) + quantity
+
+    product_held, variant_held = _releasable_holds(user_id, product_requested)
+
+    products = {}
+    variants = {}
+    for row in _load_stock(requested):
+        products[row.id] = row
+        if row.variant_id is not None:
+            variants[(row.id, row.variant_id)] = row
+
+    shortfalls = []
+    for (product_id, variant_id), quantity in requested.items():
+        product = products.get(product_id)
+        row = variants.get((product_id, variant_id)) if variant_id else product
+
+        if product is None or row is None or not product.is_active or (variant_id and not row.variant_is_active):
+            shortfalls.append({
+                'product_id': product_id,
+                'product_variant_id': variant_id,
+                'product_name': product.name if product else None,
+                'requested': quantity,
+                'available_stock': 0,
+                'reason': 'unavailable'
+            })
+            continue
+
+        if not product.track_inventory:
+            continue
+
+        if product.sharded_stock is not None:
+            unreserved = product.sharded_stock
+        else:
+            unreserved = (product.stock_quantity or 0) - product.reserved
+        product_stock = max(unreserved + product_held.get(product_id, 0), 0)
+        if variant_id:
+            variant_stock = (row.variant_stock or 0) - row.variant_reserved + variant_held.get(variant_id, 0)
+            available = max(min(variant_stock, product_stock), 0)
+        else:
+            available = product_stock
+        if available < quantity or product_stock < product_requested[product_id]:
+            shortfalls.append({
+                'product_id': product_id,
+                'product_variant_id': variant_id,
+                'product_name': product.name,
+                'requested': quantity,
+                'available_stock': available,
+                'reason': 'insufficient_stock'
+            })
+
+    return shortfalls
+
+def _conditional_decrement(table, totals, reserved):
+    """Decrement ``stock_quantity`` of {row_id: quantity} where enough is left unreserved.
+
+    One UPDATE executed for every row in id order, so concurrent checkouts
+    lock rows in the same order. ``reserved`` is the row's reserved units.
+    Returns whether every row was decremented.
+    """
+    if not totals:
+        return True
+
+    quantity = bindparam('quantity')
+    statement = table.update().where(
+        table.c.id == bindparam('row_id'),
+        table.c.stock_quantity - func.coalesce(reserved, 0) >= quantity
+    ).values(stock_quantity=table.c.stock_quantity - quantity)
+    params = [{'row_id': row_id, 'quantity': total} for row_id, total in sorted(totals.items())]
+
+    if db.session.get_bind().dialect.supports_sane_multi_rowcount:
+        return db.session.execute(statement, params).rowcount == len(params)
+    return all(db.session.execute(statement, row).rowcount == 1 for row in params)
+
+def _reserved_units(table, variant):
+    """Scalar subquery of the units reserved on a products / product_variants row"""
+    if variant:
+        condition = ReservedStock.product_variant_id == table.c.id
+    else:
+        condition = and_(ReservedStock.product_id == table.c.id, ReservedStock.product_variant_id == 0)
+    return select(ReservedStock.quantity).where(condition).scalar_subquery()
+
+def tracked_requests(lines):
+    """{(product_id, variant_id): quantity} of the lines whose product tracks inventory"""
+    requested = _requested_totals(lines)
+    if not requested:
+        return {}
+
+    tracked_ids = {
+        product_id for product_id, in db.session.query(Product.id).filter(
+            Product.id.in_({product_id for product_id, _ in requested}),
+            Product.track_inventory == True
+        ).all()
+    }
+    return {key: quantity for key, quantity in requested.items() if key[0] in tracked_ids}
+
+def _stock_totals(requested):
+    """({product_id: quantity}, {variant_id: quantity}) taken from each stock row by ``requested``"""
+    product_totals = {}
+    variant_totals = {}
+    for (product_id, variant_id), quantity in requested.items():
+        product_totals[product_id] = product_totals.get(product_id, 0) + quantity
+        if variant_id:
+            variant_totals[variant_id] = variant_totals.get(variant_id, 0) + quantity
+    return product_totals, variant_totals
+
+def decrement_stock(lines):
+    """Take (product_id, variant_id, quantity) lines out of stock atomically.
+
+    The check and the decrement are the same statement
+    (``SET stock_quantity = stock_quantity - q WHERE stock_quantity >= q``),
+    so two checkouts can never both take the last unit, and units reserved
+    by other checkouts are never taken. Variant lines take stock from the
+    variant and its product, and products that do not track inventory are
+    left alone; sharded products are decremented on one of their shards.
+    If any row is short, every decrement is rolled back to a savepoint and
+    InsufficientStockError is raised. Returns the ids of the
+    products whose stock changed; the caller commits.
+    """
+    product_totals, variant_totals = _stock_totals(tracked_requests(lines))
+    if not product_totals:
+        return []
+
+    # A product sharded or unsharded while this waited on its row locks is
+    # caught by reading the sharded set again, and the checkout retried
+    for attempt in range(2):
+        sharded_ids = sharded_product_ids(product_totals)
+        row_totals = {product_id: total for product_id, total in product_totals.items() if product_id not in sharded_ids}
+        shard_totals = {product_id: total for product_id, total in product_totals.items() if product_id in sharded_ids}
+
+        savepoint = db.session.begin_nested()
+        try:
+            decremented = (
+                _conditional_decrement(
+                    Product.__table__, row_totals, _reserved_units(Product.__table__, variant=False)
+                )
+                and take_sharded_stock(shard_totals)
+                and _conditional_decrement(
+                    ProductVariant.__table__, variant_totals, _reserved_units(ProductVariant.__table__, variant=True)
+                )
+            )
+            resharded = sharded_product_ids(product_totals) != sharded_ids
+        except Exception:
+            savepoint.rollback()
+            raise
+
+        if decremented and not resharded:
+            savepoint.commit()
+            return sorted(product_totals)
+
+        savepoint.rollback()
+        if not resharded:
+            break
+
+    raise InsufficientStockError(check_availability(lines))
+
+def restock(lines):
+    """Put (product_id, variant_id, quantity) lines back into stock.
+
+    Increments in SQL rather than read-modify-write on loaded rows, so a
+    cancellation cannot overwrite a concurrent checkout's decrement.
+    Returns the ids of the products whose stock changed; the caller commits.
+    """
+    product_totals, variant_totals = _stock_totals(tracked_requests(lines))
+    sharded_ids = sharded_product_ids(product_totals)
+    for product_id in sorted(sharded_ids):
+        add_to_shards(product_id, product_totals[product_id])
+    row_totals = {product_id: total for product_id, total in product_totals.items() if product_id not in sharded_ids}
+
+    quantity = bindparam('quantity')
+    for table, totals in ((Product.__table__, row_totals), (ProductVariant.__table__, variant_totals)):
+        if totals:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('row_id')).values(
+                    stock_quantity=table.c.stock_quantity + quantity
+                ),
+                [{'row_id': row_id, 'quantity': total} for row_id, total in sorted(totals.items())]
+            )
+
+    return sorted(product_totals)
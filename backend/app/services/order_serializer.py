@@ -0,0 +1,99 @@
+from app.models import Order, OrderItem
+from app.utils.fieldsets import Field, column_field, iso_format, enum_value, required_relations, load_options
+import json
+
+# Sparse (?fields=) serialization of order pages. Only requested columns are
+# selected and order items are fetched for the whole page in one query.
+
+def _json_or_text(value):
+    try:
+        return json.loads(value)
+    except (ValueError, TypeError):
+        return value
+
+def _item_dict(item):
+    return {
+        'id': item.id,
+        'product_id': item.product_id,
+        'product_variant_id': item.product_variant_id,
+        'product_name': item.product_name,
+        'product_sku': item.product_sku,
+        'product_image_url': item.product_image_url,
+        'quantity': item.quantity,
+        'unit_price': float(item.unit_price),
+        'total_price': float(item.total_price)
+    }
+
+def _items(order, related):
+    return [_item_dict(item) for item in related['items'].get(order.id, [])]
+
+def _item_count(order, related):
+    return sum(item.quantity for item in related['items'].get(order.id, []))
+
+ORDER_FIELDS = {
+    'id': column_field('id'),
+    'order_number': column_field('order_number'),
+    'user_id': column_field('user_id'),
+    'status': column_field('status', enum_value),
+    'payment_status': column_field('payment_status', enum_value),
+    'subtotal': column_field('subtotal', float),
+    'tax_amount': column_field('tax_amount', float),
+    'shipping_amount': column_field('shipping_amount', float),
+    'discount_amount': column_field('discount_amount', float),
+    'total_amount': column_field('total_amount', float),
+    'customer_email': column_field('customer_email'),
+    'customer_phone': column_field('customer_phone'),
+    'billing_address': column_field('billing_address', _json_or_text),
+    'shipping_address': column_field('shipping_address', _json_or_text),
+    'shipping_method': column_field('shipping_method'),
+    'tracking_number': column_field('tracking_number'),
+    'payment_method': column_field('payment_method'),
+    'notes': column_field('notes'),
+    'admin_notes': column_field('admin_notes'),
+    'shipped_at': column_field('shipped_at', iso_format),
+    'delivered_at': column_field('delivered_at', iso_format),
+    'created_at': column_field('created_at', iso_format),
+    'updated_at': column_field('updated_at', iso_format),
+    'items': Field((), 'items', _items),
+    'item_count': Field((), 'items', _item_count)
+}
+
+# Fields customers may request for their own orders
+USER_ORDER_FIELDS = tuple(name for name in ORDER_FIELDS if name != 'admin_notes')
+
+def _load_items(orders):
+    items = {}
+    query = OrderItem.query.filter(OrderItem.order_id.in_([order.id for order in orders])).order_by(OrderItem.id)
+    for item in query.all():
+        items.setdefault(item.order_id, []).append(item)
+    return items
+
+_RELATION_LOADERS = {
+    'items': _load_items
+}
+
+def _output_fields(fields):
+    return tuple(fields) if 'id' in fields else ('id',) + tuple(fields)
+
+def order_query_options(fields=None):
+    """load_only/lazyload options for a query whose rows are serialized with ``fields``"""
+    if not fields:
+        return []
+    return load_options(Order, ORDER_FIELDS, _output_fields(fields))
+
+def serialize_orders(orders, fields):
+    """Serialize a page of orders restricted to ``fields`` (validated ORDER_FIELDS names)"""
+    orders = list(orders)
+    if not orders:
+        return []
+
+    names = _output_fields(fields)
+    related = {
+        relation: _RELATION_LOADERS[relation](orders)
+        for relation in required_relations(ORDER_FIELDS, names)
+    }
+
+    return [
+        {name: ORDER_FIELDS[name].getter(order, related) for name in names}
+        for order in orders
+    ]
@@ -0,0 +1,201 @@
+from flask import current_app
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, Order, OrderItem, OrderStatus
+from app.models.catalog import ProductPopularity, JobWatermark
+from app.services.catalog_events import product_changed
+from datetime import datetime, timedelta
+import math
+
+WATERMARK_NAME = 'popularity'
+
+# Order items younger than this are left for the next run, so rows from
+# transactions that committed out of id order are not skipped
+SETTLE_DELAY = timedelta(minutes=1)
+
+# Orders in these states do not count as sales
+WITHDRAWN_STATUSES = (OrderStatus.CANCELLED, OrderStatus.RETURNED)
+
+def _decay_rate():
+    """lambda per second for the configured half-life"""
+    half_life = current_app.config.get('POPULARITY_HALF_LIFE_DAYS', 14) * 86400
+    return math.log(2) / half_life
+
+def _epoch():
+    return datetime.fromisoformat(current_app.config.get('POPULARITY_EPOCH', '2024-01-01'))
+
+def sale_weight(quantity, sold_at):
+    """Natural log of the forward-decayed weight of ``quantity`` units sold at ``sold_at``"""
+    return math.log(quantity) + _decay_rate() * (sold_at - _epoch()).total_seconds()
+
+def add_log_weight(score, weight):
+    """log(exp(score) + exp(weight)) without leaving log space"""
+    high, low = max(score, weight), min(score, weight)
+    return high + math.log1p(math.exp(low - high))
+
+def subtract_log_weight(score, weight):
+    """log(exp(score) - exp(weight)), floored at the empty score of 0"""
+    if weight >= score:
+        return 0.0
+    return max(score + math.log1p(-math.exp(weight - score)), 0.0)
+
+def current_score(score, now=None):
+    """Convert a stored log-space score to the decayed number of units sold at ``now``"""
+    now = now or datetime.utcnow()
+    decay = _decay_rate() * (now - _epoch()).total_seconds()
+    return max(math.exp(score - decay) - math.exp(-decay), 0.0)
+
+def ensure_popularity_rows(product_ids):
+    """Create zero popularity rows for new products; the caller commits.
+
+    Every product has a row, so listings sort on the bare indexed score
+    column with an inner join instead of coalescing over an outer join.
+    """
+    rows = [{'product_id': product_id, 'score': 0.0, 'units_sold': 0} for product_id in product_ids]
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        db.session.execute(dialect_insert(ProductPopularity.__table__).on_conflict_do_nothing(), rows)
+        return
+
+    existing = {
+        product_id for product_id, in db.session.query(ProductPopularity.product_id).filter(
+            ProductPopularity.product_id.in_(product_ids)
+        ).all()
+    }
+    rows = [row for row in rows if row['product_id'] not in existing]
+    if rows:
+        db.session.execute(insert(ProductPopularity.__table__), rows)
+
+def _get_watermark(lock=False):
+    # A locking read goes to the database even when the row is already loaded
+    watermark = db.session.get(JobWatermark, WATERMARK_NAME, with_for_update=lock, populate_existing=lock)
+    if watermark is None:
+        watermark = JobWatermark(name=WATERMARK_NAME, last_id=0)
+        db.session.add(watermark)
+        db.session.flush()
+    return watermark
+
+def refresh_popularity(batch_size=1000, full=False):
+    """Fold order items sold since the last run into product popularity.
+
+    Only order items past the stored watermark are read, so a periodic
+    run costs time proportional to new sales. ``full`` clears all scores
+    and starts over (needed after changing the half-life or epoch).
+    Returns the number of order items processed.
+    """
+    watermark = _get_watermark()
+    if full:
+        ProductPopularity.query.update({'score': 0.0, 'units_sold': 0}, synchronize_session=False)
+        watermark.last_id = 0
+        db.session.commit()
+
+    # Stop before the first unsettled item so the watermark never passes it
+    cutoff = datetime.utcnow() - SETTLE_DELAY
+    first_unsettled_id = db.session.query(func.min(OrderItem.id)).join(
+        Order, Order.id == OrderItem.order_id
+    ).filter(
+        OrderItem.id > watermark.last_id,
+        Order.created_at > cutoff
+    ).scalar()
+
+    processed = 0
+    changed_ids = set()
+
+    while True:
+        # Held until the batch commits, so reweigh_order waits for the
+        # statuses read here to be folded in before it checks the watermark
+        watermark = _get_watermark(lock=True)
+        query = db.session.query(
+            OrderItem.id,
+            OrderItem.product_id,
+            OrderItem.quantity,
+            Order.created_at,
+            Order.status
+        ).join(Order, Order.id == OrderItem.order_id).filter(OrderItem.id > watermark.last_id)
+        if first_unsettled_id is not None:
+            query = query.filter(OrderItem.id < first_unsettled_id)
+
+        rows = query.order_by(OrderItem.id).limit(batch_size).all()
+
+        if not rows:
+            db.session.commit()
+            break
+
+        increments = {}
+        units = {}
+        for item_id, product_id, quantity, sold_at, status in rows:
+            if status in WITHDRAWN_STATUSES or not quantity:
+                continue
+            weight = sale_weight(quantity, sold_at)
+            increments[product_id] = add_log_weight(increments[product_id], weight) if product_id in increments else weight
+            units[product_id] = units.get(product_id, 0) + quantity
+
+        existing = {
+            popularity.product_id: popularity
+            for popularity in ProductPopularity.query.filter(
+                ProductPopularity.product_id.in_(list(increments))
+            ).all()
+        } if increments else {}
+
+        for product_id, increment in increments.items():
+            popularity = existing.get(product_id)
+            if popularity is None:
+                popularity = ProductPopularity(product_id=product_id, score=0, units_sold=0)
+                db.session.add(popularity)
+            popularity.score = add_log_weight(popularity.score, increment)
+            popularity.units_sold += units[product_id]
+
+        watermark.last_id = rows[-1][0]
+        db.session.commit()
+
+        processed += len(rows)
+        changed_ids.update(increments)
+
+    if changed_ids:
+        # Listing order changed - refresh indexes, cached responses and ETags
+        product_changed(*changed_ids)
+
+    current_app.logger.info(f"Popularity refresh processed {processed} order items")
+    return processed
+
+def reweigh_order(order, new_status):
+    """Add or take back an order's sales when it moves into or out of WITHDRAWN_STATUSES.
+
+    Call before setting ``order.status``; the caller commits. Only items
+    refresh_popularity has already folded in are touched, later ones are
+    weighed by the refresh itself from the status it reads. The watermark
+    row is locked so a concurrent refresh cannot fold in the old status
+    after this has checked it. Returns the ids of the products whose score
+    changed, for product_changed after the commit.
+    """
+    withdrawn = new_status in WITHDRAWN_STATUSES
+    if (order.status in WITHDRAWN_STATUSES) == withdrawn:
+        return []
+
+    last_id = _get_watermark(lock=True).last_id
+    weights = {}
+    units = {}
+    for item in order.items:
+        if item.product_id is None or not item.quantity or item.id is None or item.id > last_id:
+            continue
+        weight = sale_weight(item.quantity, order.created_at)
+        weights[item.product_id] = add_log_weight(weights[item.product_id], weight) if item.product_id in weights else weight
+        units[item.product_id] = units.get(item.product_id, 0) + item.quantity
+
+    if not weights:
+        return []
+
+    for popularity in ProductPopularity.query.filter(ProductPopularity.product_id.in_(list(weights))).all():
+        weight = weights[popularity.product_id]
+        if withdrawn:
+            popularity.score = subtract_log_weight(popularity.score, weight)
+            popularity.units_sold = max(popularity.units_sold - units[popularity.product_id], 0)
+        else:
+            popularity.score = add_log_weight(popularity.score, weight)
+            popularity.units_sold += units[popularity.product_id]
+
+    return sorted(weights)
@@ -0,0 +1,208 @@
+from app.models import db, Product, Category, Brand, ProductImage, ProductVariant
+from app.services.review_stats import get_rating_summaries
+from app.services.stock_shards import shard_totals
+from app.utils.fieldsets import Field, column_field, iso_format, required_relations, load_options
+import json
+
+# Serialization of product pages. Related rows are fetched with one IN query
+# per relation for the whole page instead of lazy loads per product, so the
+# number of queries does not grow with the page size.
+
+def _discount_percentage(product, related):
+    if product.compare_price and product.price and product.compare_price > product.price:
+        return round(float((product.compare_price - product.price) / product.compare_price * 100))
+    return 0
+
+def _stock(product, related):
+    # Sharded products keep their stock in shards, stock_quantity is a display copy
+    return related['stock'].get(product.id, product.stock_quantity) or 0
+
+def _in_stock(product, related):
+    return not product.track_inventory or _stock(product, related) > 0
+
+def _is_low_stock(product, related):
+    return bool(product.track_inventory) and _stock(product, related) <= (product.low_stock_threshold or 0)
+
+def _tags(product, related):
+    # Stored as a JSON list, output as a list like Product.to_dict
+    return json.loads(product.tags) if product.tags else []
+
+def _brand(product, related):
+    brand = related['brands'].get(product.brand_id)
+    return brand.to_dict() if brand else None
+
+def _average_rating(product, related):
+    rating = related['ratings'].get(product.id)
+    return round(rating.rating_avg, 2) if rating else 0
+
+def _review_count(product, related):
+    rating = related['ratings'].get(product.id)
+    return rating.rating_count if rating else 0
+
+def _primary_image(product, related):
+    images = related['images'].get(product.id)
+    return images[0].image_url if images else None
+
+def _images(product, related):
+    return [image.to_dict() for image in related['images'].get(product.id, [])]
+
+def _categories(product, related):
+    return [category.to_dict() for category in related['categories'].get(product.id, [])]
+
+def _variants(product, related):
+    return [variant.to_dict() for variant in related['variants'].get(product.id, [])]
+
+PRODUCT_FIELDS = {
+    'id': column_field('id'),
+    'name': column_field('name'),
+    'description': column_field('description'),
+    'short_description': column_field('short_description'),
+    'sku': column_field('sku'),
+    'slug': column_field('slug'),
+    'price': column_field('price', float),
+    'compare_price': column_field('compare_price', float),
+    'cost_price': column_field('cost_price', float),
+    'discount_percentage': Field(('price', 'compare_price'), None, _discount_percentage),
+    'stock_quantity': column_field('stock_quantity'),
+    'in_stock': Field(('track_inventory', 'stock_quantity'), 'stock', _in_stock),
+    'is_low_stock': Field(('track_inventory', 'stock_quantity', 'low_stock_threshold'), 'stock', _is_low_stock),
+    'track_inventory': column_field('track_inventory'),
+    'allow_backorder': column_field('allow_backorder'),
+    'low_stock_threshold': column_field('low_stock_threshold'),
+    'brand': Field(('brand_id',), 'brands', _brand),
+    'color': column_field('color'),
+    'material': column_field('material'),
+    'frame_type': column_field('frame_type'),
+    'frame_shape': column_field('frame_shape'),
+    'lens_type': column_field('lens_type'),
+    'weight': column_field('weight'),
+    'dimensions': column_field('dimensions'),
+    'frame_width': column_field('frame_width'),
+    'lens_width': column_field('lens_width'),
+    'bridge_width': column_field('bridge_width'),
+    'temple_length': column_field('temple_length'),
+    'meta_title': column_field('meta_title'),
+    'meta_description': column_field('meta_description'),
+    'tags': Field(('tags',), None, _tags),
+    'is_active': column_field('is_active'),
+    'is_featured': column_field('is_featured'),
+    'is_digital': column_field('is_digital'),
+    'requires_shipping': column_field('requires_shipping'),
+    'average_rating': Field((), 'ratings', _average_rating),
+    'review_count': Field((), 'ratings', _review_count),
+    'primary_image': Field((), 'images', _primary_image),
+    'images': Field((), 'images', _images),
+    'categories': Field((), 'categories', _categories),
+    'variants': Field((), 'variants', _variants),
+    'created_at': column_field('created_at', iso_format),
+    'updated_at': column_field('updated_at', iso_format),
+    'published_at': column_field('published_at', iso_format)
+}
+
+# Default output of listings
+LISTING_FIELDS = (
+    'id', 'name', 'short_description', 'sku', 'slug', 'price', 'compare_price',
+    'discount_percentage', 'stock_quantity', 'in_stock', 'is_low_stock', 'brand',
+    'color', 'material', 'frame_type', 'frame_shape', 'lens_type', 'is_active',
+    'is_featured', 'average_rating', 'review_count', 'primary_image', 'categories',
+    'created_at', 'published_at'
+)
+
+# Default output with include_details (admin)
+DETAIL_FIELDS = LISTING_FIELDS + (
+    'description', 'cost_price', 'track_inventory', 'allow_backorder',
+    'low_stock_threshold', 'weight', 'dimensions', 'frame_width', 'lens_width',
+    'bridge_width', 'temple_length', 'meta_title', 'meta_description', 'tags',
+    'is_digital', 'requires_shipping', 'updated_at', 'images', 'variants'
+)
+
+# Fields storefront clients may request with ?fields=
+PUBLIC_FIELDS = LISTING_FIELDS + (
+    'description', 'weight', 'dimensions', 'frame_width', 'lens_width',
+    'bridge_width', 'temple_length', 'tags', 'images', 'variants'
+)
+
+def _load_brands(products):
+    brand_ids = {product.brand_id for product in products if product.brand_id}
+    if not brand_ids:
+        return {}
+    return {brand.id: brand for brand in Brand.query.filter(Brand.id.in_(brand_ids)).all()}
+
+def _load_images(products):
+    """Images per product, primary image first"""
+    images = {}
+    query = ProductImage.query.filter(ProductImage.product_id.in_([product.id for product in products])).order_by(
+        ProductImage.product_id,
+        ProductImage.is_primary.desc(),
+        ProductImage.sort_order,
+        ProductImage.id
+    )
+    for image in query.all():
+        images.setdefault(image.product_id, []).append(image)
+    return images
+
+def _load_categories(products):
+    categories = {}
+    query = db.session.query(Product.id, Category).join(Product.categories).filter(
+        Product.id.in_([product.id for product in products])
+    ).order_by(Category.name)
+    for product_id, category in query.all():
+        categories.setdefault(product_id, []).append(category)
+    return categories
+
+def _load_ratings(products):
+    return get_rating_summaries(product.id for product in products)
+
+def _load_stock(products):
+    return shard_totals([product.id for product in products])
+
+def _load_variants(products):
+    variants = {}
+    query = ProductVariant.query.filter(
+        ProductVariant.product_id.in_([product.id for product in products]),
+        ProductVariant.is_active == True
+    ).order_by(ProductVariant.id)
+    for variant in query.all():
+        variants.setdefault(variant.product_id, []).append(variant)
+    return variants
+
+_RELATION_LOADERS = {
+    'brands': _load_brands,
+    'images': _load_images,
+    'categories': _load_categories,
+    'ratings': _load_ratings,
+    'stock': _load_stock,
+    'variants': _load_variants
+}
+
+def _output_fields(include_details=False, fields=None):
+    if not fields:
+        return DETAIL_FIELDS if include_details else LISTING_FIELDS
+    return tuple(fields) if 'id' in fields else ('id',) + tuple(fields)
+
+def product_query_options(fields=None):
+    """load_only/lazyload options for a query whose rows are serialized with ``fields``"""
+    if not fields:
+        return []
+    return load_options(Product, PRODUCT_FIELDS, _output_fields(fields=fields))
+
+def serialize_products(products, include_details=False, fields=None):
+    """Serialize a page of products with a fixed number of queries.
+
+    ``fields`` (validated names from PRODUCT_FIELDS) limits the output and
+    the relations fetched; otherwise the listing or detail defaults apply.
+    """
+    products = list(products)
+    if not products:
+        return []
+
+    names = _output_fields(include_details, fields)
+    related = {
+        relation: _RELATION_LOADERS[relation](products)
+        for relation in required_relations(PRODUCT_FIELDS, names)
+    }
+
+    return [
+        {name: PRODUCT_FIELDS[name].getter(product, related) for name in names}
+        for product in products
+    ]
@@ -0,0 +1,295 @@
+from flask import current_app
+from sqlalchemy import func, insert
+from app.models import db, Order, OrderItem, OrderStatus, CartItem, Product
+from app.models.catalog import ProductCoPurchase, ProductBoughtTogether, JobWatermark, UserRecommendation
+from datetime import datetime, timedelta
+from itertools import permutations
+import numpy as np
+import json
+
+BOUGHT_TOGETHER_WATERMARK = 'bought_together'
+
+# Orders younger than this are left for the next run, so orders that
+# committed out of id order are not skipped
+SETTLE_DELAY = timedelta(minutes=1)
+
+def _get_watermark(name):
+    watermark = db.session.get(JobWatermark, name)
+    if watermark is None:
+        watermark = JobWatermark(name=name, last_id=0)
+        db.session.add(watermark)
+    return watermark
+
+def _add_co_purchases(pair_counts):
+    """Add {(product_id, related_product_id): orders} to the co-occurrence matrix"""
+    product_ids = {product_id for product_id, _ in pair_counts}
+    existing = {
+        (row.product_id, row.related_product_id): row
+        for row in ProductCoPurchase.query.filter(
+            ProductCoPurchase.product_id.in_(product_ids),
+            ProductCoPurchase.related_product_id.in_(product_ids)
+        ).all()
+    }
+
+    for pair, count in pair_counts.items():
+        row = existing.get(pair)
+        if row is None:
+            row = ProductCoPurchase(product_id=pair[0], related_product_id=pair[1], order_count=0)
+            db.session.add(row)
+        row.order_count += count
+
+def _store_top_related(product_ids, size):
+    """Recompute the stored top ``size`` list of each product from the matrix"""
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        rank = func.row_number().over(
+            partition_by=ProductCoPurchase.product_id,
+            order_by=(ProductCoPurchase.order_count.desc(), ProductCoPurchase.related_product_id)
+        ).label('rank')
+        ranked = db.session.query(
+            ProductCoPurchase.product_id, ProductCoPurchase.related_product_id, rank
+        ).filter(ProductCoPurchase.product_id.in_(chunk)).subquery()
+
+        related = {product_id: [] for product_id in chunk}
+        for product_id, related_product_id, _ in db.session.query(ranked).filter(
+            ranked.c.rank <= size
+        ).order_by(ranked.c.product_id, ranked.c.rank).all():
+            related[product_id].append(related_product_id)
+
+        existing = {
+            row.product_id: row
+            for row in ProductBoughtTogether.query.filter(ProductBoughtTogether.product_id.in_(chunk)).all()
+        }
+        for product_id, related_ids in related.items():
+            row = existing.get(product_id)
+            if row is None:
+                row = ProductBoughtTogether(product_id=product_id)
+                db.session.add(row)
+            row.related_ids = json.dumps(related_ids)
+
+def refresh_bought_together(batch_size=500, full=False):
+    """Fold orders placed since the last run into the co-purchase matrix.
+
+    Only orders past the stored watermark are read, and the top
+    BOUGHT_TOGETHER_SIZE list is recomputed only for the products they touch.
+    ``full`` clears the matrix and starts over. Returns the number of
+    orders processed.
+    """
+    watermark = _get_watermark(BOUGHT_TOGETHER_WATERMARK)
+    if full:
+        ProductBoughtTogether.query.delete()
+        ProductCoPurchase.query.delete()
+        watermark.last_id = 0
+        db.session.commit()
+
+    # Stop before the first unsettled order so the watermark never passes it
+    cutoff = datetime.utcnow() - SETTLE_DELAY
+    first_unsettled_id = db.session.query(func.min(Order.id)).filter(
+        Order.id > watermark.last_id,
+        Order.created_at > cutoff
+    ).scalar()
+
+    processed = 0
+    changed_ids = set()
+
+    while True:
+        query = db.session.query(Order.id, Order.status).filter(Order.id > watermark.last_id)
+        if first_unsettled_id is not None:
+            query = query.filter(Order.id < first_unsettled_id)
+
+        orders = query.order_by(Order.id).limit(batch_size).all()
+
+        if not orders:
+            break
+
+        order_ids = [order_id for order_id, status in orders if status != OrderStatus.CANCELLED]
+        baskets = {}
+        if order_ids:
+            for order_id, product_id in db.session.query(OrderItem.order_id, OrderItem.product_id).filter(
+                OrderItem.order_id.in_(order_ids)
+            ).all():
+                baskets.setdefault(order_id, set()).add(product_id)
+
+        pair_counts = {}
+        for product_ids in baskets.values():
+            for pair in permutations(product_ids, 2):
+                pair_counts[pair] = pair_counts.get(pair, 0) + 1
+
+        if pair_counts:
+            _add_co_purchases(pair_counts)
+            db.session.flush()
+            # Same transaction as the watermark, so a failed run leaves no stale lists
+            touched_ids = {product_id for product_id, _ in pair_counts}
+            _store_top_related(touched_ids, current_app.config.get('BOUGHT_TOGETHER_SIZE', 20))
+            changed_ids.update(touched_ids)
+
+        watermark.last_id = orders[-1][0]
+        db.session.commit()
+
+        processed += len(orders)
+
+    current_app.logger.info(
+        f"Bought-together refresh processed {processed} orders, updated {len(changed_ids)} products"
+    )
+    return processed
+
+def get_bought_together_ids(product_id):
+    """Stored co-purchased product ids of a product, most frequent first"""
+    row = db.session.get(ProductBoughtTogether, product_id)
+    return row.get_related_ids() if row else []
+
+# Personalized recommendations - implicit-feedback ALS (Hu, Koren & Volinsky).
+# A user's interaction with a product is units ordered plus CART_WEIGHT per
+# unit in the cart; confidence in a preference is 1 + ALPHA * interaction.
+
+CART_WEIGHT = 0.5
+ALPHA = 40.0
+REGULARIZATION = 0.1
+
+# Users scored per matrix product when ranking
+SCORING_CHUNK_SIZE = 1024
+
+# Floats of per-entry outer products held at once while solving factors
+SOLVE_CHUNK_SIZE = 1 << 22
+
+def _interactions():
+    """Interaction triples as (user_ids, product_ids, values) arrays"""
+    totals = {}
+    purchases = db.session.query(
+        Order.user_id, OrderItem.product_id, func.sum(OrderItem.quantity)
+    ).join(OrderItem, OrderItem.order_id == Order.id).filter(
+        Order.status != OrderStatus.CANCELLED
+    ).group_by(Order.user_id, OrderItem.product_id)
+    for user_id, product_id, quantity in purchases.all():
+        totals[(user_id, product_id)] = float(quantity or 0)
+
+    cart = db.session.query(
+        CartItem.user_id, CartItem.product_id, func.sum(CartItem.quantity)
+    ).group_by(CartItem.user_id, CartItem.product_id)
+    for user_id, product_id, quantity in cart.all():
+        totals[(user_id, product_id)] = totals.get((user_id, product_id), 0.0) + CART_WEIGHT * float(quantity or 0)
+
+    pairs = [(pair, value) for pair, value in totals.items() if value > 0]
+    users = np.array([user_id for (user_id, _), _ in pairs], dtype=np.int64)
+    products = np.array([product_id for (_, product_id), _ in pairs], dtype=np.int64)
+    values = np.array([value for _, value in pairs], dtype=np.float64)
+    return users, products, values
+
+def _compressed_rows(rows, columns, values, row_count):
+    """CSR (indptr, indices, data) arrays of a sparse matrix given as triples"""
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+    return indptr, columns[order], values[order]
+
+def _solve_factors(fixed, indptr, indices, data, regularization, alpha):
+    """Least squares update of one side's factors with the other side fixed.
+
+    Rows are solved in blocks with one batched np.linalg.solve; the k x k
+    outer products of a block's observed entries are summed per row with
+    np.add.reduceat, at most SOLVE_CHUNK_SIZE floats of them at a time.
+    """
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+    solved = np.zeros((len(indptr) - 1, factors))
+
+    rows = np.flatnonzero(np.diff(indptr))
+    row_ends = indptr[rows + 1]
+    block_entries = max(SOLVE_CHUNK_SIZE // (factors * factors), 1)
+    start = 0
+    while start < len(rows):
+        first = indptr[rows[start]]
+        # Whole rows only, and at least one however many entries it has
+        end = max(int(np.searchsorted(row_ends, first + block_entries, side='right')), start + 1)
+        block = rows[start:end]
+        last = row_ends[end - 1]
+
+        neighbours = fixed[indices[first:last]]
+        confidence = 1.0 + alpha * data[first:last]
+        offsets = indptr[block] - first
+        # Y'CuY = Y'Y + Y'(Cu - I)Y, only the observed rows differ from Y'Y
+        weighted = neighbours * (confidence - 1.0)[:, None]
+        matrices = gram + np.add.reduceat(weighted[:, :, None] * neighbours[:, None, :], offsets, axis=0)
+        targets = np.add.reduceat(neighbours * confidence[:, None], offsets, axis=0)
+        solved[block] = np.linalg.solve(matrices, targets[:, :, None])[:, :, 0]
+        start = end
+    return solved
+
+def als_factorize(user_index, item_index, values, user_count, item_count, factors=32, iterations=15,
+                  regularization=REGULARIZATION, alpha=ALPHA, seed=0):
+    """User and item factor matrices of an implicit-feedback interaction matrix"""
+    random = np.random.default_rng(seed)
+    user_factors = random.normal(scale=0.01, size=(user_count, factors))
+    item_factors = random.normal(scale=0.01, size=(item_count, factors))
+
+    by_user = _compressed_rows(user_index, item_index, values, user_count)
+    by_item = _compressed_rows(item_index, user_index, values, item_count)
+
+    for _ in range(iterations):
+        user_factors = _solve_factors(item_factors, *by_user, regularization, alpha)
+        item_factors = _solve_factors(user_factors, *by_item, regularization, alpha)
+
+    return user_factors, item_factors
+
+def train_recommendations(factors=None, iterations=15, size=None):
+    """Factorize all user/product interactions and store each user's top products.
+
+    Products a user already ordered or has in the cart and inactive
+    products are never recommended. All rows are replaced in one
+    transaction. Returns the number of users stored.
+    """
+    factors = factors or current_app.config.get('RECOMMENDATION_FACTORS', 32)
+    size = size or current_app.config.get('RECOMMENDATION_SIZE', 20)
+
+    users, products, values = _interactions()
+    if not len(values):
+        UserRecommendation.query.delete()
+        db.session.commit()
+        return 0
+
+    user_ids, user_index = np.unique(users, return_inverse=True)
+    product_ids, item_index = np.unique(products, return_inverse=True)
+
+    user_factors, item_factors = als_factorize(
+        user_index, item_index, values, len(user_ids), len(product_ids),
+        factors=factors, iterations=iterations
+    )
+
+    active_ids = {product_id for product_id, in db.session.query(Product.id).filter(Product.is_active == True).all()}
+    inactive = ~np.isin(product_ids, list(active_ids))
+    indptr, seen, _ = _compressed_rows(user_index, item_index, values, len(user_ids))
+    limit = min(size, len(product_ids))
+
+    now = datetime.utcnow()
+    UserRecommendation.query.delete()
+    for start in range(0, len(user_ids), SCORING_CHUNK_SIZE):
+        scores = user_factors[start:start + SCORING_CHUNK_SIZE] @ item_factors.T
+        scores[:, inactive] = -np.inf
+        for offset in range(len(scores)):
+            row = start + offset
+            scores[offset, seen[indptr[row]:indptr[row + 1]]] = -np.inf
+
+        top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        rows = []
+        for offset, candidates in enumerate(top):
+            candidates = candidates[np.argsort(-scores[offset, candidates], kind='stable')]
+            candidates = candidates[np.isfinite(scores[offset, candidates])]
+            rows.append({
+                'user_id': int(user_ids[start + offset]),
+                'product_ids': json.dumps([int(product_ids[candidate]) for candidate in candidates]),
+                'generated_at': now
+            })
+        db.session.execute(insert(UserRecommendation.__table__), rows)
+
+    db.session.commit()
+
+    current_app.logger.info(
+        f"Trained recommendations for {len(user_ids)} users over {len(product_ids)} products"
+    )
+    return len(user_ids)
+
+def get_recommended_ids(user_id):
+    """Stored recommended product ids of a user, best first"""
+    row = db.session.get(UserRecommendation, user_id)
+    return row.get_product_ids() if row else []
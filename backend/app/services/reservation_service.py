@@ -0,0 +1,253 @@
+from flask import current_app
+from sqlalchemy import bindparam, select, insert, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, CartItem, Product, ProductVariant
+from app.models.catalog import StockReservation, ReservedStock
+from app.services.stock_shards import sharded_product_ids, take_sharded_stock, add_to_shards
+from app.services.inventory_service import (
+    InsufficientStockError, check_availability, decrement_stock, tracked_requests
+)
+from datetime import datetime, timedelta
+
+# Checkout stock holds. Creating a payment intent reserves the cart for
+# STOCK_RESERVATION_TTL seconds; confirming the payment turns the holds into
+# stock decrements. Expired holds stop counting at once: availability checks
+# add their units back, and reserving or converting stock releases the
+# expired holds on its products first, so they never wait for
+# `flask inventory sweep`, which only clears holds nobody touched.
+# reserved_stock keeps the held units per product and variant, so
+# availability never sums the holds themselves. Holds on sharded products
+# also move their units out of the shards until released.
+
+def _counter_totals(requested):
+    """{(product_id, variant_id or 0): quantity} reserved_stock changes of ``requested``"""
+    counters = {}
+    for (product_id, variant_id), quantity in requested.items():
+        counters[(product_id, 0)] = counters.get((product_id, 0), 0) + quantity
+        if variant_id:
+            counters[(product_id, variant_id)] = counters.get((product_id, variant_id), 0) + quantity
+    return counters
+
+def _ensure_counters(keys):
+    """Create missing reserved_stock rows at zero"""
+    rows = [{'product_id': product_id, 'product_variant_id': variant_id, 'quantity': 0} for product_id, variant_id in keys]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        db.session.execute(dialect_insert(ReservedStock.__table__).on_conflict_do_nothing(), rows)
+        return
+
+    existing = set(db.session.query(ReservedStock.product_id, ReservedStock.product_variant_id).filter(
+        ReservedStock.product_id.in_({product_id for product_id, _ in keys})
+    ).all())
+    rows = [row for row in rows if (row['product_id'], row['product_variant_id']) not in existing]
+    if rows:
+        db.session.execute(insert(ReservedStock.__table__), rows)
+
+def _counter_params(counters):
+    return [
+        {'key_product_id': product_id, 'key_variant_id': variant_id, 'quantity': quantity}
+        for (product_id, variant_id), quantity in sorted(counters.items())
+    ]
+
+def _conditional_reserve(counters, stock=None):
+    """Add {key: quantity} to reserved_stock rows whose ``stock`` still covers the total.
+
+    One UPDATE executed for every row, the check and the increment in the
+    same statement like decrement_stock; without ``stock`` the rows are
+    incremented unconditionally. Returns whether every row was incremented.
+    """
+    if not counters:
+        return True
+
+    table = ReservedStock.__table__
+    quantity = bindparam('quantity')
+    conditions = [
+        table.c.product_id == bindparam('key_product_id'),
+        table.c.product_variant_id == bindparam('key_variant_id')
+    ]
+    if stock is not None:
+        conditions.append(table.c.quantity + quantity <= stock)
+    statement = table.update().where(*conditions).values(quantity=table.c.quantity + quantity)
+    params = _counter_params(counters)
+
+    if db.session.get_bind().dialect.supports_sane_multi_rowcount:
+        return db.session.execute(statement, params).rowcount == len(params)
+    return all(db.session.execute(statement, row).rowcount == 1 for row in params)
+
+def reserve_stock(user_id, lines):
+    """Hold (product_id, variant_id, quantity) lines for ``user_id`` until the TTL runs out.
+
+    Holds are all or nothing: if any product or variant lacks unreserved
+    stock, nothing is held and InsufficientStockError is raised. Lines of
+    products that do not track inventory are not held. Returns the expiry
+    time, or None when nothing needed holding; the caller commits.
+    """
+    requested = tracked_requests(lines)
+    if not requested:
+        return None
+
+    table = ReservedStock.__table__
+    counters = _counter_totals(requested)
+    product_ids = {product_id for product_id, _ in counters}
+    release_expired_holds(product_ids)
+    product_stock = select(Product.stock_quantity).where(Product.id == table.c.product_id).scalar_subquery()
+    variant_stock = select(ProductVariant.stock_quantity).where(
+        ProductVariant.id == table.c.product_variant_id
+    ).scalar_subquery()
+    variant_counters = {key: total for key, total in counters.items() if key[1]}
+
+    # Retried once when a product was sharded or unsharded meanwhile, like decrement_stock
+    for attempt in range(2):
+        sharded_ids = sharded_product_ids(product_ids)
+        sharded_counters = {key: total for key, total in counters.items() if not key[1] and key[0] in sharded_ids}
+        row_counters = {key: total for key, total in counters.items() if not key[1] and key[0] not in sharded_ids}
+
+        savepoint = db.session.begin_nested()
+        try:
+            _ensure_counters(counters)
+            # Sharded products hold units by taking them off the shards
+            reserved = (
+                take_sharded_stock({product_id: total for (product_id, _), total in sharded_counters.items()})
+                and _conditional_reserve(sharded_counters)
+                and _conditional_reserve(row_counters, product_stock)
+                and _conditional_reserve(variant_counters, variant_stock)
+            )
+            resharded = sharded_product_ids(product_ids) != sharded_ids
+        except Exception:
+            savepoint.rollback()
+            raise
+
+        if reserved and not resharded:
+            expires_at = datetime.utcnow() + timedelta(seconds=current_app.config.get('STOCK_RESERVATION_TTL', 900))
+            db.session.execute(insert(StockReservation.__table__), [
+                {
+                    'user_id': user_id,
+                    'product_id': product_id,
+                    'product_variant_id': variant_id,
+                    'quantity': quantity,
+                    'expires_at': expires_at,
+                    'created_at': datetime.utcnow()
+                }
+                for (product_id, variant_id), quantity in requested.items()
+            ])
+            savepoint.commit()
+            return expires_at
+
+        savepoint.rollback()
+        if not resharded:
+            break
+
+    raise InsufficientStockError(check_availability(lines))
+
+def _delete_holds(hold_ids):
+    """Delete holds by id and return the ids this transaction deleted.
+
+    A hold released concurrently (its owner converting it while another
+    checkout releases it as expired) is deleted by one of them only, so
+    its units are given back once.
+    """
+    table = StockReservation.__table__
+    if db.session.get_bind().dialect.delete_returning:
+        return {
+            hold_id for hold_id, in db.session.execute(
+                delete(table).where(table.c.id.in_(hold_ids)).returning(table.c.id)
+            ).all()
+        }
+    return {
+        hold_id for hold_id in hold_ids
+        if db.session.execute(delete(table).where(table.c.id == hold_id)).rowcount == 1
+    }
+
+def _release(holds):
+    """Delete (id, product_id, variant_id, quantity) holds and take them off reserved_stock"""
+    if not holds:
+        return 0
+
+    deleted = _delete_holds(sorted(hold[0] for hold in holds))
+    held = {}
+    for hold_id, product_id, variant_id, quantity in holds:
+        if hold_id in deleted:
+            held[(product_id, variant_id)] = held.get((product_id, variant_id), 0) + quantity
+    if not held:
+        return 0
+    counters = _counter_totals(held)
+
+    # Units held on sharded products go back onto a shard
+    for product_id in sorted(sharded_product_ids({product_id for product_id, _ in counters})):
+        add_to_shards(product_id, counters[(product_id, 0)])
+
+    table = ReservedStock.__table__
+    db.session.execute(
+        table.update().where(
+            table.c.product_id == bindparam('key_product_id'),
+            table.c.product_variant_id == bindparam('key_variant_id')
+        ).values(quantity=table.c.quantity - bindparam('quantity')),
+        _counter_params(counters)
+    )
+    return len(deleted)
+
+def _hold_query():
+    return db.session.query(
+        StockReservation.id,
+        StockReservation.product_id,
+        StockReservation.product_variant_id,
+        StockReservation.quantity
+    )
+
+def release_reservations(user_id):
+    """Release every hold of a user. Returns the number released; the caller commits"""
+    holds = _hold_query().filter(StockReservation.user_id == user_id).with_for_update().all()
+    return _release(holds)
+
+def release_expired_holds(product_ids):
+    """Release every user's expired holds on ``product_ids``. Returns the number released; the caller commits"""
+    if not product_ids:
+        return 0
+    # Holds locked by their owner's checkout are left to it
+    holds = _hold_query().filter(
+        StockReservation.product_id.in_(product_ids),
+        StockReservation.expires_at <= datetime.utcnow()
+    ).order_by(StockReservation.id).with_for_update(skip_locked=True).all()
+    return _release(holds)
+
+def reserve_cart(user_id):
+    """Replace a user's holds with holds on the current cart. Returns the expiry time"""
+    release_reservations(user_id)
+    lines = db.session.query(CartItem.product_id, CartItem.product_variant_id, CartItem.quantity).filter(
+        CartItem.user_id == user_id
+    ).all()
+    return reserve_stock(user_id, lines)
+
+def convert_reservations(user_id, lines):
+    """Turn a user's holds into stock decrements for the ordered ``lines``.
+
+    The holds are released and the stock taken in the caller's transaction,
+    so a failed decrement (InsufficientStockError, e.g. the holds expired
+    and the units sold meanwhile) leaves the holds in place once rolled
+    back. Other users' expired holds on the same products are released
+    first, so they cannot refuse the order. Returns the ids of the
+    products whose stock changed.
+    """
+    release_reservations(user_id)
+    release_expired_holds({product_id for product_id, _, _ in lines})
+    return decrement_stock(lines)
+
+def release_expired_reservations(batch_size=500):
+    """Release holds past their expiry, ``batch_size`` per transaction. Returns the number released"""
+    released = 0
+    while True:
+        holds = _hold_query().filter(
+            StockReservation.expires_at <= datetime.utcnow()
+        ).order_by(StockReservation.id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not holds:
+            break
+
+        released += _release(holds)
+        db.session.commit()
+
+        if len(holds) < batch_size:
+            break
+
+    current_app.logger.info(f"Released {released} expired stock reservations")
+    return released
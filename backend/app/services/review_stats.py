@@ -0,0 +1,180 @@
+from flask import current_app
+from sqlalchemy import event, inspect, select, update, insert, func, case, cast, Float
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, Review
+from app.models.catalog import ProductRatingSummary
+from app.services.catalog_events import product_changed
+from datetime import datetime
+
+RATINGS = range(1, 6)
+
+def _contribution(product_id, rating, is_approved):
+    """(product_id, rating) a review is counted under, or None if it is not counted"""
+    if not is_approved or product_id is None or rating not in RATINGS:
+        return None
+    return product_id, rating
+
+# Review columns that decide which summary bucket a review is counted in
+COUNTED_COLUMNS = ('product_id', 'rating', 'is_approved')
+
+def _stored_values(connection, target):
+    """COUNTED_COLUMNS of a review as stored, from the flush history.
+
+    A review changed after it was expired (e.g. after a commit) has no old
+    values in its history; those are read from its row, which the flush
+    has not written yet.
+    """
+    state = inspect(target)
+    values = []
+    for column in COUNTED_COLUMNS:
+        known = state.attrs[column].history.non_added()
+        if not known:
+            table = Review.__table__
+            return tuple(connection.execute(
+                select(*(table.c[name] for name in COUNTED_COLUMNS)).where(table.c.id == target.id)
+            ).one())
+        values.append(known[0])
+    return tuple(values)
+
+def _new_values(target, stored):
+    """COUNTED_COLUMNS of a review as the flush writes them"""
+    state = inspect(target)
+    return tuple(
+        added[0] if added else value
+        for added, value in zip((state.attrs[column].history.added for column in COUNTED_COLUMNS), stored)
+    )
+
+def _adjust(connection, product_id, rating, delta):
+    """Add ``delta`` reviews with ``rating`` to a product's summary in one statement"""
+    table = ProductRatingSummary.__table__
+    rating_column = table.c[f'rating_{rating}']
+    now = datetime.utcnow()
+
+    # Right hand sides read the row as it was before this statement
+    new_count = table.c.rating_count + delta
+    new_sum = sum(i * table.c[f'rating_{i}'] for i in RATINGS) + rating * delta
+    changes = {
+        rating_column.name: rating_column + delta,
+        'rating_count': new_count,
+        'rating_avg': case((new_count > 0, cast(new_sum, Float) / new_count), else_=0.0),
+        'updated_at': now
+    }
+
+    if delta < 0:
+        connection.execute(update(table).where(table.c.product_id == product_id).values(**changes))
+        return
+
+    first_review = {f'rating_{i}': 0 for i in RATINGS}
+    first_review.update({
+        rating_column.name: delta,
+        'product_id': product_id,
+        'rating_count': delta,
+        'rating_avg': float(rating),
+        'updated_at': now
+    })
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        # Atomic upsert, so concurrent first reviews of a product cannot collide
+        dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        connection.execute(
+            dialect_insert(table).values(**first_review).on_conflict_do_update(
+                index_elements=[table.c.product_id],
+                set_=changes
+            )
+        )
+        return
+
+    result = connection.execute(update(table).where(table.c.product_id == product_id).values(**changes))
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(**first_review))
+
+def _apply(connection, target, old, new):
+    if old == new:
+        return
+    if old is not None:
+        _adjust(connection, old[0], old[1], -1)
+    if new is not None:
+        _adjust(connection, new[0], new[1], 1)
+
+    # Product payloads embed the rating; notified once the write commits
+    rated = inspect(target).session.info.setdefault('rated_product_ids', set())
+    rated.update(contribution[0] for contribution in (old, new) if contribution is not None)
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, target):
+    _apply(connection, target, None, _contribution(target.product_id, target.rating, target.is_approved))
+
+@event.listens_for(Review, 'before_update')
+def _review_updated(mapper, connection, target):
+    stored = _stored_values(connection, target)
+    _apply(connection, target, _contribution(*stored), _contribution(*_new_values(target, stored)))
+
+@event.listens_for(Review, 'before_delete')
+def _review_deleted(mapper, connection, target):
+    _apply(connection, target, _contribution(*_stored_values(connection, target)), None)
+
+@event.listens_for(db.session, 'after_commit')
+def _ratings_committed(session):
+    session.info['committed_rated_product_ids'] = session.info.pop('rated_product_ids', set())
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _notify_rated_products(session, transaction):
+    # SQL cannot run inside after_commit, and listeners may need it
+    if transaction.parent is not None:
+        return
+    session.info.pop('rated_product_ids', None)
+    product_ids = session.info.pop('committed_rated_product_ids', None)
+    if product_ids:
+        product_changed(*sorted(product_ids))
+
+def empty_rating_stats():
+    return {
+        'average_rating': 0,
+        'total_reviews': 0,
+        'rating_distribution': {str(i): 0 for i in RATINGS}
+    }
+
+def get_rating_summaries(product_ids):
+    """Rating summaries of the given products keyed by product id (one query)"""
+    product_ids = list(set(product_ids))
+    if not product_ids:
+        return {}
+    summaries = ProductRatingSummary.query.filter(ProductRatingSummary.product_id.in_(product_ids)).all()
+    return {summary.product_id: summary for summary in summaries}
+
+def get_rating_stats(product_id):
+    """Average, count and distribution of approved reviews of a product"""
+    summary = db.session.get(ProductRatingSummary, product_id)
+    return summary.to_dict() if summary else empty_rating_stats()
+
+def backfill_rating_summaries():
+    """Recompute every product's summary from the reviews table"""
+    rows = db.session.query(
+        Review.product_id,
+        Review.rating,
+        func.count(Review.id)
+    ).filter(
+        Review.is_approved == True,
+        Review.rating.between(1, 5)
+    ).group_by(Review.product_id, Review.rating).all()
+
+    distributions = {}
+    for product_id, rating, count in rows:
+        distributions.setdefault(product_id, {})[rating] = count
+
+    ProductRatingSummary.query.delete()
+    for product_id, distribution in distributions.items():
+        count = sum(distribution.values())
+        summary = ProductRatingSummary(
+            product_id=product_id,
+            rating_count=count,
+            rating_avg=sum(rating * n for rating, n in distribution.items()) / count
+        )
+        for rating in RATINGS:
+            setattr(summary, f'rating_{rating}', distribution.get(rating, 0))
+        db.session.add(summary)
+
+    db.session.commit()
+    current_app.logger.info(f"Backfilled rating summaries for {len(distributions)} products")
+    return len(distributions)
@@ -0,0 +1,261 @@
+from flask import current_app
+from sqlalchemy import text, func, literal_column, select, or_, union_all, event, Integer, Float
+from app.models import db, Product
+from app.models.search import ProductSearchDocument
+from app.services.fuzzy_search import correct_token, store_search_terms, MIN_FUZZY_LENGTH
+from datetime import datetime
+from itertools import product as combinations
+import json
+import math
+import re
+
+# Text search configuration used by the generated tsvector column (see migration)
+SEARCH_CONFIG = 'english'
+
+FTS_TABLE = 'product_search_fts'
+
+# Spelling variants of one query searched at most, each one full-text index lookup
+MAX_QUERY_VARIANTS = 8
+
+def _dialect():
+    """Name of the database dialect for the current session"""
+    return db.session.get_bind().dialect.name
+
+def _tags_text(tags):
+    """Flatten the stored tags value (JSON list or comma separated) into text"""
+    if not tags:
+        return ''
+    try:
+        parsed = json.loads(tags)
+        if isinstance(parsed, list):
+            return ' '.join(str(tag) for tag in parsed)
+    except (ValueError, TypeError):
+        pass
+    return tags.replace(',', ' ')
+
+def build_search_document(product):
+    """Build the (title, body) text pair indexed for a product"""
+    title_parts = [product.name or '']
+    if product.brand:
+        title_parts.append(product.brand.name or '')
+
+    body_parts = [
+        product.short_description or '',
+        _tags_text(product.tags),
+        product.frame_type or '',
+        product.frame_shape or '',
+        product.color or '',
+        product.material or '',
+        product.description or ''
+    ]
+
+    title = ' '.join(part for part in title_parts if part)
+    body = ' '.join(part for part in body_parts if part)
+    return title, body
+
+def _words(text):
+    return re.findall(r'[a-z0-9]+', (text or '').lower())
+
+def search_terms(product):
+    """{term: phrase} vocabulary entries of a product for typo-tolerant search.
+
+    Words of the name, brand, tags and frame attributes, plus adjacent
+    words of the name and brand joined together so "rayban" finds "Ray Ban".
+    """
+    names = [product.name, product.brand.name if product.brand else None]
+    attributes = [_tags_text(product.tags), product.frame_type, product.frame_shape, product.color, product.material]
+
+    terms = {}
+    for text in names + attributes:
+        for word in _words(text):
+            if len(word) >= MIN_FUZZY_LENGTH and not word.isdigit():
+                terms[word[:100]] = word[:100]
+    for text in names:
+        words = _words(text)
+        for left, right in zip(words, words[1:]):
+            joined = left + right
+            if len(joined) <= 100 and not joined.isdigit():
+                terms.setdefault(joined, f'{left} {right}')
+    return terms
+
+def tokenize_search_query(query):
+    """Split a search query into safe word tokens for tsquery / FTS5 MATCH"""
+    return re.findall(r'\w+', (query or '').lower())[:10]
+
+FTS_TABLE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(title, body, tokenize='porter unicode61')"
+)
+
+def ensure_fts_table():
+    """Create the SQLite FTS5 mirror table if it does not exist yet"""
+    db.session.execute(text(FTS_TABLE_DDL))
+
+# The migration creates the mirror table; databases made with create_all()
+# (development, tests) get it alongside the documents table, so searches and
+# writes never run DDL
+@event.listens_for(ProductSearchDocument.__table__, 'after_create')
+def _create_fts_table(table, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(FTS_TABLE_DDL))
+
+@event.listens_for(ProductSearchDocument.__table__, 'after_drop')
+def _drop_fts_table(table, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+def index_product(product):
+    """Insert or refresh the search document for a product.
+
+    Must be called inside the same transaction as the product write so the
+    document commits (or rolls back) together with it. The product needs an
+    id, so call it after ``db.session.flush()`` for new products.
+    """
+    title, body = build_search_document(product)
+
+    document = db.session.get(ProductSearchDocument, product.id)
+    if document:
+        document.title = title
+        document.body = body
+        document.updated_at = datetime.utcnow()
+    else:
+        document = ProductSearchDocument(product_id=product.id, title=title, body=body)
+        db.session.add(document)
+
+    store_search_terms(search_terms(product))
+
+    if _dialect() == 'sqlite':
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': product.id})
+        db.session.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (:id, :title, :body)"),
+            {'id': product.id, 'title': title, 'body': body}
+        )
+
+    return document
+
+def query_variants(tokens, dialect=None):
+    """Spelling variants of a tokenized query as (words, weight), best first.
+
+    Each misspelled token may be replaced by close vocabulary terms; the
+    weight is the product of their trigram similarities (1.0 as typed).
+    """
+    if not current_app.config.get('SEARCH_FUZZY_MATCHING', True):
+        return [(tokens, 1.0)]
+
+    dialect = dialect or _dialect()
+    options = [
+        [([token], 1.0)] + [(phrase.split(), similarity) for phrase, similarity in correct_token(token, dialect)]
+        for token in tokens
+    ]
+
+    # Drop the least similar corrections until the variant count is bounded
+    while math.prod(len(alternatives) for alternatives in options) > MAX_QUERY_VARIANTS:
+        max(options, key=len).pop()
+
+    variants = []
+    for combination in combinations(*options):
+        words = [word for alternative, _ in combination for word in alternative]
+        weight = math.prod(similarity for _, similarity in combination)
+        variants.append((words, weight))
+    variants.sort(key=lambda variant: -variant[1])
+    return variants
+
+def corrected_query(query):
+    """``query`` with misspelled words replaced by their best correction, or None"""
+    tokens = tokenize_search_query(query)
+    if not tokens or not current_app.config.get('SEARCH_FUZZY_MATCHING', True):
+        return None
+
+    dialect = _dialect()
+    words = []
+    for token in tokens:
+        corrections = correct_token(token, dialect)
+        words.append(corrections[0][0] if corrections else token)
+    return ' '.join(words) if words != tokens else None
+
+def search_ranking_subquery(query):
+    """Return a subquery of (product_id, rank) for products matching ``query``.
+
+    Higher rank means more relevant. Misspelled words are also searched as
+    their closest vocabulary terms, with the rank scaled by similarity so
+    exact matches come first. Returns None when the query contains no
+    searchable tokens.
+    """
+    tokens = tokenize_search_query(query)
+    if not tokens:
+        return None
+
+    dialect = _dialect()
+
+    if dialect == 'postgresql':
+        # Prefix match every token so partial words ("avia") still hit
+        search_vector = literal_column('product_search_documents.search_vector')
+        matches = []
+        for words, weight in query_variants(tokens, dialect):
+            ts_query = func.to_tsquery(SEARCH_CONFIG, ' & '.join(f'{word}:*' for word in words))
+            matches.append(select(
+                ProductSearchDocument.product_id.label('product_id'),
+                (func.ts_rank_cd(search_vector, ts_query) * weight).label('rank')
+            ).where(search_vector.op('@@')(ts_query)))
+
+        if len(matches) == 1:
+            return matches[0].subquery()
+        combined = union_all(*matches).subquery()
+        return select(
+            combined.c.product_id,
+            func.max(combined.c.rank).label('rank')
+        ).group_by(combined.c.product_id).subquery()
+
+    if dialect == 'sqlite':
+        # bm25() is lower-is-better, negate it so rank sorts like ts_rank_cd;
+        # the title column is weighted over the body like setweight A/B on PostgreSQL
+        matches = []
+        params = {}
+        for position, (words, weight) in enumerate(query_variants(tokens, dialect)):
+            matches.append(
+                f"SELECT rowid AS product_id, -bm25({FTS_TABLE}, 10.0, 1.0) * :weight_{position} AS rank "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match_{position}"
+            )
+            params[f'match_{position}'] = ' '.join(f'"{word}"*' for word in words)
+            params[f'weight_{position}'] = weight
+
+        sql = matches[0] if len(matches) == 1 else (
+            "SELECT product_id, MAX(rank) AS rank FROM ("
+            + " UNION ALL ".join(matches)
+            + ") GROUP BY product_id"
+        )
+        return text(sql).bindparams(**params).columns(product_id=Integer, rank=Float).subquery()
+
+    # Unknown backend: fall back to substring matching on the stored document
+    current_app.logger.warning(f"Full-text search not supported on {dialect}, using LIKE fallback")
+    conditions = []
+    for token in tokens:
+        conditions.append(or_(
+            ProductSearchDocument.title.ilike(f'%{token}%'),
+            ProductSearchDocument.body.ilike(f'%{token}%')
+        ))
+    return select(
+        ProductSearchDocument.product_id.label('product_id'),
+        literal_column('1.0').label('rank')
+    ).where(*conditions).subquery()
+
+def rebuild_search_index(batch_size=500):
+    """Rebuild search documents for every product. Returns the number indexed"""
+    if _dialect() == 'sqlite':
+        # Also sets up the mirror of a database created before it existed
+        ensure_fts_table()
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+
+    count = 0
+    last_id = 0
+    while True:
+        products = Product.query.filter(Product.id > last_id).order_by(Product.id).limit(batch_size).all()
+        if not products:
+            break
+        for product in products:
+            index_product(product)
+            count += 1
+        last_id = products[-1].id
+        db.session.commit()
+
+    return count
@@ -0,0 +1,193 @@
+from flask import current_app
+from app.models import db, Product
+from app.services.catalog_events import on_product_changed
+import numpy as np
+import threading
+import time
+
+# Numeric frame measurements (mm), standardized to zero mean / unit variance
+MEASUREMENTS = ('frame_width', 'lens_width', 'bridge_width', 'temple_length')
+
+# Categorical attributes, one-hot encoded
+STYLE_ATTRIBUTES = ('frame_type', 'frame_shape')
+
+# Weight of a one-hot column relative to one standard deviation of a measurement
+STYLE_WEIGHT = 1.0
+
+class SimilarityIndex:
+    """Per-worker feature matrix of active products for "similar frames".
+
+    Every product is a row of standardized measurements followed by one-hot
+    style columns; a query is one vectorized squared-distance computation
+    over the matrix plus an argpartition for the top k. Missing measurements
+    sit at the catalog mean so they neither attract nor repel.
+
+    Rows are patched in place when products change, reusing the mean and
+    deviation of the last full build; a deactivated product leaves a free
+    row for the next new one, and the arrays grow geometrically, so a
+    product write never copies the matrix. It is rebuilt when older than
+    CATALOG_INDEX_TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.rows = {}
+        self.free = []
+        self.features = np.empty((0, len(MEASUREMENTS)), dtype=np.float64)
+        self.has_features = np.empty(0, dtype=bool)
+        self.styles = {}
+        self.mean = np.zeros(len(MEASUREMENTS))
+        self.scale = np.ones(len(MEASUREMENTS))
+        self.built_at = None
+
+    def _load(self, product_ids=None):
+        query = db.session.query(
+            Product.id, *[getattr(Product, column) for column in MEASUREMENTS + STYLE_ATTRIBUTES]
+        ).filter(Product.is_active == True)
+        if product_ids is not None:
+            query = query.filter(Product.id.in_(product_ids))
+        return query.all()
+
+    def _style_column(self, attribute, value):
+        """Column of a style value, appending a zero column for values not seen yet"""
+        key = (attribute, value)
+        column = self.styles.get(key)
+        if column is None:
+            column = self.styles[key] = self.features.shape[1]
+            self.features = np.hstack([self.features, np.zeros((len(self.features), 1))])
+        return column
+
+    def _vectors(self, rows):
+        """Feature matrix and has-features flags for rows from _load"""
+        measurements = np.array(
+            [[np.nan if value is None else float(value) for value in row[1:1 + len(MEASUREMENTS)]] for row in rows],
+            dtype=np.float64
+        ).reshape(len(rows), len(MEASUREMENTS))
+        has_features = ~np.isnan(measurements).all(axis=1)
+
+        # Assign style columns first, the matrix may grow while doing so
+        style_columns = []
+        for row in rows:
+            columns = []
+            for attribute, value in zip(STYLE_ATTRIBUTES, row[1 + len(MEASUREMENTS):]):
+                if value:
+                    columns.append(self._style_column(attribute, value))
+            style_columns.append(columns)
+
+        vectors = np.zeros((len(rows), self.features.shape[1]))
+        vectors[:, :len(MEASUREMENTS)] = np.nan_to_num((measurements - self.mean) / self.scale)
+        for position, columns in enumerate(style_columns):
+            vectors[position, columns] = STYLE_WEIGHT
+            if columns:
+                has_features[position] = True
+        return vectors, has_features
+
+    def _free_positions(self, count):
+        """``count`` unused rows, growing the arrays by at least half when short"""
+        if len(self.free) < count:
+            start = len(self.ids)
+            grow = max(count - len(self.free), start // 2, 16)
+            self.ids = np.concatenate([self.ids, np.full(grow, -1, dtype=np.int64)])
+            self.features = np.vstack([self.features, np.zeros((grow, self.features.shape[1]))])
+            self.has_features = np.concatenate([self.has_features, np.zeros(grow, dtype=bool)])
+            # Popped from the end, so new products fill rows in ascending order
+            self.free.extend(range(start + grow - 1, start - 1, -1))
+        return [self.free.pop() for _ in range(count)]
+
+    def _remove(self, product_ids):
+        """Free the rows of products no longer listed"""
+        for product_id in product_ids:
+            position = self.rows.pop(product_id, None)
+            if position is not None:
+                self.ids[position] = -1
+                self.features[position] = 0
+                self.has_features[position] = False
+                self.free.append(position)
+
+    def _write(self, rows):
+        """Store rows from _load, in place for products already indexed"""
+        if not rows:
+            return
+        vectors, has_features = self._vectors(rows)
+        new_ids = [row.id for row in rows if row.id not in self.rows]
+        self.rows.update(zip(new_ids, self._free_positions(len(new_ids))))
+
+        positions = [self.rows[row.id] for row in rows]
+        self.ids[positions] = [row.id for row in rows]
+        self.features[positions] = vectors
+        self.has_features[positions] = has_features
+
+    def rebuild(self):
+        """Rebuild the matrix and normalization from the database"""
+        rows = self._load()
+        with self._lock:
+            self._reset()
+            if rows:
+                measurements = np.array(
+                    [[np.nan if value is None else float(value) for value in row[1:1 + len(MEASUREMENTS)]] for row in rows],
+                    dtype=np.float64
+                )
+                known = ~np.isnan(measurements)
+                counts = known.sum(axis=0)
+                sums = np.where(known, measurements, 0).sum(axis=0)
+                self.mean = np.divide(sums, counts, out=np.zeros(len(MEASUREMENTS)), where=counts > 0)
+                squares = np.where(known, (measurements - self.mean) ** 2, 0).sum(axis=0)
+                std = np.sqrt(np.divide(squares, counts, out=np.zeros(len(MEASUREMENTS)), where=counts > 0))
+                self.scale = np.where(std > 0, std, 1.0)
+            self._write(rows)
+            self.built_at = time.monotonic()
+
+    def refresh_products(self, product_ids):
+        """Re-read the given products and replace their rows"""
+        if self.built_at is None:
+            return
+
+        rows = self._load(product_ids)
+        with self._lock:
+            self._remove(set(product_ids) - {row.id for row in rows})
+            self._write(rows)
+
+    def ensure_fresh(self):
+        """Build the matrix on first use and rebuild it once it is stale"""
+        ttl = current_app.config.get('CATALOG_INDEX_TTL', 300)
+        if self.built_at is None or (ttl and time.monotonic() - self.built_at > ttl):
+            self.rebuild()
+
+    def reset(self):
+        """Drop the loaded index; the next use rebuilds it"""
+        with self._lock:
+            self._reset()
+
+    def similar(self, product_id, limit=8):
+        """Ids of the ``limit`` active products closest to ``product_id``, nearest first.
+
+        Empty if the product is unknown or has no frame attributes to compare.
+        """
+        with self._lock:
+            position = self.rows.get(product_id)
+            if position is None or not self.has_features[position]:
+                return []
+
+            candidates = np.flatnonzero(self.has_features)
+            candidates = candidates[candidates != position]
+            if not len(candidates) or limit <= 0:
+                return []
+
+            differences = self.features[candidates] - self.features[position]
+            distances = np.einsum('ij,ij->i', differences, differences)
+
+            limit = min(limit, len(candidates))
+            nearest = np.argpartition(distances, limit - 1)[:limit]
+            # Ties broken by id so pages are stable
+            nearest = nearest[np.lexsort((self.ids[candidates[nearest]], distances[nearest]))]
+            return [int(product_id) for product_id in self.ids[candidates[nearest]]]
+
+similarity_index = SimilarityIndex()
+
+@on_product_changed
+def _refresh_similarity_index(product_ids):
+    similarity_index.refresh_products(product_ids)
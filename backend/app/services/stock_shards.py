@@ -0,0 +1,168 @@
+from sqlalchemy import func, select, insert, update
+from app.models import db, Product
+from app.models.catalog import ProductStockShard, ReservedStock
+import random
+
+# Opt-in sharded stock for hot products (flash sales). A sharded product's
+# unreserved stock is split over product_stock_shards rows and a checkout
+# decrements a random shard that has stock, so concurrent checkouts rarely
+# wait on the same row lock. Checkout holds move units out of the shards
+# into reserved_stock and releasing them puts them back, so a shard
+# decrement never needs to look at reservations. The shards are
+# authoritative; products.stock_quantity is a display copy (shards plus
+# held units) written on rebalance and by `flask inventory sync-shards`.
+#
+# Locks are always taken product row, then shards, then reserved_stock.
+
+MAX_SHARDS = 64
+
+def sharded_stock(product_id_column):
+    """Scalar subquery of a product's shard total, NULL when it is not sharded"""
+    return select(func.sum(ProductStockShard.quantity)).where(
+        ProductStockShard.product_id == product_id_column
+    ).scalar_subquery()
+
+def current_stock():
+    """Stock of Product rows for filters and display: the shard total when sharded, else stock_quantity"""
+    return func.coalesce(sharded_stock(Product.id), Product.stock_quantity)
+
+def shard_totals(product_ids):
+    """{product_id: shard total} of the sharded products among ``product_ids``"""
+    if not product_ids:
+        return {}
+    return dict(db.session.query(ProductStockShard.product_id, func.sum(ProductStockShard.quantity)).filter(
+        ProductStockShard.product_id.in_(product_ids)
+    ).group_by(ProductStockShard.product_id).all())
+
+def sharded_product_ids(product_ids):
+    """The ids among ``product_ids`` whose stock is sharded"""
+    if not product_ids:
+        return set()
+    return {
+        product_id for product_id, in db.session.query(ProductStockShard.product_id).filter(
+            ProductStockShard.product_id.in_(product_ids)
+        ).distinct().all()
+    }
+
+def _locked_shards(product_id):
+    # Always locked in shard order so rebalances and drains cannot deadlock
+    return db.session.query(ProductStockShard.shard, ProductStockShard.quantity).filter(
+        ProductStockShard.product_id == product_id
+    ).order_by(ProductStockShard.shard).with_for_update().all()
+
+def _shard_decrement(product_id, shard, quantity):
+    table = ProductStockShard.__table__
+    return db.session.execute(
+        table.update().where(
+            table.c.product_id == product_id,
+            table.c.shard == shard,
+            table.c.quantity >= quantity
+        ).values(quantity=table.c.quantity - quantity)
+    ).rowcount == 1
+
+def take_from_shards(product_id, quantity):
+    """Take ``quantity`` units of a sharded product. Returns whether they were taken.
+
+    Shards holding enough are tried in random order with a conditional
+    single-row decrement. Only when no single shard can cover the quantity
+    are all shards locked and drained in order.
+    """
+    candidates = [
+        shard for shard, in db.session.query(ProductStockShard.shard).filter(
+            ProductStockShard.product_id == product_id,
+            ProductStockShard.quantity >= quantity
+        ).all()
+    ]
+    random.shuffle(candidates)
+    for shard in candidates:
+        if _shard_decrement(product_id, shard, quantity):
+            return True
+
+    shards = _locked_shards(product_id)
+    if sum(available for _, available in shards) < quantity:
+        return False
+
+    remaining = quantity
+    for shard, available in shards:
+        taken = min(available, remaining)
+        if taken:
+            _shard_decrement(product_id, shard, taken)
+            remaining -= taken
+        if not remaining:
+            break
+    return True
+
+def take_sharded_stock(totals):
+    """Take {product_id: quantity} from sharded products. Returns whether all was taken"""
+    return all(take_from_shards(product_id, quantity) for product_id, quantity in sorted(totals.items()))
+
+def add_to_shards(product_id, quantity):
+    """Put ``quantity`` units back on a random shard of a sharded product"""
+    shards = [
+        shard for shard, in db.session.query(ProductStockShard.shard).filter(
+            ProductStockShard.product_id == product_id
+        ).all()
+    ]
+    table = ProductStockShard.__table__
+    db.session.execute(
+        table.update().where(
+            table.c.product_id == product_id,
+            table.c.shard == random.choice(shards)
+        ).values(quantity=table.c.quantity + quantity)
+    )
+
+def rebalance_stock_shards(product_id, total=None, shards=None):
+    """Spread a product's unreserved stock evenly over ``shards`` rows; the caller commits.
+
+    ``total`` replaces the stock, held units included (default: the
+    product's current stock) and ``shards`` the shard count (default:
+    unchanged). 0 or 1 shards turns sharding off and leaves the total in
+    products.stock_quantity. Returns the new shard count.
+    """
+    # Unsharded checkouts decrement the product row, so with it locked none
+    # can commit between reading its stock and moving that into shards
+    stock_quantity = db.session.query(Product.stock_quantity).filter(
+        Product.id == product_id
+    ).with_for_update().scalar()
+    current = _locked_shards(product_id)
+    reserved = db.session.query(ReservedStock.quantity).filter(
+        ReservedStock.product_id == product_id,
+        ReservedStock.product_variant_id == 0
+    ).with_for_update().scalar() or 0
+
+    if total is None:
+        total = sum(quantity for _, quantity in current) + reserved if current else (stock_quantity or 0)
+    shards = len(current) if shards is None else shards
+    shards = shards if shards > 1 else 0
+
+    db.session.query(ProductStockShard).filter(
+        ProductStockShard.product_id == product_id
+    ).delete(synchronize_session=False)
+    if shards:
+        base, extra = divmod(max(total - reserved, 0), shards)
+        db.session.execute(insert(ProductStockShard.__table__), [
+            {'product_id': product_id, 'shard': shard, 'quantity': base + (1 if shard < extra else 0)}
+            for shard in range(shards)
+        ])
+
+    db.session.query(Product).filter(Product.id == product_id).update(
+        {'stock_quantity': total}, synchronize_session=False
+    )
+    return shards
+
+def sync_sharded_stock():
+    """Copy shard totals plus held units into products.stock_quantity. Returns the ids of the products updated"""
+    product_ids = {product_id for product_id, in db.session.query(ProductStockShard.product_id).distinct().all()}
+    if product_ids:
+        table = Product.__table__
+        reserved = select(ReservedStock.quantity).where(
+            ReservedStock.product_id == table.c.id,
+            ReservedStock.product_variant_id == 0
+        ).scalar_subquery()
+        db.session.execute(
+            update(table).where(table.c.id.in_(product_ids)).values(
+                stock_quantity=sharded_stock(table.c.id) + func.coalesce(reserved, 0)
+            )
+        )
+        db.session.commit()
+    return sorted(product_ids)
@@ -0,0 +1,205 @@
+from flask import current_app
+from sqlalchemy import func, and_
+from app.models import db, Product, Brand, OrderItem
+from app.services.catalog_events import on_product_changed, on_brand_changed
+import heapq
+import json
+import threading
+import time
+
+# Longest prefix stored in the edge n-gram map; longer queries are verified by substring
+MAX_PREFIX_LENGTH = 20
+
+def _normalize(text):
+    return ' '.join((text or '').lower().split())
+
+def _split_tags(tags):
+    """Individual tag strings from the stored tags value"""
+    if not tags:
+        return []
+    try:
+        parsed = json.loads(tags)
+        if isinstance(parsed, list):
+            return [str(tag).strip() for tag in parsed if str(tag).strip()]
+    except (ValueError, TypeError):
+        pass
+    return [tag.strip() for tag in tags.split(',') if tag.strip()]
+
+def _edge_ngrams(normalized):
+    """Prefixes of every word start, e.g. 'ray ban' -> r, ra, ray, ray b, ..., b, ba, ban"""
+    words = normalized.split(' ')
+    for i in range(len(words)):
+        tail = ' '.join(words[i:])
+        for end in range(1, min(len(tail), MAX_PREFIX_LENGTH) + 1):
+            yield tail[:end]
+
+class _Entry:
+    """A suggestion and the popularity of each product contributing to it"""
+    __slots__ = ('kind', 'label', 'normalized', 'products')
+
+    def __init__(self, kind, label, normalized):
+        self.kind = kind
+        self.label = label
+        self.normalized = normalized
+        self.products = {}
+
+    @property
+    def score(self):
+        return sum(self.products.values())
+
+    def display(self):
+        if self.kind == 'brand':
+            return f"{self.label} (Brand)"
+        return self.label
+
+class SuggestionIndex:
+    """Per-worker edge n-gram index over product names, brand names and tags.
+
+    Lookups are a dict hit plus a top-k selection by popularity (units
+    sold), so they never touch the database. Individual products are
+    refreshed in place when they change; the whole index is rebuilt once it
+    is older than CATALOG_INDEX_TTL so workers converge on writes made
+    by other processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}        # (kind, normalized) -> _Entry
+        self._prefixes = {}       # prefix -> set of entry keys
+        self._product_keys = {}   # product_id -> entry keys it contributes to
+        self._built_at = None
+
+    def _add_product(self, product, brand_name, popularity):
+        labels = [('product', product.name)]
+        if brand_name:
+            labels.append(('brand', brand_name))
+        labels.extend(('tag', tag) for tag in _split_tags(product.tags))
+
+        keys = []
+        for kind, label in labels:
+            normalized = _normalize(label)
+            if not normalized:
+                continue
+            key = (kind, normalized)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(kind, label, normalized)
+                for prefix in _edge_ngrams(normalized):
+                    self._prefixes.setdefault(prefix, set()).add(key)
+            entry.products[product.id] = popularity
+            keys.append(key)
+        self._product_keys[product.id] = keys
+
+    def _remove_product(self, product_id):
+        for key in self._product_keys.pop(product_id, []):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            entry.products.pop(product_id, None)
+            if entry.products:
+                continue
+            del self._entries[key]
+            for prefix in _edge_ngrams(entry.normalized):
+                bucket = self._prefixes.get(prefix)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._prefixes[prefix]
+
+    def _load(self, product_ids=None):
+        """Active products with their active brand name and units sold"""
+        query = db.session.query(Product, Brand.name).outerjoin(
+            Brand, and_(Brand.id == Product.brand_id, Brand.is_active == True)
+        ).filter(Product.is_active == True)
+
+        sales_query = db.session.query(
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity)
+        ).group_by(OrderItem.product_id)
+
+        if product_ids is not None:
+            query = query.filter(Product.id.in_(product_ids))
+            sales_query = sales_query.filter(OrderItem.product_id.in_(product_ids))
+
+        sales = dict(sales_query.all())
+        return [(product, brand_name, int(sales.get(product.id) or 0)) for product, brand_name in query.all()]
+
+    def rebuild(self):
+        """Rebuild the whole index from the database"""
+        rows = self._load()
+        with self._lock:
+            self._reset()
+            for product, brand_name, popularity in rows:
+                self._add_product(product, brand_name, popularity)
+            self._built_at = time.monotonic()
+
+    def refresh_products(self, product_ids):
+        """Re-read the given products and replace their suggestions"""
+        if self._built_at is None:
+            return  # Not built yet, the first lookup loads everything
+
+        rows = self._load(product_ids)
+        with self._lock:
+            for product_id in product_ids:
+                self._remove_product(product_id)
+            for product, brand_name, popularity in rows:
+                self._add_product(product, brand_name, popularity)
+
+    def refresh_brands(self, brand_ids):
+        """Re-read the products of the given brands, whose brand suggestions changed"""
+        if self._built_at is None:
+            return
+
+        product_ids = [
+            product_id for product_id, in db.session.query(Product.id).filter(Product.brand_id.in_(brand_ids)).all()
+        ]
+        if product_ids:
+            self.refresh_products(product_ids)
+
+    def reset(self):
+        """Drop the loaded index; the next lookup rebuilds it"""
+        with self._lock:
+            self._reset()
+
+    def _is_stale(self):
+        if self._built_at is None:
+            return True
+        ttl = current_app.config.get('CATALOG_INDEX_TTL', 300)
+        return bool(ttl) and time.monotonic() - self._built_at > ttl
+
+    def suggest(self, query, limit=10):
+        """Most popular suggestions with a word starting with ``query``"""
+        if self._is_stale():
+            self.rebuild()
+
+        normalized = _normalize(query)
+        with self._lock:
+            keys = self._prefixes.get(normalized[:MAX_PREFIX_LENGTH], ())
+            candidates = [self._entries[key] for key in keys]
+            if len(normalized) > MAX_PREFIX_LENGTH:
+                candidates = [entry for entry in candidates if normalized in entry.normalized]
+
+            best = heapq.nsmallest(
+                limit,
+                candidates,
+                key=lambda entry: (-entry.score, entry.normalized, entry.kind)
+            )
+
+        return [entry.display() for entry in best]
+
+suggestion_index = SuggestionIndex()
+
+@on_product_changed
+def _refresh_suggestions(product_ids):
+    suggestion_index.refresh_products(product_ids)
+
+@on_brand_changed
+def _refresh_brand_suggestions(brand_ids):
+    suggestion_index.refresh_brands(brand_ids)
+
+def get_suggestions(query, limit=10):
+    """Search suggestions for ``query`` from the in-memory index"""
+    return suggestion_index.suggest(query, limit)
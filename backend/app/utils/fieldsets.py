@@ -0,0 +1,39 @@
+from collections import namedtuple
+from sqlalchemy.orm import load_only, lazyload
+
+# A serializable attribute: the model columns it reads, the batch-loaded
+# relation it needs (or None) and a getter called as getter(instance, related)
+Field = namedtuple('Field', ['columns', 'relation', 'getter'])
+
+def column_field(name, convert=None):
+    """Field that outputs a single column, optionally converted when not NULL"""
+    def getter(instance, related):
+        value = getattr(instance, name)
+        if convert is not None and value is not None:
+            return convert(value)
+        return value
+    return Field((name,), None, getter)
+
+def iso_format(value):
+    return value.isoformat()
+
+def enum_value(value):
+    return value.value
+
+def required_relations(field_map, names):
+    """Batch-loaded relations needed to output ``names``"""
+    return {field_map[name].relation for name in names if field_map[name].relation}
+
+def load_options(model, field_map, names):
+    """Query options restricting the SELECT to the columns ``names`` read.
+
+    Relationships are left lazy, the serializers fetch the ones they need
+    for the whole page in a single query.
+    """
+    columns = {'id'}
+    for name in names:
+        columns.update(field_map[name].columns)
+    return [
+        load_only(*[getattr(model, column) for column in sorted(columns)]),
+        lazyload('*')
+    ]
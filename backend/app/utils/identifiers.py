@@ -0,0 +1,49 @@
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app.models import db
+import re
+
+def slugify(text, fallback='item'):
+    """Lowercase, dash separated URL slug"""
+    return re.sub(r'[^a-z0-9]+', '-', (text or '').lower()).strip('-') or fallback
+
+def sku_code(text, length=10):
+    """Uppercase alphanumeric code used as the SKU prefix"""
+    return re.sub(r'[^A-Z0-9]+', '', (text or '').upper())[:length] or 'SKU'
+
+def next_free_identifier(column, base, reserved=()):
+    """``base`` or ``base-N`` with the lowest unused N above the highest taken.
+
+    A single prefix query over the (indexed) unique column replaces probing
+    one candidate at a time; ``reserved`` values (picked for rows not yet
+    written) count as taken too. Concurrent writers can still pick the same
+    value, so pair this with flush_with_unique_retry.
+    """
+    taken = {
+        value for (value,) in db.session.query(column).filter(
+            or_(column == base, column.startswith(f'{base}-', autoescape=True))
+        ).all()
+    }
+    taken.update(value for value in reserved if value == base or value.startswith(f'{base}-'))
+    if base not in taken:
+        return base
+
+    pattern = re.compile(rf'^{re.escape(base)}-(\d+)$')
+    suffixes = [int(match.group(1)) for match in map(pattern.match, taken) if match]
+    return f'{base}-{max(suffixes, default=0) + 1}'
+
+def flush_with_unique_retry(instance, assign, attempts=5):
+    """Insert ``instance``, re-running ``assign(instance)`` on unique conflicts.
+
+    Each attempt flushes inside a savepoint, so a conflicting concurrent
+    insert only rolls back that attempt, not the caller's transaction.
+    """
+    for attempt in range(attempts):
+        assign(instance)
+        try:
+            with db.session.begin_nested():
+                db.session.add(instance)
+            return instance
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
@@ -0,0 +1,85 @@
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import or_, and_
+
+class InvalidCursorError(Exception):
+    """Raised when a pagination cursor cannot be decoded"""
+    pass
+
+def _cursor_serializer(salt):
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=salt)
+
+def _encode_value(value):
+    """Make a sort key value JSON serializable"""
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+def _decode_value(value):
+    """Reverse _encode_value"""
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+    return value
+
+def encode_cursor(sort_key, sort_value, last_id, salt='cursor'):
+    """Build an opaque, signed cursor pointing after the given row"""
+    payload = {
+        'k': sort_key,
+        'v': _encode_value(sort_value),
+        'id': last_id
+    }
+    return _cursor_serializer(salt).dumps(payload)
+
+def decode_cursor(cursor, sort_key, salt='cursor'):
+    """Decode a cursor and return (sort_value, last_id).
+
+    Raises InvalidCursorError if the cursor was tampered with or was issued
+    for a different sort order than the current request.
+    """
+    try:
+        payload = _cursor_serializer(salt).loads(cursor)
+    except BadSignature:
+        raise InvalidCursorError('Invalid cursor')
+
+    if not isinstance(payload, dict) or payload.get('k') != sort_key or 'id' not in payload:
+        raise InvalidCursorError('Cursor does not match the requested sort order')
+
+    return _decode_value(payload.get('v')), payload['id']
+
+def keyset_order(sort_column, id_column, descending=True):
+    """ORDER BY (sort_column, id) for keyset_filter.
+
+    NULL sort keys rank above every value in both directions, the order of
+    a plain PostgreSQL index, so either direction can scan one. SQLite
+    ranks NULLs lowest by default, hence the explicit NULLS FIRST/LAST.
+    """
+    if descending:
+        return sort_column.desc().nulls_first(), id_column.desc()
+    return sort_column.asc().nulls_last(), id_column.asc()
+
+def keyset_filter(sort_column, id_column, sort_value, last_id, descending=True):
+    """WHERE clause seeking past (sort_value, last_id) in keyset_order"""
+    if descending:
+        if sort_value is None:
+            # Still among the NULL keys, which come first - then every value
+            return or_(and_(sort_column.is_(None), id_column < last_id), sort_column.isnot(None))
+        return or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < last_id)
+        )
+
+    if sort_value is None:
+        # Past every value already - only NULL keys with a later id remain
+        return and_(sort_column.is_(None), id_column > last_id)
+    return or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > last_id),
+        sort_column.is_(None)
+    )
@@ -40,13 +40,16 @@ def validate_required_fields(data, required_fields):
     
     return errors
 
-def validate_product_data(data):
-    """Validate product data"""
+# Fields a new product cannot be created without
+PRODUCT_REQUIRED_FIELDS = ['name', 'description', 'price', 'sku']
+
+def validate_product_data(data, partial=False):
+    """Validate product data; ``partial`` only checks the fields present (updates)"""
     errors = []
     
     # Required fields for products
-    required_fields = ['name', 'description', 'price', 'sku']
-    errors.extend(validate_required_fields(data, required_fields))
+    if not partial:
+        errors.extend(validate_required_fields(data, PRODUCT_REQUIRED_FIELDS))
     
     # Validate price
     if 'price' in data:
@@ -235,4 +238,45 @@ def validate_pagination_params(page=1, per_page=20, max_per_page=100):
         errors.append("Per page must be a valid integer")
         per_page = 20
     
-    return page, per_page, errors
\ No newline at end of file
+    return page, per_page, errors
+
+def validate_fields_param(fields, allowed_fields):
+    """Validate a comma separated sparse fieldset (?fields=) parameter"""
+    errors = []
+    
+    if not fields:
+        return None, errors
+    
+    requested = []
+    for field in fields.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in allowed_fields:
+            errors.append(f"Unknown field: {field}")
+        elif field not in requested:
+            requested.append(field)
+    
+    return requested or None, errors
+
+def validate_batch_param(values, max_items=100, as_int=False):
+    """Validate a comma separated list of product ids or slugs (?ids=, ?slugs=)"""
+    errors = []
+    
+    items = [value.strip() for value in (values or '').split(',') if value.strip()]
+    if not items:
+        errors.append("At least one value is required")
+        return [], errors
+    
+    if len(items) > max_items:
+        errors.append(f"Cannot request more than {max_items} items at once")
+        return [], errors
+    
+    if as_int:
+        invalid = [item for item in items if not item.isdigit()]
+        if invalid:
+            errors.append(f"Invalid ids: {', '.join(invalid)}")
+            return [], errors
+        items = [int(item) for item in items]
+    
+    return items, errors
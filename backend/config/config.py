@@ -40,6 +40,51 @@ class Config:
     # Pagination
     PRODUCTS_PER_PAGE = 20
     ORDERS_PER_PAGE = 10
+    PRODUCT_BATCH_MAX = 100  # ids/slugs per /api/products/batch request
+    
+    # In-memory catalog indexes (seconds before a full rebuild)
+    CATALOG_INDEX_TTL = int(os.environ.get('CATALOG_INDEX_TTL') or 300)
+    FACET_PRICE_BUCKET_SIZE = 50
+    
+    # Response cache for anonymous catalog reads: 'local' (per-worker LRU),
+    # 'redis' (shared, needs REDIS_URL and the redis package) or 'none'
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND') or 'local'
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL') or 60)
+    RESPONSE_CACHE_MAX_ENTRIES = 1024
+    REDIS_URL = os.environ.get('REDIS_URL')
+    
+    # Product listing filter engine: 'sql' (default) or 'bitmap' (in-memory catalog index)
+    CATALOG_FILTER_ENGINE = os.environ.get('CATALOG_FILTER_ENGINE') or 'sql'
+    
+    # Also search misspelled words as their closest catalog terms (trigram
+    # similarity within a bounded edit distance)
+    SEARCH_FUZZY_MATCHING = True
+    
+    # Popularity ranking - a sale's weight halves every POPULARITY_HALF_LIFE_DAYS.
+    # Changing either value requires `flask popularity refresh --full`
+    POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS') or 14)
+    POPULARITY_EPOCH = '2024-01-01'
+    
+    # Products kept per "frequently bought together" list
+    BOUGHT_TOGETHER_SIZE = 20
+    
+    # Personalized recommendations (`flask recommendations train`)
+    RECOMMENDATION_FACTORS = 32
+    RECOMMENDATION_SIZE = 20
+    
+    # Bulk catalog import - rows written per transaction and row errors kept per job.
+    # Imports run in a background thread unless CATALOG_IMPORT_ASYNC is off
+    CATALOG_IMPORT_BATCH_SIZE = int(os.environ.get('CATALOG_IMPORT_BATCH_SIZE') or 500)
+    CATALOG_IMPORT_MAX_ERRORS = 1000
+    CATALOG_IMPORT_ASYNC = True
+    
+    # Rows serialized per chunk of a streaming admin export
+    EXPORT_CHUNK_SIZE = 500
+    
+    # Checkout stock holds - seconds a payment intent holds the cart's stock,
+    # and expired holds released per transaction by `flask inventory sweep`
+    STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL') or 900)
+    STOCK_RESERVATION_SWEEP_BATCH = 500
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -56,6 +101,8 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    RESPONSE_CACHE_BACKEND = 'none'
+    CATALOG_IMPORT_ASYNC = False
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,57 @@
+"""add_product_search_documents
+
+Revision ID: 2a7c0cf7d66f
+Revises: 63fbb9d953f7
+Create Date: 2026-10-18 09:12:31.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a7c0cf7d66f'
+down_revision = '63fbb9d953f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_search_documents',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.Text(), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # Weighted tsvector kept in sync by PostgreSQL itself, searched through a GIN index
+        op.execute(
+            "ALTER TABLE product_search_documents ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+            ") STORED"
+        )
+        op.execute(
+            "CREATE INDEX ix_product_search_documents_search_vector "
+            "ON product_search_documents USING GIN (search_vector)"
+        )
+    elif bind.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS product_search_fts "
+            "USING fts5(title, body, tokenize='porter unicode61')"
+        )
+
+    # Populate documents for existing products with `flask search rebuild`
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS product_search_fts")
+
+    op.drop_table('product_search_documents')
@@ -0,0 +1,32 @@
+"""add_product_stock_shards
+
+Revision ID: 4c8e2f6a9d13
+Revises: d3f9a1b7c562
+Create Date: 2026-10-18 23:26:08.117460
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e2f6a9d13'
+down_revision = 'd3f9a1b7c562'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_stock_shards',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'shard')
+    )
+
+    # Products opt in with `flask inventory shard` or stock_shards on admin product updates
+
+
+def downgrade():
+    op.drop_table('product_stock_shards')
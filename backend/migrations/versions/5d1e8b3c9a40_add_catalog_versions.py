@@ -0,0 +1,34 @@
+"""add_catalog_versions
+
+Revision ID: 5d1e8b3c9a40
+Revises: 2a7c0cf7d66f
+Create Date: 2026-10-18 11:02:47.518390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1e8b3c9a40'
+down_revision = '2a7c0cf7d66f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_versions = op.create_table('catalog_versions',
+    sa.Column('scope', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('scope')
+    )
+
+    op.bulk_insert(catalog_versions, [
+        {'scope': 'catalog', 'version': 1, 'updated_at': datetime.utcnow()}
+    ])
+
+
+def downgrade():
+    op.drop_table('catalog_versions')
@@ -0,0 +1,50 @@
+"""store_popularity_in_log_space
+
+Revision ID: 5f2a8c1d7e60
+Revises: 4c8e2f6a9d13
+Create Date: 2026-10-18 21:12:40.518307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import math
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2a8c1d7e60'
+down_revision = '4c8e2f6a9d13'
+branch_labels = None
+depends_on = None
+
+product_popularity = sa.table('product_popularity',
+    sa.column('product_id', sa.Integer),
+    sa.column('score', sa.Float),
+    sa.column('units_sold', sa.Integer)
+)
+
+
+def _rescore(convert):
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(product_popularity.c.product_id, product_popularity.c.score)).fetchall()
+    if rows:
+        bind.execute(
+            product_popularity.update().where(product_popularity.c.product_id == sa.bindparam('key')),
+            [{'key': product_id, 'score': convert(score)} for product_id, score in rows]
+        )
+
+
+def upgrade():
+    # Scores become log(1 + sum of weights), which no longer overflows
+    _rescore(lambda score: math.log1p(max(score, 0.0)))
+
+    # Every product gets a row, so listings can sort on the bare score column
+    op.execute(
+        'INSERT INTO product_popularity (product_id, score, units_sold) '
+        'SELECT id, 0, 0 FROM products '
+        'WHERE id NOT IN (SELECT product_id FROM product_popularity)'
+    )
+
+
+def downgrade():
+    op.execute('DELETE FROM product_popularity WHERE units_sold = 0')
+    _rescore(lambda score: math.expm1(min(score, 700.0)))
@@ -0,0 +1,41 @@
+"""add_bought_together
+
+Revision ID: 7a4d2c9e8b16
+Revises: 0b7d4e9c3f21
+Create Date: 2026-10-18 19:32:08.517463
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4d2c9e8b16'
+down_revision = '0b7d4e9c3f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_co_purchases',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('related_product_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['related_product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'related_product_id')
+    )
+    op.create_table('product_bought_together',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('related_ids', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+
+    # Existing orders are processed by the first `flask recommendations refresh`
+
+
+def downgrade():
+    op.drop_table('product_bought_together')
+    op.drop_table('product_co_purchases')
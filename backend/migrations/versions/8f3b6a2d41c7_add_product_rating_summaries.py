@@ -0,0 +1,38 @@
+"""add_product_rating_summaries
+
+Revision ID: 8f3b6a2d41c7
+Revises: 5d1e8b3c9a40
+Create Date: 2026-10-18 12:20:05.731642
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3b6a2d41c7'
+down_revision = '5d1e8b3c9a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_rating_summaries',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_avg', sa.Float(), nullable=False),
+    sa.Column('rating_1', sa.Integer(), nullable=False),
+    sa.Column('rating_2', sa.Integer(), nullable=False),
+    sa.Column('rating_3', sa.Integer(), nullable=False),
+    sa.Column('rating_4', sa.Integer(), nullable=False),
+    sa.Column('rating_5', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+
+    # Existing reviews are summarized with `flask reviews backfill`
+
+
+def downgrade():
+    op.drop_table('product_rating_summaries')
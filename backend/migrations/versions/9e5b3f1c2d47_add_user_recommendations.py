@@ -0,0 +1,32 @@
+"""add_user_recommendations
+
+Revision ID: 9e5b3f1c2d47
+Revises: 7a4d2c9e8b16
+Create Date: 2026-10-18 20:14:41.208356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e5b3f1c2d47'
+down_revision = '7a4d2c9e8b16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_recommendations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_ids', sa.Text(), nullable=False),
+    sa.Column('generated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Filled by `flask recommendations train`
+
+
+def downgrade():
+    op.drop_table('user_recommendations')
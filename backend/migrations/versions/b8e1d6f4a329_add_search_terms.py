@@ -0,0 +1,45 @@
+"""add_search_terms
+
+Revision ID: b8e1d6f4a329
+Revises: 9e5b3f1c2d47
+Create Date: 2026-10-18 21:03:55.640192
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1d6f4a329'
+down_revision = '9e5b3f1c2d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('search_terms',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(length=100), nullable=False),
+    sa.Column('phrase', sa.String(length=200), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('term')
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # Trigram index for `term % :token` lookups, and a pattern index for
+        # the "is this a prefix of a known term" check (term LIKE 'avia%')
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_search_terms_term_trgm ON search_terms USING GIN (term gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_search_terms_term_pattern ON search_terms (term text_pattern_ops)")
+
+    # Populate terms for existing products with `flask search rebuild`
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_search_terms_term_pattern")
+        op.execute("DROP INDEX IF EXISTS ix_search_terms_term_trgm")
+
+    op.drop_table('search_terms')
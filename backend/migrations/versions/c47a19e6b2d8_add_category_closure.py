@@ -0,0 +1,61 @@
+"""add_category_closure
+
+Revision ID: c47a19e6b2d8
+Revises: 8f3b6a2d41c7
+Create Date: 2026-10-18 14:41:19.026553
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a19e6b2d8'
+down_revision = '8f3b6a2d41c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    category_closure = op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    with op.batch_alter_table('category_closure', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_category_closure_descendant_id'), ['descendant_id'], unique=False)
+
+    # Close over the existing parent_id links
+    bind = op.get_bind()
+    parents = dict(bind.execute(sa.text('SELECT id, parent_id FROM categories')).fetchall())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            rows.append({'ancestor_id': ancestor_id, 'descendant_id': category_id, 'depth': depth})
+            seen.add(ancestor_id)
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+    if rows:
+        op.bulk_insert(category_closure, rows)
+
+    catalog_versions = sa.table('catalog_versions',
+        sa.column('scope', sa.String),
+        sa.column('version', sa.Integer),
+        sa.column('updated_at', sa.DateTime)
+    )
+    op.bulk_insert(catalog_versions, [
+        {'scope': 'categories', 'version': 1, 'updated_at': datetime.utcnow()}
+    ])
+
+
+def downgrade():
+    op.execute("DELETE FROM catalog_versions WHERE scope = 'categories'")
+    with op.batch_alter_table('category_closure', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_category_closure_descendant_id'))
+
+    op.drop_table('category_closure')
@@ -0,0 +1,53 @@
+"""add_stock_reservations
+
+Revision ID: d3f9a1b7c562
+Revises: b8e1d6f4a329
+Create Date: 2026-10-18 22:41:17.503921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f9a1b7c562'
+down_revision = 'b8e1d6f4a329'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('product_variant_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['product_variant_id'], ['product_variants.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_reservations_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_reservations_user_id'), ['user_id'], unique=False)
+
+    op.create_table('reserved_stock',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('product_variant_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'product_variant_id')
+    )
+
+
+def downgrade():
+    op.drop_table('reserved_stock')
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_user_id'))
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_expires_at'))
+
+    op.drop_table('stock_reservations')
@@ -0,0 +1,46 @@
+"""add_product_popularity
+
+Revision ID: e2b95d07f13a
+Revises: c47a19e6b2d8
+Create Date: 2026-10-18 16:05:52.884120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b95d07f13a'
+down_revision = 'c47a19e6b2d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_popularity',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('units_sold', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    with op.batch_alter_table('product_popularity', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_popularity_score'), ['score'], unique=False)
+
+    op.create_table('job_watermarks',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # Scores for existing orders are computed by the first `flask popularity refresh`
+
+
+def downgrade():
+    op.drop_table('job_watermarks')
+    with op.batch_alter_table('product_popularity', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_popularity_score'))
+
+    op.drop_table('product_popularity')
@@ -0,0 +1,35 @@
+"""add_identifier_prefix_indexes
+
+Revision ID: f6c3a8e21b94
+Revises: e2b95d07f13a
+Create Date: 2026-10-18 17:32:40.117352
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c3a8e21b94'
+down_revision = 'e2b95d07f13a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Slug/SKU suffix allocation runs `column LIKE 'base-%'`. PostgreSQL can
+    # only answer that from a btree index built with text_pattern_ops unless
+    # the database uses the C collation; SQLite needs no extra index.
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE INDEX ix_products_slug_pattern ON products (slug text_pattern_ops)")
+        op.execute("CREATE INDEX ix_products_sku_pattern ON products (sku text_pattern_ops)")
+        op.execute("CREATE INDEX ix_brands_slug_pattern ON brands (slug text_pattern_ops)")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_brands_slug_pattern")
+        op.execute("DROP INDEX IF EXISTS ix_products_sku_pattern")
+        op.execute("DROP INDEX IF EXISTS ix_products_slug_pattern")
@@ -0,0 +1,106 @@
+import os
+import pytest
+from uuid import uuid4
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from config.config import TestingConfig
+from app import create_app, db as _db
+from app.models import Product, User, UserRole, Order, OrderItem, OrderStatus
+from app.services.popularity_service import ensure_popularity_rows
+from app.services.catalog_index import catalog_index
+from app.services.suggestion_service import suggestion_index
+from app.services.fuzzy_search import term_index
+from app.services.similarity_index import similarity_index
+from app.services.category_service import category_tree
+
+# Tests run against a throwaway file-backed SQLite database, so separate
+# connections (one per thread in the concurrency tests) share the same data.
+# Set TEST_DATABASE_URL to a dedicated, empty PostgreSQL database to run
+# them there; its tables are dropped afterwards.
+
+def create_test_app(database_uri):
+    """App bound to ``database_uri``"""
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        # Writers queue on SQLite's database lock instead of failing at once
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}} if database_uri.startswith('sqlite') else {}
+        JWT_SECRET_KEY = 'test-jwt-secret-key-of-sufficient-length'
+
+    return create_app(Config)
+
+@pytest.fixture
+def app(tmp_path):
+    # The in-memory catalog indexes are per process; start every test empty
+    for index in (catalog_index, suggestion_index, term_index, similarity_index, category_tree):
+        index.reset()
+    app = create_test_app(os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{tmp_path / 'test.db'}")
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+@pytest.fixture
+def db(app):
+    return _db
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_product(db):
+    def make_product(**fields):
+        token = uuid4().hex[:12]
+        values = {
+            'name': f'Product {token}',
+            'description': 'Test product',
+            'sku': f'sku-{token}',
+            'slug': f'product-{token}',
+            'price': 100,
+            'stock_quantity': 10,
+            'track_inventory': True,
+            'is_active': True
+        }
+        values.update(fields)
+        product = Product(**values)
+        db.session.add(product)
+        db.session.flush()
+        # Every product has a popularity row, as when created through the API
+        ensure_popularity_rows([product.id])
+        db.session.commit()
+        return product
+    return make_product
+
+@pytest.fixture
+def make_user(db):
+    def make_user(role=UserRole.CUSTOMER):
+        token = uuid4().hex[:12]
+        user = User(email=f'{token}@example.com', first_name='Test', last_name='User', role=role)
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+@pytest.fixture
+def make_order(db):
+    def make_order(user, *items, status=OrderStatus.DELIVERED, created_at=None):
+        """Order of ``items`` (products, or (product, quantity) pairs), an hour old by default"""
+        order = Order(user_id=user.id, status=status, created_at=created_at or datetime.utcnow() - timedelta(hours=1))
+        for item in items:
+            product, quantity = item if isinstance(item, tuple) else (item, 1)
+            order.items.append(OrderItem(
+                product_id=product.id, product_name=product.name, product_sku=product.sku,
+                quantity=quantity, unit_price=product.price, total_price=product.price * quantity
+            ))
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return make_order
+
+@pytest.fixture
+def auth_header(app):
+    def auth_header(user):
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    return auth_header
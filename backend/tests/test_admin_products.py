@@ -0,0 +1,45 @@
+import pytest
+from app.models import Product, UserRole
+from app.routes import admin
+from app.utils.identifiers import next_free_identifier
+
+@pytest.fixture
+def create_product(client, make_user, auth_header):
+    headers = auth_header(make_user(role=UserRole.ADMIN))
+
+    def create_product(sku, **fields):
+        data = {'name': 'Aviator', 'description': 'Metal frame', 'price': 120, 'sku': sku}
+        data.update(fields)
+        return client.post('/api/admin/products', json=data, headers=headers)
+    return create_product
+
+def test_products_with_the_same_name_get_numbered_slugs(create_product):
+    first, second = create_product('AV-1'), create_product('AV-2')
+
+    assert (first.status_code, second.status_code) == (201, 201)
+    assert first.get_json()['product']['slug'] == 'aviator'
+    assert second.get_json()['product']['slug'] == 'aviator-1'
+
+def test_slug_taken_by_a_concurrent_create_is_picked_again(db, create_product, make_product, monkeypatch):
+    make_product(slug='aviator')
+    calls = []
+
+    def stale_next_free_identifier(column, base, reserved=()):
+        # The first pick misses the product another request just inserted
+        calls.append(base)
+        return base if len(calls) == 1 else next_free_identifier(column, base, reserved)
+
+    monkeypatch.setattr(admin, 'next_free_identifier', stale_next_free_identifier)
+    response = create_product('AV-1')
+
+    assert response.status_code == 201
+    assert response.get_json()['product']['slug'] == 'aviator-1'
+    assert len(calls) == 2
+    assert db.session.query(Product).filter_by(slug='aviator').count() == 1
+
+def test_explicit_slug_that_is_taken_is_rejected(create_product, make_product):
+    make_product(slug='aviator')
+
+    response = create_product('AV-1', slug='aviator')
+
+    assert response.status_code == 409
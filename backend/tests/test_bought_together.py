@@ -0,0 +1,46 @@
+from app.models import OrderStatus
+from app.services.recommendation_service import refresh_bought_together, get_bought_together_ids
+
+def bought_together(client, product_id, **query):
+    response = client.get(f'/api/products/{product_id}/bought-together', query_string=query)
+    assert response.status_code == 200
+    return [product['id'] for product in response.get_json()['products']]
+
+def test_products_ordered_together_most_often_come_first(db, client, make_product, make_user, make_order):
+    frame, case, cloth, strap = (make_product() for _ in range(4))
+    user = make_user()
+    make_order(user, frame, case, cloth)
+    make_order(user, frame, case)
+    make_order(user, frame, strap, status=OrderStatus.CANCELLED)
+
+    assert refresh_bought_together() == 3
+
+    assert bought_together(client, frame.id) == [case.id, cloth.id]
+    assert bought_together(client, frame.id, limit=1) == [case.id]
+    # Ties go to the lower id
+    assert bought_together(client, cloth.id) == [frame.id, case.id]
+    assert bought_together(client, strap.id) == []
+
+def test_refresh_only_reads_new_orders(db, client, make_product, make_user, make_order):
+    frame, case, cloth = (make_product() for _ in range(3))
+    user = make_user()
+    make_order(user, frame, case)
+    refresh_bought_together()
+
+    make_order(user, frame, cloth)
+    make_order(user, frame, cloth)
+    assert refresh_bought_together() == 2
+
+    assert get_bought_together_ids(frame.id) == [cloth.id, case.id]
+    assert refresh_bought_together() == 0
+
+def test_inactive_products_are_left_out(db, client, make_product, make_user, make_order):
+    frame, case, cloth = (make_product() for _ in range(3))
+    make_order(make_user(), frame, case, cloth)
+    refresh_bought_together()
+
+    case.is_active = False
+    db.session.commit()
+
+    assert bought_together(client, frame.id) == [cloth.id]
+    assert client.get(f'/api/products/{case.id}/bought-together').status_code == 404
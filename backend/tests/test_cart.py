@@ -0,0 +1,95 @@
+from app.models import CartItem, ProductVariant
+from app.services.cart_service import get_cart_view
+from app.services.inventory_service import check_availability
+from app.services.reservation_service import reserve_stock
+from app.services.stock_shards import rebalance_stock_shards
+from tests.test_product_serializer import count_queries
+
+def add_line(db, user, product, quantity, variant=None):
+    db.session.add(CartItem(
+        user_id=user.id, product_id=product.id,
+        product_variant_id=variant.id if variant else None, quantity=quantity
+    ))
+    db.session.commit()
+
+def cart_stock(user):
+    return [
+        (line['product']['stock_quantity'], line['product']['in_stock'])
+        for line in get_cart_view(user.id)['cart_items']
+    ]
+
+def test_cart_shows_stock_less_other_users_holds(db, make_product, make_user):
+    product = make_product(stock_quantity=5)
+    shopper, other = make_user(), make_user()
+    add_line(db, shopper, product, 2)
+    reserve_stock(other.id, [(product.id, None, 4)])
+    db.session.commit()
+
+    assert cart_stock(shopper) == [(1, False)]
+    assert check_availability([(product.id, None, 2)], shopper.id)[0]['available_stock'] == 1
+
+def test_cart_counts_the_users_own_holds_as_available(db, make_product, make_user):
+    product = make_product(stock_quantity=5)
+    shopper = make_user()
+    add_line(db, shopper, product, 4)
+    reserve_stock(shopper.id, [(product.id, None, 4)])
+    db.session.commit()
+
+    assert cart_stock(shopper) == [(5, True)]
+    assert check_availability([(product.id, None, 4)], shopper.id) == []
+
+def test_cart_reads_sharded_stock_and_caps_variants(db, make_product, make_user):
+    sharded, limited = make_product(stock_quantity=6), make_product(stock_quantity=2)
+    rebalance_stock_shards(sharded.id, shards=3)
+    variant = ProductVariant(product_id=limited.id, name='Large', sku=f'{limited.sku}-L', stock_quantity=5)
+    db.session.add(variant)
+    db.session.commit()
+    shopper, other = make_user(), make_user()
+    add_line(db, shopper, sharded, 1)
+    add_line(db, shopper, limited, 3, variant)
+    reserve_stock(other.id, [(sharded.id, None, 2)])
+    db.session.commit()
+
+    assert cart_stock(shopper) == [(4, True), (2, False)]
+
+def test_cart_is_read_with_one_query(db, make_product, make_user):
+    shopper, other = make_user(), make_user()
+    for stock in (3, 6, 9):
+        product = make_product(stock_quantity=stock)
+        add_line(db, shopper, product, 1)
+        reserve_stock(other.id, [(product.id, None, 1)])
+    rebalance_stock_shards(product.id, shards=2)
+    db.session.commit()
+    shopper_id = shopper.id
+
+    with count_queries(db) as statements:
+        view = get_cart_view(shopper_id)
+
+    assert len(statements) == 1
+    assert [line['product']['stock_quantity'] for line in view['cart_items']] == [2, 5, 8]
+
+def test_availability_is_checked_in_bulk(db, make_product, make_user):
+    shopper, other = make_user(), make_user()
+    lines = []
+    for stock in (2, 4, 6, 8):
+        product = make_product(stock_quantity=stock)
+        variant = ProductVariant(product_id=product.id, name='Large', sku=f'{product.sku}-L', stock_quantity=stock)
+        db.session.add(variant)
+        db.session.commit()
+        reserve_stock(other.id, [(product.id, None, 1)])
+        lines += [(product.id, None, 1), (product.id, variant.id, 2)]
+    rebalance_stock_shards(product.id, shards=2)
+    hidden = make_product(is_active=False)
+    db.session.commit()
+    shopper_id, hidden_id = shopper.id, hidden.id
+
+    with count_queries(db) as single:
+        check_availability(lines[:1], shopper_id)
+    with count_queries(db) as statements:
+        shortfalls = check_availability(lines + [(hidden_id, None, 1), (999, None, 1)], shopper_id)
+
+    assert len(statements) == len(single) <= 2
+    assert [(shortfall['product_id'], shortfall['reason']) for shortfall in shortfalls] == [
+        (lines[0][0], 'insufficient_stock'), (lines[1][0], 'insufficient_stock'),
+        (hidden_id, 'unavailable'), (999, 'unavailable')
+    ]
@@ -0,0 +1,77 @@
+import io
+import pytest
+from app.models import Product, UserRole
+
+@pytest.fixture
+def import_csv(app, client, make_user, auth_header, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    headers = auth_header(make_user(role=UserRole.ADMIN))
+
+    def import_csv(text, batch_size=2):
+        response = client.post(
+            '/api/admin/products/import',
+            data={'file': (io.BytesIO(text.encode('utf-8')), 'products.csv'), 'batch_size': str(batch_size)},
+            headers=headers,
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 202
+        job_id = response.get_json()['job']['id']
+
+        progress = client.get(f'/api/admin/products/import/{job_id}', headers=headers)
+        assert progress.status_code == 200
+        return progress.get_json()['job']
+    return import_csv
+
+def by_sku(db, sku):
+    return db.session.query(Product).filter_by(sku=sku).one_or_none()
+
+def test_import_creates_products_and_reports_bad_rows(db, import_csv):
+    job = import_csv(
+        'sku,name,description,price,stock_quantity\n'
+        'AV-1,Aviator,Metal frame,120,5\n'
+        'AV-2,Wayfarer,,90,5\n'
+        'AV-3,Round,Acetate,-4,5\n'
+    )
+
+    assert job['status'] == 'completed'
+    assert (job['rows_processed'], job['rows_imported'], job['rows_failed']) == (3, 1, 2)
+    errors = {error['row']: error for error in job['errors']}
+    assert errors[2]['sku'] == 'AV-2' and errors[2]['errors'] == ['description is required']
+    assert errors[3]['errors'] == ['Price must be greater than 0']
+    assert by_sku(db, 'AV-1').stock_quantity == 5
+    assert by_sku(db, 'AV-2') is None
+
+def test_rows_of_existing_skus_only_need_the_columns_they_change(db, import_csv, make_product):
+    make_product(sku='AV-1', name='Aviator', price=120, stock_quantity=5)
+
+    job = import_csv('sku,price\nAV-1,99\n')
+
+    assert (job['rows_imported'], job['rows_failed']) == (1, 0)
+    db.session.expire_all()
+    product = by_sku(db, 'AV-1')
+    assert (product.name, float(product.price), product.stock_quantity) == ('Aviator', 99.0, 5)
+
+def test_repeated_sku_in_a_batch_is_imported_once(db, import_csv):
+    job = import_csv(
+        'sku,name,description,price\n'
+        'AV-1,Aviator,Metal frame,120\n'
+        'AV-1,Aviator Classic,Metal frame,130\n'
+    )
+
+    assert (job['rows_processed'], job['rows_imported'], job['rows_failed']) == (2, 1, 1)
+    assert job['errors'] == [{'row': 1, 'sku': 'AV-1', 'errors': ['Superseded by row 2 with the same SKU']}]
+    assert by_sku(db, 'AV-1').name == 'Aviator Classic'
+
+def test_new_products_get_free_slugs(db, import_csv, make_product):
+    make_product(slug='aviator')
+
+    job = import_csv(
+        'sku,slug,name,description,price\n'
+        'AV-1,aviator,Aviator,Metal frame,120\n'
+        'AV-2,aviator,Aviator,Acetate frame,120\n'
+        'AV-3,aviator,Aviator,Titanium frame,120\n',
+        batch_size=3
+    )
+
+    assert (job['rows_imported'], job['rows_failed']) == (3, 0)
+    assert [by_sku(db, sku).slug for sku in ('AV-1', 'AV-2', 'AV-3')] == ['aviator-1', 'aviator-2', 'aviator-3']
@@ -0,0 +1,100 @@
+import pytest
+from app import db as _db
+from app.models import Category, Product
+from app.models.catalog import CatalogVersion
+from app.services.catalog_version import get_catalog_version
+from app.services.catalog_index import CatalogIndex, iter_ids, bitmap_from_ids
+from app.services.popularity_service import ensure_popularity_rows
+from conftest import create_test_app
+
+def test_bitmaps_round_trip_ids():
+    ids = [0, 1, 7, 8, 63, 64, 1000, 4097]
+
+    bitmap = bitmap_from_ids(reversed(ids))
+
+    assert bitmap == sum(1 << product_id for product_id in ids)
+    assert list(iter_ids(bitmap)) == ids
+    assert bitmap_from_ids([]) == 0
+    assert list(iter_ids(0)) == []
+
+@pytest.fixture
+def category_tree(db):
+    """Frames > Sunglasses > Aviators"""
+    frames = Category(name='Frames', slug='frames')
+    db.session.add(frames)
+    db.session.flush()
+    sunglasses = Category(name='Sunglasses', slug='sunglasses', parent_id=frames.id)
+    db.session.add(sunglasses)
+    db.session.flush()
+    aviators = Category(name='Aviators', slug='aviators', parent_id=sunglasses.id)
+    db.session.add(aviators)
+    db.session.commit()
+    return frames, sunglasses, aviators
+
+def category_counts(facets):
+    return {item['label']: item['count'] for item in facets['category']}
+
+def test_category_facets_count_subcategory_products(db, make_product, category_tree):
+    frames, sunglasses, aviators = category_tree
+    for category in (frames, sunglasses, aviators, aviators):
+        product = make_product(price=120)
+        product.categories.append(category)
+        db.session.commit()
+
+    index = CatalogIndex()
+    index.rebuild()
+
+    assert category_counts(index.facet_counts({})) == {'Frames': 4, 'Sunglasses': 3, 'Aviators': 2}
+    assert index.match({'category_id': sunglasses.id}).bit_count() == 3
+    # The count shown for a category is what filtering by it returns
+    facets = index.facet_counts({'category_id': sunglasses.id})
+    assert facets['total'] == 3
+    assert category_counts(facets)['Sunglasses'] == 3
+
+def test_price_range_filters_edge_buckets_by_price(db, make_product):
+    cheap, mid, dear = (make_product(price=price) for price in (20, 60, 90))
+
+    index = CatalogIndex()
+    index.rebuild()
+
+    assert list(iter_ids(index.match({'min_price': 55, 'max_price': 90}))) == [mid.id, dear.id]
+    assert list(iter_ids(index.match({'max_price': 59}))) == [cheap.id]
+
+def listed_names(client):
+    body = client.get('/api/products', query_string={'sort_by': 'name', 'sort_order': 'asc'}).get_json()
+    return [product['name'] for product in body['products']], body['pagination']['total']
+
+def test_index_follows_the_app_to_another_database(app, client, make_product, tmp_path):
+    app.config['CATALOG_FILTER_ENGINE'] = 'bitmap'
+    make_product(name='Alpha')
+    assert listed_names(client) == (['Alpha'], 1)
+    version, _ = get_catalog_version()
+
+    # Built for the first app; the second one must not be served from it,
+    # even at the same catalog version
+    other = create_test_app(f"sqlite:///{tmp_path / 'other.db'}")
+    other.config['CATALOG_FILTER_ENGINE'] = 'bitmap'
+    with other.app_context():
+        _db.create_all()
+        products = [Product(name=name, sku=name.lower(), slug=name.lower(), price=100) for name in ('Beta', 'Gamma')]
+        _db.session.add_all(products)
+        _db.session.flush()
+        ensure_popularity_rows([product.id for product in products])
+        _db.session.query(CatalogVersion).update({'version': version})
+        _db.session.commit()
+
+        assert listed_names(other.test_client()) == (['Beta', 'Gamma'], 2)
+        _db.session.remove()
+        _db.drop_all()
+
+def test_writes_without_catalog_events_reach_the_index(app, client, make_product):
+    app.config['CATALOG_FILTER_ENGINE'] = 'bitmap'
+    product = make_product(name='Alpha')
+    assert listed_names(client) == (['Alpha'], 1)
+
+    # As from a shell or seed script - no product_changed
+    product.name = 'Renamed'
+    product.is_active = False
+    _db.session.commit()
+
+    assert listed_names(client) == ([], 0)
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import select
+from app.models import Category
+from app.models.catalog import CategoryClosure
+
+@pytest.fixture
+def tree(db, make_product):
+    """Frames > Sunglasses > Aviators, with one product in each category"""
+    categories = {}
+    parent_id = None
+    for name in ('Frames', 'Sunglasses', 'Aviators'):
+        category = Category(name=name, slug=name.lower(), parent_id=parent_id)
+        db.session.add(category)
+        db.session.flush()
+        categories[name] = parent_id = category.id
+    db.session.commit()
+
+    for name, category_id in categories.items():
+        product = make_product(name=f'{name} product')
+        product.categories.append(db.session.get(Category, category_id))
+        db.session.commit()
+    return categories
+
+def listed(client, category_id):
+    response = client.get('/api/products', query_string={'category_id': category_id, 'sort_by': 'name', 'sort_order': 'asc'})
+    assert response.status_code == 200
+    return [product['name'] for product in response.get_json()['products']]
+
+def ancestors(db, category_id):
+    return dict(db.session.execute(
+        select(CategoryClosure.ancestor_id, CategoryClosure.depth).where(CategoryClosure.descendant_id == category_id)
+    ).all())
+
+@pytest.mark.parametrize('engine', ['sql', 'bitmap'])
+def test_category_filter_includes_subcategories(app, client, tree, engine):
+    app.config['CATALOG_FILTER_ENGINE'] = engine
+
+    assert listed(client, tree['Frames']) == ['Aviators product', 'Frames product', 'Sunglasses product']
+    assert listed(client, tree['Sunglasses']) == ['Aviators product', 'Sunglasses product']
+    assert listed(client, tree['Aviators']) == ['Aviators product']
+
+@pytest.mark.parametrize('engine', ['sql', 'bitmap'])
+def test_moving_a_category_moves_its_products_in_filters(app, db, client, tree, engine):
+    app.config['CATALOG_FILTER_ENGINE'] = engine
+    assert listed(client, tree['Sunglasses']) == ['Aviators product', 'Sunglasses product']
+
+    db.session.get(Category, tree['Aviators']).parent_id = tree['Frames']
+    db.session.commit()
+
+    assert ancestors(db, tree['Aviators']) == {tree['Aviators']: 0, tree['Frames']: 1}
+    assert listed(client, tree['Sunglasses']) == ['Sunglasses product']
+    assert listed(client, tree['Frames']) == ['Aviators product', 'Frames product', 'Sunglasses product']
+
+def test_moving_a_subtree_relinks_its_descendants(db, tree):
+    wayfarers = Category(name='Wayfarers', slug='wayfarers', parent_id=None)
+    db.session.add(wayfarers)
+    db.session.commit()
+
+    db.session.get(Category, tree['Sunglasses']).parent_id = wayfarers.id
+    db.session.commit()
+
+    assert ancestors(db, tree['Aviators']) == {tree['Aviators']: 0, tree['Sunglasses']: 1, wayfarers.id: 2}
+    assert tree['Frames'] not in ancestors(db, tree['Sunglasses'])
+
+def test_category_cannot_move_under_its_subcategory(db, tree):
+    db.session.get(Category, tree['Frames']).parent_id = tree['Aviators']
+
+    with pytest.raises(ValueError):
+        db.session.commit()
+    db.session.rollback()
+
+    assert ancestors(db, tree['Frames']) == {tree['Frames']: 0}
@@ -0,0 +1,59 @@
+from app.services.catalog_events import product_changed, stock_changed
+from app.services.inventory_service import decrement_stock
+
+def revalidate(client, path, etag):
+    return client.get(path, headers={'If-None-Match': etag})
+
+def sell(db, product_id, quantity):
+    stock_changed(*decrement_stock([(product_id, None, quantity)]))
+    db.session.commit()
+
+def test_matching_etag_answers_304_without_a_body(client, make_product):
+    product = make_product()
+    path = f'/api/products/{product.id}'
+
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers['ETag'].strip('"')
+
+    revalidated = revalidate(client, path, etag)
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+    assert revalidated.headers['ETag'].strip('"') == etag
+
+def test_etag_is_stable_until_something_is_written(client, make_product):
+    product = make_product()
+    first = client.get(f'/api/products/{product.id}').headers['ETag']
+    assert client.get(f'/api/products/{product.id}').headers['ETag'] == first
+    assert client.get('/api/products').headers['ETag'] == client.get('/api/products').headers['ETag']
+
+def test_stock_move_invalidates_the_product_and_listings_only(client, db, make_product):
+    sold, other = make_product(stock_quantity=5), make_product(stock_quantity=5)
+    sold_path, other_path = f'/api/products/{sold.id}', f'/api/products/{other.id}'
+    before = {path: client.get(path).headers['ETag'].strip('"')
+              for path in (sold_path, other_path, '/api/products', '/api/products/brands')}
+
+    sell(db, sold.id, 2)
+
+    response = revalidate(client, sold_path, before[sold_path])
+    assert response.status_code == 200
+    assert response.get_json()['product']['stock_quantity'] == 3
+    listing = revalidate(client, '/api/products', before['/api/products'])
+    assert listing.status_code == 200
+    assert {item['id']: item['stock_quantity'] for item in listing.get_json()['products']}[sold.id] == 3
+
+    assert revalidate(client, other_path, before[other_path]).status_code == 304
+    assert revalidate(client, '/api/products/brands', before['/api/products/brands']).status_code == 304
+
+def test_catalog_write_invalidates_every_etag(client, db, make_product):
+    product = make_product(name='Aviator')
+    path = f'/api/products/{product.id}'
+    etag = client.get(path).headers['ETag'].strip('"')
+
+    product.name = 'Wayfarer'
+    db.session.commit()
+    product_changed(product.id)
+
+    response = revalidate(client, path, etag)
+    assert response.status_code == 200
+    assert response.get_json()['product']['name'] == 'Wayfarer'
@@ -0,0 +1,17 @@
+import csv
+import io
+from app.models import UserRole
+from app.services.catalog_import import _split_list
+
+def test_exported_tags_read_back_through_the_import(db, client, make_product, make_user, auth_header):
+    product = make_product()
+    product.set_tags(['aviator', 'polarized'])
+    db.session.commit()
+    headers = auth_header(make_user(role=UserRole.ADMIN))
+
+    response = client.get('/api/admin/export/products', query_string={'fields': 'sku,tags'}, headers=headers)
+
+    assert response.status_code == 200
+    [row] = csv.DictReader(io.StringIO(response.get_data(as_text=True)))
+    assert row['tags'] == 'aviator|polarized'
+    assert _split_list(row['tags']) == ['aviator', 'polarized']
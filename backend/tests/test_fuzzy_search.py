@@ -0,0 +1,60 @@
+import pytest
+from app.models import Brand
+from app.services.fuzzy_search import correct_token, bounded_levenshtein
+from app.services.search_service import index_product
+
+@pytest.fixture
+def indexed_product(db, make_product):
+    def indexed_product(name, brand=None):
+        brand_id = None
+        if brand:
+            brand = Brand(name=brand, slug=brand.lower())
+            db.session.add(brand)
+            db.session.flush()
+            brand_id = brand.id
+        product = make_product(name=name, brand_id=brand_id)
+        index_product(product)
+        db.session.commit()
+        return product
+    return indexed_product
+
+def search(client, query):
+    response = client.get('/api/products', query_string={'search': query, 'sort_by': 'relevance'})
+    assert response.status_code == 200
+    return [product['name'] for product in response.get_json()['products']]
+
+def test_misspelled_word_finds_the_product(client, indexed_product):
+    indexed_product('Aviator Classic')
+    indexed_product('Round Classic')
+
+    assert search(client, 'aviater') == ['Aviator Classic']
+
+def test_joined_brand_name_finds_the_brand(client, indexed_product):
+    indexed_product('Wayfarer', brand='Ray-Ban')
+    indexed_product('Clubmaster')
+
+    assert correct_token('rayban', 'sqlite') == [('ray ban', 1.0)]
+    assert search(client, 'rayban') == ['Wayfarer']
+
+def test_corrections_are_ordered_by_similarity(indexed_product):
+    indexed_product('Aviators')
+    indexed_product('Aviator')
+
+    corrections = correct_token('aviater', 'sqlite')
+
+    assert [phrase for phrase, _ in corrections] == ['aviator', 'aviators']
+    assert corrections[0][1] > corrections[1][1]
+
+def test_edit_distance_bound_rejects_trigram_lookalikes(indexed_product):
+    indexed_product('Aviator')
+
+    # Shares most trigrams with "aviator" but is three edits away
+    assert correct_token('aviatorsxx', 'sqlite') == []
+    assert bounded_levenshtein('aviatorsxx', 'aviator', 2) == 3
+    assert correct_token('aviatorsx', 'sqlite') == [('aviator', pytest.approx(7 / 11))]
+
+def test_known_words_and_prefixes_are_left_alone(indexed_product):
+    indexed_product('Aviator')
+
+    assert correct_token('aviator', 'sqlite') == []
+    assert correct_token('avia', 'sqlite') == []
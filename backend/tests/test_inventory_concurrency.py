@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+import pytest
+import stripe
+from types import SimpleNamespace
+from sqlalchemy import func
+from app.models import CartItem, Order, Product
+from app.models.catalog import ProductStockShard
+from app.services.inventory_service import decrement_stock, InsufficientStockError
+from app.services.stock_shards import rebalance_stock_shards
+
+WORKERS = 20
+STOCK = 5
+
+def race(app, workers, work):
+    """Run ``work()`` in ``workers`` threads, each in its own app context, released together"""
+    barrier = threading.Barrier(workers)
+    outcomes = []
+
+    def worker():
+        with app.app_context():
+            barrier.wait()
+            outcomes.append(work())
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def checkout(db, product_id):
+    try:
+        decrement_stock([(product_id, None, 1)])
+        db.session.commit()
+        return 'sold'
+    except InsufficientStockError:
+        db.session.rollback()
+        return 'refused'
+
+def stock_of(db, product_id):
+    db.session.expire_all()
+    return db.session.query(Product.stock_quantity).filter(Product.id == product_id).scalar()
+
+def test_decrement_stock_sells_the_last_units_once(app, db, make_product):
+    product_id = make_product(stock_quantity=STOCK).id
+
+    outcomes = race(app, WORKERS, lambda: checkout(db, product_id))
+
+    assert outcomes.count('sold') == STOCK
+    assert outcomes.count('refused') == WORKERS - STOCK
+    assert stock_of(db, product_id) == 0
+
+@pytest.fixture
+def stripe_intents(monkeypatch):
+    """Authorized payment intents by id; records captures and cancellations"""
+    calls = {'captured': [], 'cancelled': []}
+    lock = threading.Lock()
+
+    def record(kind, intent_id):
+        with lock:
+            calls[kind].append(intent_id)
+
+    monkeypatch.setattr(stripe.PaymentIntent, 'retrieve', lambda intent_id: SimpleNamespace(
+        id=intent_id, status='requires_capture'
+    ))
+    monkeypatch.setattr(stripe.PaymentIntent, 'capture', lambda intent_id: record('captured', intent_id))
+    monkeypatch.setattr(stripe.PaymentIntent, 'cancel', lambda intent_id: record('cancelled', intent_id))
+    return calls
+
+def test_confirm_payment_sells_the_last_units_once(app, db, make_product, make_user, auth_header, stripe_intents):
+    product_id = make_product(stock_quantity=STOCK).id
+    headers = []
+    for _ in range(WORKERS):
+        user = make_user()
+        db.session.add(CartItem(user_id=user.id, product_id=product_id, quantity=1))
+        headers.append(auth_header(user))
+    db.session.commit()
+
+    pending = iter(enumerate(headers))
+    lock = threading.Lock()
+
+    def confirm():
+        with lock:
+            index, header = next(pending)
+        response = app.test_client().post('/api/payments/confirm-payment', headers=header, json={
+            'payment_intent_id': f'pi_{index}',
+            'billing_address': {'line1': 'Billing'},
+            'shipping_address': {'line1': 'Shipping'}
+        })
+        return response.status_code
+
+    statuses = race(app, WORKERS, confirm)
+
+    assert statuses.count(201) == STOCK
+    assert statuses.count(409) == WORKERS - STOCK
+    assert stock_of(db, product_id) == 0
+    assert db.session.query(Order).count() == STOCK
+    # Only the orders created were charged; every other authorization was voided
+    assert len(stripe_intents['captured']) == STOCK
+    assert len(stripe_intents['cancelled']) == WORKERS - STOCK
+
+def sharded_stock_total(db, product_id):
+    db.session.expire_all()
+    return db.session.query(func.sum(ProductStockShard.quantity)).filter(
+        ProductStockShard.product_id == product_id
+    ).scalar()
+
+# SQLite cannot take a write lock inside a transaction that has already
+# read, so shard picking only runs concurrently on PostgreSQL
+postgresql_only = pytest.mark.skipif(
+    not os.environ.get('TEST_DATABASE_URL', '').startswith('postgresql'),
+    reason='needs TEST_DATABASE_URL pointing at PostgreSQL'
+)
+
+@postgresql_only
+def test_sharded_stock_sells_the_last_units_once(app, db, make_product):
+    product_id = make_product(stock_quantity=STOCK).id
+    rebalance_stock_shards(product_id, shards=4)
+    db.session.commit()
+
+    outcomes = race(app, WORKERS, lambda: checkout(db, product_id))
+
+    assert outcomes.count('sold') == STOCK
+    assert sharded_stock_total(db, product_id) == 0
+
+@postgresql_only
+@pytest.mark.parametrize('shards', [0, 8])
+def test_checkout_throughput(app, db, make_product, shards):
+    """Sells a hot product in one stock row or over shards; run with -s for the rate"""
+    checkouts = 1000
+    workers = 16
+    product_id = make_product(stock_quantity=checkouts).id
+    rebalance_stock_shards(product_id, shards=shards)
+    db.session.commit()
+
+    remaining = iter(range(checkouts))
+    lock = threading.Lock()
+
+    def checkout_loop():
+        sold = 0
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return sold
+            if checkout(db, product_id) == 'sold':
+                sold += 1
+
+    started_at = time.perf_counter()
+    sold = sum(race(app, workers, checkout_loop))
+    seconds = time.perf_counter() - started_at
+
+    print(f'{shards} shards: {sold} checkouts in {seconds:.2f}s ({sold / seconds:.0f}/s)')
+    assert sold == checkouts
+    assert (sharded_stock_total(db, product_id) if shards else stock_of(db, product_id)) == 0
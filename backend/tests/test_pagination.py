@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime, timedelta
+from app.models import Product
+
+def walk(client, **params):
+    """Product ids of every page of a listing, following next_cursor"""
+    ids = []
+    cursor = None
+    while True:
+        query = dict(params, per_page=2)
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/api/products', query_string=query)
+        assert response.status_code == 200
+        body = response.get_json()
+        ids.extend(product['id'] for product in body['products'])
+        cursor = body['pagination']['next_cursor']
+        if not cursor:
+            return ids
+
+@pytest.fixture
+def dated_products(db, make_product):
+    """Seven products, three of them never updated (updated_at NULL)"""
+    start = datetime(2026, 1, 1)
+    products = [make_product() for _ in range(7)]
+    for index, product in enumerate(products):
+        # Written with a query update so the column's onupdate cannot fill the NULLs in
+        db.session.query(Product).filter(Product.id == product.id).update(
+            {'updated_at': start + timedelta(days=index % 4) if index % 2 == 0 else None},
+            synchronize_session=False
+        )
+    db.session.commit()
+    return products
+
+@pytest.mark.parametrize('engine', ['sql', 'bitmap'])
+@pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+def test_cursor_pages_cover_null_sort_keys(app, client, dated_products, sort_order, engine):
+    app.config['CATALOG_FILTER_ENGINE'] = engine
+    dated = sorted((p for p in dated_products if p.updated_at), key=lambda p: (p.updated_at, p.id))
+    undated = sorted(p.id for p in dated_products if p.updated_at is None)
+    # NULL keys rank above every value in both directions
+    expected = [p.id for p in dated] + undated
+    if sort_order == 'desc':
+        expected.reverse()
+
+    ids = walk(client, sort_by='updated_at', sort_order=sort_order)
+
+    assert ids == expected
+
+def test_cursors_are_tied_to_the_engine_that_issued_them(app, client, dated_products):
+    app.config['CATALOG_FILTER_ENGINE'] = 'sql'
+    cursor = client.get('/api/products', query_string={'per_page': 2}).get_json()['pagination']['next_cursor']
+
+    app.config['CATALOG_FILTER_ENGINE'] = 'bitmap'
+    response = client.get('/api/products', query_string={'per_page': 2, 'cursor': cursor})
+
+    assert response.status_code == 400
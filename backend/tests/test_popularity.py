@@ -0,0 +1,85 @@
+import math
+from datetime import datetime, timedelta
+from app.models import OrderStatus, UserRole
+from app.models.catalog import ProductPopularity
+from app.services.popularity_service import (
+    sale_weight, add_log_weight, subtract_log_weight, current_score, refresh_popularity
+)
+
+def test_scores_stay_finite_with_a_short_half_life(app):
+    app.config['POPULARITY_HALF_LIFE_DAYS'] = 1
+    sold_at = datetime(2024, 1, 1) + timedelta(days=3650)
+
+    score = 0.0
+    for _ in range(1000):
+        score = add_log_weight(score, sale_weight(2, sold_at))
+
+    assert math.isfinite(score)
+    assert math.isclose(current_score(score, now=sold_at), 2000, rel_tol=1e-9)
+    assert math.isclose(current_score(score, now=sold_at + timedelta(days=1)), 1000, rel_tol=1e-9)
+
+def test_newer_sales_outrank_older_ones(app):
+    app.config['POPULARITY_HALF_LIFE_DAYS'] = 14
+    now = datetime(2026, 6, 1)
+
+    recent = add_log_weight(0.0, sale_weight(1, now))
+    # Three units four weeks earlier decay to 0.75 of a unit
+    older = add_log_weight(0.0, sale_weight(3, now - timedelta(days=28)))
+
+    assert recent > older > 0.0
+    assert math.isclose(current_score(older, now=now), 0.75, rel_tol=1e-9)
+
+def test_subtracting_a_weight_undoes_adding_it(app):
+    sold_at = datetime(2026, 6, 1)
+    kept, taken = sale_weight(3, sold_at), sale_weight(2, sold_at - timedelta(days=5))
+    score = add_log_weight(add_log_weight(0.0, kept), taken)
+
+    assert math.isclose(subtract_log_weight(score, taken), add_log_weight(0.0, kept), rel_tol=1e-12)
+    assert subtract_log_weight(add_log_weight(0.0, taken), taken) == 0.0
+
+def popularity(db, product):
+    row = db.session.get(ProductPopularity, product.id)
+    db.session.refresh(row)
+    return round(current_score(row.score), 6), row.units_sold
+
+def test_cancelled_orders_stop_counting(db, client, auth_header, make_product, make_user, make_order):
+    product = make_product()
+    shopper = make_user()
+    kept = make_order(shopper, (product, 2))
+    cancelled = make_order(shopper, (product, 3), status=OrderStatus.PENDING)
+    refresh_popularity()
+    assert popularity(db, product)[1] == 5
+
+    response = client.post(f'/api/orders/{cancelled.id}/cancel', headers=auth_header(shopper))
+
+    assert response.status_code == 200
+    only_kept = popularity(db, product)
+    # Cancelled after it was counted, and skipped by later runs
+    refresh_popularity()
+    assert popularity(db, product) == only_kept
+    assert only_kept[1] == 2
+
+    db.session.delete(cancelled)
+    db.session.commit()
+    refresh_popularity(full=True)
+    assert popularity(db, product) == only_kept
+
+def test_reinstated_orders_count_again(db, client, auth_header, make_product, make_user, make_order):
+    product = make_product()
+    order = make_order(make_user(), (product, 2))
+    refresh_popularity()
+    counted = popularity(db, product)
+    admin = make_user(UserRole.ADMIN)
+
+    def set_status(status):
+        response = client.put(
+            f'/api/admin/orders/{order.id}/status', json={'status': status.value}, headers=auth_header(admin)
+        )
+        assert response.status_code == 200
+
+    set_status(OrderStatus.RETURNED)
+    assert popularity(db, product) == (0.0, 0)
+    set_status(OrderStatus.CANCELLED)
+    assert popularity(db, product) == (0.0, 0)
+    set_status(OrderStatus.DELIVERED)
+    assert popularity(db, product) == counted
@@ -0,0 +1,31 @@
+import pytest
+
+def batch(client, **query):
+    response = client.get('/api/products/batch', query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_batch_by_ids_keeps_request_order(client, make_product):
+    first, second, hidden = make_product(), make_product(), make_product(is_active=False)
+
+    body = batch(client, ids=f'{second.id},999,{first.id},{hidden.id},{second.id}')
+
+    assert [product and product['id'] for product in body['products']] == [second.id, None, first.id, None, second.id]
+    assert body['not_found'] == [999, hidden.id]
+
+def test_batch_by_slugs_keeps_request_order(client, make_product):
+    first, second = make_product(), make_product()
+
+    body = batch(client, slugs=f'{second.slug},missing,{first.slug}', fields='name')
+
+    assert [product and product['slug'] for product in body['products']] == [second.slug, None, first.slug]
+    assert body['not_found'] == ['missing']
+
+@pytest.mark.parametrize('query', [
+    {},
+    {'ids': '1', 'slugs': 'a'},
+    {'ids': '1,x'},
+    {'ids': ','.join(['1'] * 101)}
+])
+def test_invalid_batch_requests_are_400(client, query):
+    assert client.get('/api/products/batch', query_string=query).status_code == 400
@@ -0,0 +1,106 @@
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.models import Brand, Category, ProductImage, ProductVariant, UserRole
+from app.services.product_serializer import serialize_products
+
+@contextmanager
+def count_queries(db):
+    """Count the statements executed inside the block"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+@pytest.fixture
+def full_products(db, make_product):
+    """Products with a brand, category, image, variant and tags each"""
+    def full_products(count):
+        products = []
+        for index in range(count):
+            product = make_product()
+            brand = Brand(name=f'Brand {product.sku}', slug=f'brand-{product.sku}')
+            category = Category(name=f'Category {product.sku}', slug=f'category-{product.sku}')
+            db.session.add_all([brand, category])
+            db.session.flush()
+            product.brand_id = brand.id
+            product.categories.append(category)
+            product.set_tags(['aviator', f'tag-{index}'])
+            db.session.add(ProductImage(product_id=product.id, image_url=f'/images/{product.sku}.jpg', is_primary=True))
+            db.session.add(ProductVariant(product_id=product.id, name='Large', sku=f'{product.sku}-l'))
+            db.session.commit()
+            products.append(product)
+        return products
+    return full_products
+
+def test_serializing_a_page_takes_the_same_queries_for_any_size(db, full_products):
+    products = full_products(20)
+    db.session.expire_all()
+    products = [db.session.get(type(product), product.id) for product in products]
+
+    with count_queries(db) as few:
+        serialize_products(products[:2], include_details=True)
+    with count_queries(db) as page:
+        serialized = serialize_products(products, include_details=True)
+
+    assert len(page) == len(few)
+    assert all(item['brand'] and item['categories'] and item['images'] and item['variants'] for item in serialized)
+
+def test_listing_query_count_does_not_grow_with_the_page(db, client, full_products):
+    full_products(20)
+
+    with count_queries(db) as few:
+        assert client.get('/api/products', query_string={'per_page': 2}).status_code == 200
+    with count_queries(db) as page:
+        response = client.get('/api/products', query_string={'per_page': 20})
+
+    assert len(response.get_json()['products']) == 20
+    assert len(page) == len(few)
+
+def test_tags_serialize_as_a_list(db, full_products):
+    [product] = full_products(1)
+
+    [serialized] = serialize_products([product], fields=['tags'])
+
+    assert serialized['tags'] == ['aviator', 'tag-0']
+    assert serialized['tags'] == product.to_dict(include_relations=True)['tags']
+
+def test_fields_param_limits_the_listing(client, full_products):
+    full_products(2)
+
+    response = client.get('/api/products', query_string={'fields': 'name, price,name'})
+
+    assert response.status_code == 200
+    assert [set(item) for item in response.get_json()['products']] == [{'id', 'name', 'price'}] * 2
+
+@pytest.mark.parametrize('fields', ['bogus', 'name,cost_price', 'name,__class__'])
+def test_unknown_or_private_fields_are_rejected(client, full_products, fields):
+    full_products(1)
+
+    response = client.get('/api/products', query_string={'fields': fields})
+
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == [f"Unknown field: {fields.split(',')[-1]}"]
+
+def test_fields_param_is_validated_on_every_listing(client, full_products, make_user, auth_header):
+    [product] = full_products(1)
+    admin = make_user(role=UserRole.ADMIN)
+
+    for path, query, headers in (
+        ('/api/products/featured', {}, {}),
+        ('/api/products/batch', {'ids': product.id}, {}),
+        (f'/api/products/{product.id}/similar', {}, {}),
+        (f'/api/products/{product.id}/bought-together', {}, {}),
+        ('/api/users/recommendations', {}, auth_header(admin)),
+        ('/api/admin/orders', {}, auth_header(admin))
+    ):
+        response = client.get(path, query_string={'fields': 'bogus', **query}, headers=headers)
+        assert response.status_code == 400, path
+        assert response.get_json()['errors'] == ['Unknown field: bogus']
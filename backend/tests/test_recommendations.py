@@ -0,0 +1,79 @@
+import numpy as np
+from app.models.catalog import ProductPopularity
+from app.services import recommendation_service
+from app.services.recommendation_service import train_recommendations, _compressed_rows, _solve_factors
+
+def solve_row_by_row(fixed, indptr, indices, data, regularization, alpha):
+    """Reference implementation - one np.linalg.solve per row"""
+    gram = fixed.T @ fixed + regularization * np.eye(fixed.shape[1])
+    solved = np.zeros((len(indptr) - 1, fixed.shape[1]))
+    for row in range(len(indptr) - 1):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        neighbours = fixed[indices[start:end]]
+        confidence = 1.0 + alpha * data[start:end]
+        matrix = gram + (neighbours.T * (confidence - 1.0)) @ neighbours
+        solved[row] = np.linalg.solve(matrix, neighbours.T @ confidence)
+    return solved
+
+def test_batched_solve_matches_the_per_row_solve(monkeypatch):
+    random = np.random.default_rng(7)
+    fixed = random.normal(size=(30, 4))
+    # Row 3 and 7 stay empty; row 0 alone is larger than a block
+    rows = np.concatenate([np.zeros(12, dtype=np.int64), random.choice([1, 2, 4, 5, 6, 8, 9], size=40)])
+    columns = random.integers(0, 30, size=len(rows))
+    values = random.uniform(0.5, 3.0, size=len(rows))
+    csr = _compressed_rows(rows, columns, values, 10)
+
+    monkeypatch.setattr(recommendation_service, 'SOLVE_CHUNK_SIZE', 8 * 16)
+    solved = _solve_factors(fixed, *csr, 0.1, 40.0)
+
+    assert np.allclose(solved, solve_row_by_row(fixed, *csr, 0.1, 40.0))
+    assert not solved[[3, 7]].any()
+
+def recommendations(client, auth_header, user, **query):
+    response = client.get('/api/users/recommendations', query_string=query, headers=auth_header(user))
+    assert response.status_code == 200
+    body = response.get_json()
+    return body['source'], [product['id'] for product in body['products']]
+
+def test_users_get_products_bought_by_similar_users(db, client, auth_header, make_product, make_user, make_order):
+    frame, case, cloth, strap = (make_product() for _ in range(4))
+    shopper, alike, other = make_user(), make_user(), make_user()
+    make_order(shopper, frame, case)
+    make_order(alike, frame, case, cloth)
+    make_order(other, strap)
+
+    assert train_recommendations(factors=4, iterations=10) == 3
+
+    source, product_ids = recommendations(client, auth_header, shopper)
+    assert source == 'personalized'
+    assert product_ids[0] == cloth.id
+    # Never what the user already bought
+    assert not {frame.id, case.id} & set(product_ids)
+
+def test_users_without_history_get_popular_products(db, client, auth_header, make_product, make_user, make_order):
+    quiet, hit, steady = make_product(), make_product(), make_product()
+    for product, score in ((hit, 5.0), (steady, 2.0)):
+        db.session.get(ProductPopularity, product.id).score = score
+    make_order(make_user(), hit)
+    db.session.commit()
+    train_recommendations(factors=4, iterations=5)
+
+    source, product_ids = recommendations(client, auth_header, make_user(), limit=2)
+
+    assert (source, product_ids) == ('popular', [hit.id, steady.id])
+
+def test_recommendations_of_deactivated_products_fall_back(db, client, auth_header, make_product, make_user, make_order):
+    frame, cloth = make_product(), make_product()
+    shopper = make_user()
+    make_order(shopper, frame)
+    make_order(make_user(), frame, cloth)
+    train_recommendations(factors=4, iterations=5)
+    assert recommendations(client, auth_header, shopper) == ('personalized', [cloth.id])
+
+    cloth.is_active = False
+    db.session.commit()
+
+    assert recommendations(client, auth_header, shopper)[0] == 'popular'
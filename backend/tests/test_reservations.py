@@ -0,0 +1,111 @@
+import pytest
+from datetime import datetime, timedelta
+from app.models import Product
+from app.models.catalog import StockReservation, ReservedStock
+from app.services.inventory_service import check_availability, InsufficientStockError
+from app.services.reservation_service import reserve_stock, convert_reservations
+from app.services.stock_shards import rebalance_stock_shards
+from test_inventory_concurrency import race
+
+def reserved(db, product_id):
+    db.session.expire_all()
+    return db.session.query(ReservedStock.quantity).filter(
+        ReservedStock.product_id == product_id,
+        ReservedStock.product_variant_id == 0
+    ).scalar() or 0
+
+def expire_holds(db, user_id):
+    db.session.query(StockReservation).filter(StockReservation.user_id == user_id).update(
+        {'expires_at': datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False
+    )
+    db.session.commit()
+
+def stock_of(db, product_id):
+    db.session.expire_all()
+    return db.session.get(Product, product_id).stock_quantity
+
+@pytest.mark.parametrize('shards', [0, 2])
+def test_expired_holds_do_not_block_other_checkouts(db, make_product, make_user, shards):
+    product = make_product(stock_quantity=3)
+    rebalance_stock_shards(product.id, shards=shards)
+    holder, buyer = make_user(), make_user()
+    reserve_stock(holder.id, [(product.id, None, 3)])
+    db.session.commit()
+    assert check_availability([(product.id, None, 1)], buyer.id)
+
+    expire_holds(db, holder.id)
+
+    assert check_availability([(product.id, None, 3)], buyer.id) == []
+    reserve_stock(buyer.id, [(product.id, None, 3)])
+    db.session.commit()
+    # The expired hold was released in the same transaction, not double counted
+    assert reserved(db, product.id) == 3
+    assert db.session.query(StockReservation).filter(StockReservation.user_id == holder.id).count() == 0
+
+def test_converting_an_expired_hold_fails_once_its_stock_is_taken(db, make_product, make_user):
+    product = make_product(stock_quantity=3)
+    holder, buyer = make_user(), make_user()
+    reserve_stock(holder.id, [(product.id, None, 3)])
+    db.session.commit()
+    expire_holds(db, holder.id)
+
+    reserve_stock(buyer.id, [(product.id, None, 2)])
+    db.session.commit()
+
+    with pytest.raises(InsufficientStockError):
+        convert_reservations(holder.id, [(product.id, None, 3)])
+    db.session.rollback()
+    assert reserved(db, product.id) == 2
+    assert stock_of(db, product.id) == 3
+
+def test_converting_an_expired_hold_succeeds_while_its_stock_is_free(db, make_product, make_user):
+    product = make_product(stock_quantity=3)
+    holder, other = make_user(), make_user()
+    reserve_stock(holder.id, [(product.id, None, 2)])
+    reserve_stock(other.id, [(product.id, None, 1)])
+    db.session.commit()
+    expire_holds(db, holder.id)
+    expire_holds(db, other.id)
+
+    assert convert_reservations(holder.id, [(product.id, None, 3)]) == [product.id]
+    db.session.commit()
+
+    assert reserved(db, product.id) == 0
+    assert stock_of(db, product.id) == 0
+
+def test_converting_races_releasing_an_expired_hold(app, db, make_product, make_user):
+    """The owner converts an expired hold while another checkout releases it as expired"""
+    product_id = make_product(stock_quantity=3).id
+    holder_id, buyer_id = make_user().id, make_user().id
+    reserve_stock(holder_id, [(product_id, None, 3)])
+    db.session.commit()
+    expire_holds(db, holder_id)
+
+    def convert():
+        try:
+            convert_reservations(holder_id, [(product_id, None, 3)])
+            db.session.commit()
+            return 'converted'
+        except InsufficientStockError:
+            db.session.rollback()
+            return 'refused'
+
+    def reserve():
+        try:
+            reserve_stock(buyer_id, [(product_id, None, 3)])
+            db.session.commit()
+            return 'reserved'
+        except InsufficientStockError:
+            db.session.rollback()
+            return 'refused'
+
+    tasks = iter([convert, reserve])
+    outcomes = sorted(race(app, 2, lambda: next(tasks)()))
+
+    # Exactly one of them gets the three units, and the hold is given back once
+    assert outcomes in (['converted', 'refused'], ['refused', 'reserved'])
+    if 'converted' in outcomes:
+        assert (stock_of(db, product_id), reserved(db, product_id)) == (0, 0)
+    else:
+        assert (stock_of(db, product_id), reserved(db, product_id)) == (3, 3)
+    assert db.session.query(StockReservation).filter(StockReservation.user_id == holder_id).count() == 0
@@ -0,0 +1,57 @@
+import pytest
+from app.services.cache_service import LocalCache, init_cache
+from app.services.catalog_events import product_changed, brand_changed, stock_changed
+
+@pytest.fixture
+def cache(app):
+    app.config['RESPONSE_CACHE_BACKEND'] = 'local'
+    return init_cache(app)
+
+def cached_paths(cache):
+    return {key.split('?')[0] for key in cache._entries}
+
+def test_invalidating_a_tag_drops_only_its_entries():
+    cache = LocalCache()
+    cache.set('a', 1, 60, tags=['products', 'product:1'])
+    cache.set('b', 2, 60, tags=['products'])
+    cache.set('c', 3, 60, tags=['brands'])
+
+    cache.invalidate_tags('product:1')
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (None, 2, 3)
+
+    cache.invalidate_tags('products')
+    assert (cache.get('b'), cache.get('c')) == (None, 3)
+
+def test_anonymous_reads_are_served_from_the_cache(client, cache, make_product):
+    product = make_product()
+    path = f'/api/products/{product.id}'
+
+    assert client.get(path).headers['X-Cache'] == 'MISS'
+    assert client.get(path).headers['X-Cache'] == 'HIT'
+
+def test_writes_drop_the_responses_tagged_with_them(client, cache, make_product):
+    sold, other = make_product(), make_product()
+    paths = {
+        'listing': '/api/products',
+        'sold': f'/api/products/{sold.id}',
+        'other': f'/api/products/{other.id}',
+        'brands': '/api/products/brands'
+    }
+
+    def fill():
+        for path in paths.values():
+            client.get(path)
+        assert cached_paths(cache) >= set(paths.values())
+
+    fill()
+    stock_changed(sold.id)
+    assert paths['sold'] not in cached_paths(cache)
+    assert {paths['listing'], paths['other'], paths['brands']} <= cached_paths(cache)
+
+    fill()
+    product_changed(other.id)
+    assert cached_paths(cache) & set(paths.values()) == {paths['brands']}
+
+    fill()
+    brand_changed(1)
+    assert not cached_paths(cache) & set(paths.values())
@@ -0,0 +1,64 @@
+import pytest
+from app.models import Review
+from app.services import catalog_events
+from app.services.review_stats import get_rating_stats
+
+@pytest.fixture
+def changed_products(monkeypatch):
+    """Ids passed to product_changed, in call order"""
+    changed = []
+    monkeypatch.setattr(catalog_events, '_product_listeners', [changed.extend])
+    return changed
+
+def distribution(product_id):
+    stats = get_rating_stats(product_id)
+    return stats['total_reviews'], stats['average_rating'], {
+        rating: count for rating, count in stats['rating_distribution'].items() if count
+    }
+
+def test_review_lifecycle_keeps_the_summary_and_notifies(db, make_product, make_user, changed_products):
+    product, user = make_product(), make_user()
+    product_id = product.id
+    review = Review(user_id=user.id, product_id=product_id, rating=4, is_approved=True)
+    db.session.add(review)
+    db.session.commit()
+    assert distribution(product_id) == (1, 4.0, {'4': 1})
+    assert changed_products == [product_id]
+
+    # Changed after the commit expired it, so the old rating is not loaded
+    review.rating = 2
+    db.session.commit()
+    assert distribution(product_id) == (1, 2.0, {'2': 1})
+    assert changed_products == [product_id, product_id]
+
+    db.session.delete(review)
+    db.session.commit()
+    assert distribution(product_id)[0] == 0
+    assert changed_products == [product_id] * 3
+
+def test_unapproved_reviews_are_not_counted(db, make_product, make_user, changed_products):
+    product, user = make_product(), make_user()
+    product_id = product.id
+    review = Review(user_id=user.id, product_id=product_id, rating=5, is_approved=False)
+    db.session.add(review)
+    db.session.commit()
+    assert distribution(product_id)[0] == 0
+    assert changed_products == []
+
+    review.is_approved = True
+    db.session.commit()
+    assert distribution(product_id) == (1, 5.0, {'5': 1})
+
+    review.title = 'Still great'
+    db.session.commit()
+    assert distribution(product_id) == (1, 5.0, {'5': 1})
+    assert changed_products == [product_id]
+
+def test_rolled_back_review_notifies_nothing(db, make_product, make_user, changed_products):
+    product, user = make_product(), make_user()
+    db.session.add(Review(user_id=user.id, product_id=product.id, rating=3, is_approved=True))
+    db.session.flush()
+    db.session.rollback()
+
+    db.session.commit()
+    assert changed_products == []
@@ -0,0 +1,30 @@
+from app.models import Brand, UserRole
+from app.models.search import ProductSearchDocument
+from app.services.search_service import index_product
+from tests.test_product_serializer import count_queries
+
+def test_brand_change_reaches_the_search_document(db, client, make_product, make_user, auth_header):
+    brand = Brand(name='Sunward', slug='sunward')
+    db.session.add(brand)
+    db.session.commit()
+    product = make_product(name='Harbor Aviator', brand_id=brand.id)
+    headers = auth_header(make_user(role=UserRole.ADMIN))
+    # Loaded into the session the request shares, as earlier reads in a request would
+    assert product.brand.name == 'Sunward'
+
+    response = client.put(f'/api/products/{product.id}', json={'brand': 'Lumen'}, headers=headers)
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(ProductSearchDocument, product.id).title == 'Harbor Aviator Lumen'
+
+def test_indexing_and_searching_run_no_ddl(db, client, make_product):
+    product = make_product(name='Harbor Aviator')
+
+    with count_queries(db) as statements:
+        index_product(product)
+        db.session.commit()
+        response = client.get('/api/products', query_string={'search': 'aviator'})
+
+    assert [item['id'] for item in response.get_json()['products']] == [product.id]
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith(('CREATE', 'DROP'))]
@@ -0,0 +1,43 @@
+from app.services.catalog_events import product_changed
+from app.services.similarity_index import similarity_index
+
+def frame(make_product, width, shape='round', **fields):
+    return make_product(frame_width=width, lens_width=50, bridge_width=20, temple_length=140, frame_shape=shape, **fields)
+
+def similar(client, product_id, **query):
+    response = client.get(f'/api/products/{product_id}/similar', query_string=query)
+    assert response.status_code == 200
+    return [product['id'] for product in response.get_json()['products']]
+
+def test_similar_products_come_nearest_first(client, make_product):
+    base = frame(make_product, 140)
+    near, far, other_shape = frame(make_product, 141), frame(make_product, 150), frame(make_product, 141, shape='square')
+    bare = make_product()
+
+    assert similar(client, base.id) == [near.id, other_shape.id, far.id]
+    assert similar(client, base.id, limit=1) == [near.id]
+    # Products without frame attributes neither match nor are matched
+    assert bare.id not in similar(client, near.id)
+    assert similar(client, bare.id) == []
+
+def test_similar_for_unknown_product_is_404(client):
+    assert client.get('/api/products/999/similar').status_code == 404
+
+def test_product_writes_patch_rows_without_copying_the_matrix(client, db, make_product):
+    base, near, far = frame(make_product, 140), frame(make_product, 141), frame(make_product, 150)
+    assert similar(client, base.id) == [near.id, far.id]
+    features = similarity_index.features
+
+    far.frame_width = 140
+    near.is_active = False
+    db.session.commit()
+    product_changed(far.id, near.id)
+
+    assert similar(client, base.id) == [far.id]
+    assert similarity_index.features is features
+
+    # The freed row is reused by the next product
+    newest = frame(make_product, 145)
+    product_changed(newest.id)
+    assert similar(client, base.id) == [far.id, newest.id]
+    assert similarity_index.features is features
@@ -0,0 +1,132 @@
+import pytest
+from sqlalchemy import func
+from app.models import Product, UserRole
+from app.models.catalog import ProductStockShard, ReservedStock
+from app.services.inventory_service import check_availability, decrement_stock, restock, InsufficientStockError
+from app.services.reservation_service import reserve_stock, release_reservations, convert_reservations
+from app.services.stock_shards import rebalance_stock_shards, sync_sharded_stock
+from app.services.product_serializer import serialize_products
+
+def shard_total(db, product_id):
+    return db.session.query(func.sum(ProductStockShard.quantity)).filter(
+        ProductStockShard.product_id == product_id
+    ).scalar()
+
+def reserved(db, product_id):
+    return db.session.query(ReservedStock.quantity).filter(
+        ReservedStock.product_id == product_id,
+        ReservedStock.product_variant_id == 0
+    ).scalar() or 0
+
+def test_sharding_keeps_held_units_out_of_the_shards(db, make_product, make_user):
+    product = make_product(stock_quantity=10)
+    holder = make_user()
+    reserve_stock(holder.id, [(product.id, None, 3)])
+    db.session.commit()
+
+    assert rebalance_stock_shards(product.id, shards=4) == 4
+    db.session.commit()
+
+    assert shard_total(db, product.id) == 7
+    assert reserved(db, product.id) == 3
+    assert db.session.get(Product, product.id).stock_quantity == 10
+
+def test_holds_on_sharded_stock_cannot_be_sold_to_others(db, make_product, make_user):
+    product = make_product(stock_quantity=4)
+    rebalance_stock_shards(product.id, shards=2)
+    holder = make_user()
+    reserve_stock(holder.id, [(product.id, None, 3)])
+    db.session.commit()
+    assert shard_total(db, product.id) == 1
+
+    with pytest.raises(InsufficientStockError):
+        decrement_stock([(product.id, None, 2)])
+    assert check_availability([(product.id, None, 4)], holder.id) == []
+
+    assert convert_reservations(holder.id, [(product.id, None, 3)]) == [product.id]
+    db.session.commit()
+    assert shard_total(db, product.id) == 1
+    assert reserved(db, product.id) == 0
+
+def test_released_holds_go_back_onto_the_shards(db, make_product, make_user):
+    product = make_product(stock_quantity=6)
+    rebalance_stock_shards(product.id, shards=3)
+    holder = make_user()
+    reserve_stock(holder.id, [(product.id, None, 5)])
+    db.session.commit()
+
+    assert release_reservations(holder.id) == 1
+    db.session.commit()
+
+    assert shard_total(db, product.id) == 6
+    assert reserved(db, product.id) == 0
+
+def test_unsharding_folds_holds_back_into_the_stock_row(db, make_product, make_user):
+    product = make_product(stock_quantity=8)
+    rebalance_stock_shards(product.id, shards=4)
+    holder = make_user()
+    reserve_stock(holder.id, [(product.id, None, 2)])
+    decrement_stock([(product.id, None, 1)])
+    db.session.commit()
+
+    assert rebalance_stock_shards(product.id, shards=0) == 0
+    db.session.commit()
+
+    assert shard_total(db, product.id) is None
+    assert db.session.get(Product, product.id).stock_quantity == 7
+    with pytest.raises(InsufficientStockError):
+        decrement_stock([(product.id, None, 6)])
+    decrement_stock([(product.id, None, 5)])
+
+def test_rebalance_total_includes_held_units(db, make_product, make_user):
+    product = make_product(stock_quantity=5)
+    rebalance_stock_shards(product.id, shards=2)
+    holder = make_user()
+    reserve_stock(holder.id, [(product.id, None, 2)])
+    db.session.commit()
+
+    rebalance_stock_shards(product.id, total=20)
+    restock([(product.id, None, 1)])
+    db.session.commit()
+
+    assert shard_total(db, product.id) == 19
+    assert sync_sharded_stock() == [product.id]
+    assert db.session.get(Product, product.id).stock_quantity == 21
+
+def admin_update(client, headers, product, **changes):
+    data = {
+        'name': product.name,
+        'description': product.description,
+        'price': float(product.price),
+        'sku': product.sku,
+        'stock_quantity': product.stock_quantity
+    }
+    data.update(changes)
+    return client.put(f'/api/admin/products/{product.id}', json=data, headers=headers)
+
+def test_admin_update_keeps_sharded_stock_sold_since_the_form_loaded(db, client, make_product, make_user, auth_header):
+    product = make_product(stock_quantity=10)
+    rebalance_stock_shards(product.id, shards=2)
+    db.session.commit()
+    headers = auth_header(make_user(role=UserRole.ADMIN))
+
+    # The form carries the display copy of 10 while two units sell
+    decrement_stock([(product.id, None, 2)])
+    db.session.commit()
+    assert admin_update(client, headers, product, name='Renamed').status_code == 200
+    assert shard_total(db, product.id) == 8
+
+    assert admin_update(client, headers, product, stock_quantity=30).status_code == 200
+    assert shard_total(db, product.id) == 30
+
+def test_serialized_stock_flags_read_the_shards(db, make_product):
+    product = make_product(stock_quantity=3, low_stock_threshold=1)
+    rebalance_stock_shards(product.id, shards=2)
+    decrement_stock([(product.id, None, 3)])
+    db.session.commit()
+
+    # stock_quantity is only refreshed by sync-shards
+    [serialized] = serialize_products([db.session.get(Product, product.id)])
+    assert serialized['stock_quantity'] == 3
+    assert serialized['in_stock'] is False
+    assert serialized['is_low_stock'] is True
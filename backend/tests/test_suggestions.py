@@ -0,0 +1,18 @@
+from app.models import Brand
+from app.services.catalog_events import brand_changed
+from app.services.suggestion_service import suggestion_index, get_suggestions
+
+def test_renaming_a_brand_replaces_its_suggestion(db, make_product):
+    brand = Brand(name='Sunward', slug='sunward')
+    db.session.add(brand)
+    db.session.commit()
+    make_product(name='Harbor Aviator', brand_id=brand.id)
+    suggestion_index.rebuild()
+    assert 'Sunward (Brand)' in get_suggestions('sun')
+
+    brand.name = 'Lumen'
+    db.session.commit()
+    brand_changed(brand.id)
+
+    assert 'Sunward (Brand)' not in get_suggestions('sun')
+    assert 'Lumen (Brand)' in get_suggestions('lum')